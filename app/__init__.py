@@ -26,6 +26,6 @@ def create_app(config_name=None):
     app.register_blueprint(main)
     
     with app.app_context():
-        from . import models
+        from . import models, fulltext, search_index, search_cache
     
     return app
\ No newline at end of file
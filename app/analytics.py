@@ -0,0 +1,298 @@
+# app/analytics.py
+
+"""
+Performance analytics over panels of stored series.
+
+Metrics are computed on whole (dates x assets) matrices with NumPy, column block by column
+block to bound memory. Missing values (NaN) are masked out, so series with different
+histories (staggered starts, gaps) can share a panel. Annualization follows each series'
+`time_frequency`.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from app import db
+from .models import (
+    SeriesBase, TimeSeries, SeriesGroup, seriesgroup_seriesbase,
+    _series_group_tree, _panel_statement, _pivot_panel, _validate_date
+)
+
+# Observations per year of each TIME_FREQUENCIES value ('B' is bimonthly)
+PERIODS_PER_YEAR = {'DA': 365, 'D': 252, 'W': 52, 'M': 12, 'B': 6, 'Q': 4, 'S': 2, 'Y': 1}
+
+PERFORMANCE_METRICS = [
+    'observations', 'annualized_return', 'annualized_volatility', 'sharpe_ratio', 'sortino_ratio',
+    'max_drawdown', 'hit_rate', 'skewness', 'excess_kurtosis',
+]
+
+
+def load_panel(
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    session=None,
+):
+    """
+    Loads stored TimeSeries as a wide panel (one column per series, named by code).
+
+    Parameters:
+        codes (list of str, optional): Codes of the TimeSeries to load, in column order.
+        series_group (SeriesGroup or str, optional): Group (or its code) whose members to load,
+                                                     instead of `codes`.
+        recursive (bool): With `series_group`, also include members of nested groups.
+        start, end, as_of (str or date, optional): As in `SeriesGroup.to_dataframe`.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+
+    Returns:
+        tuple: (panel, metadata). `panel` is a DataFrame indexed by date; `metadata` is indexed
+               by code, in the same order, with the columns id, name, time_frequency and delta_type.
+    """
+    if session is None:
+        session = db.session
+    metadata = load_metadata(codes, series_group, recursive, session)
+    return load_metadata_panel(metadata, start, end, as_of, session), metadata
+
+
+def load_metadata(codes=None, series_group=None, recursive=False, session=None):
+    """
+    Metadata of the TimeSeries selected by `codes` or `series_group` (see `load_panel`),
+    without their data points.
+
+    Returns:
+        DataFrame: Indexed by code, in the order of `codes` (or of ids for `series_group`),
+                   with the columns id, name, time_frequency and delta_type.
+    """
+    if (codes is None) == (series_group is None):
+        raise ValueError("Exactly one of codes and series_group must be given.")
+    if session is None:
+        session = db.session
+
+    ts = TimeSeries.__table__
+    sb = SeriesBase.__table__
+    series = (
+        select(ts.c.id, ts.c.time_series_code, sb.c.name, ts.c.time_frequency, ts.c.delta_type)
+        .join(sb, sb.c.id == ts.c.id)
+    )
+    if codes is not None:
+        codes = list(codes)
+        series = series.where(ts.c.time_series_code.in_(codes))
+    else:
+        if isinstance(series_group, str):
+            group_id = select(SeriesGroup.__table__.c.id).where(
+                SeriesGroup.__table__.c.series_group_code == series_group
+            )
+        else:
+            group_id = [series_group.id]
+        tree = _series_group_tree(group_id, recursive=recursive)
+        series = series.where(ts.c.id.in_(
+            select(seriesgroup_seriesbase.c.seriesbase_id)
+            .where(seriesgroup_seriesbase.c.seriesgroup_id.in_(select(tree.c.group_id)))
+        )).order_by(ts.c.id)
+
+    metadata = pd.DataFrame(
+        session.execute(series).all(),
+        columns=['id', 'code', 'name', 'time_frequency', 'delta_type']
+    ).set_index('code')
+    if codes is not None:
+        missing = [code for code in codes if code not in metadata.index]
+        if missing:
+            raise ValueError("Unknown TimeSeries codes: " + ", ".join(missing))
+        metadata = metadata.loc[codes]
+    return metadata
+
+
+def load_metadata_panel(metadata, start=None, end=None, as_of=None, session=None):
+    """
+    Panel of the TimeSeries of `metadata` (from `load_metadata`), one column per code.
+    """
+    if session is None:
+        session = db.session
+    stmt = _panel_statement(
+        metadata['id'].tolist(),
+        TimeSeries.__table__.c.time_series_code,
+        start=_validate_date(start, 'start'),
+        end=_validate_date(end, 'end'),
+        as_of=_validate_date(as_of, 'as_of'),
+    )
+    return _pivot_panel(session.execute(stmt).all(), columns=list(zip(metadata['id'], metadata.index)))
+
+
+def periods_per_year(time_frequency, n_columns, index=None):
+    """
+    Returns the number of observations per year of each of `n_columns` columns.
+
+    Parameters:
+        time_frequency (str, list or Series): One TIME_FREQUENCIES value for every column, or
+                                              one per column. None values are inferred from the
+                                              median spacing of `index` (a DatetimeIndex).
+    """
+    if time_frequency is None or isinstance(time_frequency, str):
+        time_frequency = [time_frequency] * n_columns
+    time_frequency = list(time_frequency)
+    if len(time_frequency) != n_columns:
+        raise ValueError("time_frequency must have one value per column.")
+
+    result = np.empty(n_columns)
+    inferred = None
+    for i, frequency in enumerate(time_frequency):
+        if frequency is None or (isinstance(frequency, float) and np.isnan(frequency)):
+            if inferred is None:
+                inferred = _infer_periods_per_year(index)
+            result[i] = inferred
+        elif frequency in PERIODS_PER_YEAR:
+            result[i] = PERIODS_PER_YEAR[frequency]
+        else:
+            raise ValueError("time_frequency must be one of the following: " + ", ".join(PERIODS_PER_YEAR))
+    return result
+
+
+def _infer_periods_per_year(index):
+    if index is None or len(index) < 2:
+        raise ValueError("time_frequency is missing and cannot be inferred from the index.")
+    median_days = np.median(np.diff(pd.DatetimeIndex(index).values).astype('timedelta64[D]').astype(float))
+    # Nearest frequency by the number of days between observations ('DA' and 'D' both mean daily)
+    days = {frequency: 365.25 / periods for frequency, periods in PERIODS_PER_YEAR.items() if frequency != 'DA'}
+    frequency = min(days, key=lambda f: abs(np.log(max(median_days, 1) / days[f])))
+    return PERIODS_PER_YEAR[frequency]
+
+
+def performance_summary(
+    returns,
+    time_frequency=None,
+    risk_free_rate=0.0,
+    block_size=1024,
+):
+    """
+    Computes performance metrics of every column of a panel of periodic simple returns.
+
+    Parameters:
+        returns (DataFrame): Returns indexed by date, one column per asset. NaN marks a missing
+                             observation and is excluded from every metric.
+        time_frequency (str, list or Series, optional): TIME_FREQUENCIES value(s) used for
+                             annualization; inferred from the index when None.
+        risk_free_rate (float): Annual risk-free rate, used by the Sharpe and Sortino ratios
+                                (also the Sortino target).
+        block_size (int): Number of columns processed at once (bounds temporary memory).
+
+    Returns:
+        DataFrame: One row per column of `returns`, with the PERFORMANCE_METRICS columns:
+                   geometric annualized return, annualized volatility, annualized Sharpe and
+                   Sortino ratios, max drawdown (negative), share of positive returns,
+                   sample skewness and excess kurtosis (as pandas' skew and kurt).
+    """
+    if isinstance(time_frequency, pd.Series):
+        time_frequency = time_frequency.reindex(returns.columns).tolist()
+    values = returns.to_numpy(dtype=float)
+    n_columns = values.shape[1]
+    periods = periods_per_year(time_frequency, n_columns, index=returns.index)
+
+    result = np.full((n_columns, len(PERFORMANCE_METRICS)), np.nan)
+    for first in range(0, n_columns, block_size):
+        block = slice(first, first + block_size)
+        # Assets as contiguous rows, so that every reduction runs over contiguous memory
+        result[block] = _block_metrics(np.ascontiguousarray(values[:, block].T), periods[block], risk_free_rate)
+    return pd.DataFrame(result, index=returns.columns, columns=PERFORMANCE_METRICS)
+
+
+def _block_metrics(r, periods, risk_free_rate):
+    """
+    Metrics of an (assets x dates) block of returns, as an (assets x metrics) array.
+    """
+    mask = ~np.isnan(r)
+    n = mask.sum(axis=1).astype(float)
+    filled = np.where(mask, r, 0.0)
+    risk_free = (1.0 + risk_free_rate) ** (1.0 / periods) - 1.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = filled.sum(axis=1) / n
+        centered = filled - mean[:, None]
+        centered[~mask] = 0.0
+        squared = centered * centered
+        m2 = squared.sum(axis=1) / n
+        m3 = (squared * centered).sum(axis=1) / n
+        m4 = (squared * squared).sum(axis=1) / n
+        std = np.sqrt(m2 * n / (n - 1))
+
+        log_growth = np.log1p(filled)
+        annualized_return = np.expm1(log_growth.sum(axis=1) * periods / n)
+        annualized_volatility = std * np.sqrt(periods)
+        sharpe_ratio = (mean - risk_free) / std * np.sqrt(periods)
+
+        downside = np.minimum(filled - risk_free[:, None], 0.0)
+        downside[~mask] = 0.0
+        downside_deviation = np.sqrt((downside * downside).sum(axis=1) / n)
+        sortino_ratio = (mean - risk_free) / downside_deviation * np.sqrt(periods)
+
+        # Wealth in log space; a missing return leaves wealth unchanged
+        log_wealth = np.cumsum(log_growth, axis=1)
+        peak = np.maximum(np.maximum.accumulate(log_wealth, axis=1), 0.0)
+        max_drawdown = np.expm1((log_wealth - peak).min(axis=1))
+
+        hit_rate = (filled > 0).sum(axis=1) / n
+
+        # Adjusted Fisher-Pearson skewness and excess kurtosis (pandas' skew and kurt)
+        g1 = m3 / m2 ** 1.5
+        skewness = np.sqrt(n * (n - 1)) / (n - 2) * g1
+        g2 = m4 / m2 ** 2 - 3.0
+        excess_kurtosis = ((n + 1) * g2 + 6.0) * (n - 1) / ((n - 2) * (n - 3))
+
+    max_drawdown[n == 0] = np.nan
+    skewness[n < 3] = np.nan
+    excess_kurtosis[n < 4] = np.nan
+    return np.column_stack([
+        n, annualized_return, annualized_volatility, sharpe_ratio, sortino_ratio,
+        max_drawdown, hit_rate, skewness, excess_kurtosis,
+    ])
+
+
+def simple_returns(levels):
+    """
+    Simple returns between consecutive observations of each column of a panel of levels,
+    skipping missing values (NaN) rather than propagating them.
+    """
+    values = levels.to_numpy(dtype=float)
+    mask = ~np.isnan(values)
+    # Index of the last observation at or before every row, per column
+    rows = np.where(mask, np.arange(len(values))[:, None], -1)
+    previous_row = np.maximum.accumulate(rows, axis=0)
+    previous_row = np.vstack([np.full((1, values.shape[1]), -1), previous_row[:-1]])
+    previous = np.where(
+        previous_row >= 0,
+        np.take_along_axis(values, np.maximum(previous_row, 0), axis=0),
+        np.nan
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(mask, values / previous - 1.0, np.nan)
+    return pd.DataFrame(returns, index=levels.index, columns=levels.columns)
+
+
+def analyze(
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    risk_free_rate=0.0,
+    session=None,
+):
+    """
+    Loads stored series (see `load_panel`) and returns their `performance_summary`,
+    annualized with each series' `time_frequency`.
+
+    Parameters:
+        levels (bool): If True, the stored values are levels (e.g. prices) and are turned into
+                       simple returns first; otherwise they are periodic simple returns.
+    """
+    panel, metadata = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    returns = simple_returns(panel) if levels else panel
+    frequencies = metadata['time_frequency'].where(metadata['time_frequency'].notna(), None)
+    return performance_summary(returns, time_frequency=frequencies.tolist(), risk_free_rate=risk_free_rate)
@@ -0,0 +1,232 @@
+# app/backtest.py
+
+"""
+Vectorized backtests of rebalanced portfolios over panels of stored series.
+
+A strategy is a schedule of target weights (dates x assets). At every rebalance date the
+portfolio trades back to the latest target; between rebalances the weights drift with the
+returns. Weights not summing to one leave the rest in cash (zero return); negative cash is
+borrowing. Missing returns (NaN) count as zero: the asset keeps its value.
+
+Within a holding period, the value of every position is its weight times the cumulative
+growth of the asset since the rebalance, so the whole period is one matrix product of the
+(variants x assets) target weights by the (assets x dates) growth. Many strategy variants
+(e.g. 1,000 parameter sets) are simulated together, with one product per rebalance period
+instead of one Python loop per variant and date.
+
+Turnover is the total traded weight at a rebalance (sum of absolute weight changes, the
+first investment included) and costs are `transaction_cost` times the turnover, taken from
+the portfolio value on the rebalance date. Drift is the sum of absolute differences, just
+before a rebalance, between the drifted weights and the targets of the previous rebalance.
+"""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from app import db
+from .analytics import load_panel, simple_returns, periods_per_year, PERIODS_PER_YEAR
+
+BacktestResult = namedtuple('BacktestResult', ['returns', 'value', 'turnover', 'drift', 'costs'])
+
+# Rebalance frequencies (TIME_FREQUENCIES values) and the number of months of their periods
+REBALANCE_MONTHS = {'M': 1, 'B': 2, 'Q': 3, 'S': 6, 'Y': 12}
+REBALANCE_FREQUENCIES = ['D', 'DA', 'W'] + list(REBALANCE_MONTHS)
+
+
+def backtest(
+    returns,
+    weights,
+    rebalance=None,
+    transaction_cost=0.0,
+    time_frequency=None,
+):
+    """
+    Backtests one or many weight schedules over a panel of periodic simple returns.
+
+    Parameters:
+        returns (DataFrame): Returns indexed by date (ascending), one column per asset.
+        weights (DataFrame or dict): Target weights indexed by date, with columns among those
+                                     of `returns`; or {variant: DataFrame} to run many
+                                     variants at once.
+        rebalance (str, optional): TIME_FREQUENCIES value: rebalance on the last date of every
+                                   period (week, month, quarter...) of the panel, to the latest
+                                   target. If None, rebalance on the dates of the schedule.
+        transaction_cost (float): Cost per unit of traded weight (e.g. 0.001 for 10 bp).
+        time_frequency (str, optional): TIME_FREQUENCIES value of `returns`; inferred from the
+                                        index if None. `rebalance` cannot be more frequent.
+
+    Returns:
+        BacktestResult: (returns, value, turnover, drift, costs). returns and value (starting
+                        at 1 before the first trade) are indexed by the dates of `returns`,
+                        turnover, drift and costs by the rebalance dates. They are Series for
+                        one schedule and DataFrames with one column per variant for a dict.
+    """
+    single = not isinstance(weights, dict)
+    schedules = {None: weights} if single else weights
+    if not schedules:
+        raise ValueError("weights must contain at least one schedule.")
+    for schedule in schedules.values():
+        unknown = set(schedule.columns) - set(returns.columns)
+        if unknown:
+            raise ValueError("weights have assets missing from returns: " + ", ".join(map(str, sorted(unknown))))
+        if not schedule.index.is_monotonic_increasing:
+            raise ValueError("weights must be indexed by ascending dates.")
+
+    index = pd.DatetimeIndex(returns.index)
+    rows = _rebalance_rows(index, schedules, rebalance, time_frequency)
+    if not len(rows):
+        raise ValueError("No rebalance date: the schedules start after the last date of returns.")
+    dates = index[rows]
+
+    # Targets (variants x rebalances x assets): latest schedule row on or before each date
+    targets = np.stack([
+        _targets_at(schedule.reindex(columns=returns.columns).fillna(0.0), dates)
+        for schedule in schedules.values()
+    ])
+    log_growth = np.cumsum(np.log1p(np.nan_to_num(returns.to_numpy(dtype=float))), axis=0)
+    value, turnover, drift = _simulate(log_growth, targets, rows)
+    costs = transaction_cost * turnover
+
+    # Costs are taken from the value on the rebalance dates, so that they compound
+    value_after = np.cumprod(1.0 - costs, axis=1)
+    period = np.searchsorted(rows, np.arange(len(index)), side='right') - 1
+    scale = np.where(period >= 0, value_after[:, np.maximum(period, 0)], np.nan)
+    value = value * scale
+    # The first return is the cost of the first trade
+    previous = np.concatenate([np.full((len(targets), 1), np.nan), value[:, :-1]], axis=1)
+    previous[:, rows[0]] = 1.0
+    portfolio_returns = value / previous - 1.0
+
+    names = list(schedules)
+    result = BacktestResult(
+        returns=pd.DataFrame(portfolio_returns.T, index=returns.index, columns=names),
+        value=pd.DataFrame(value.T, index=returns.index, columns=names),
+        turnover=pd.DataFrame(turnover.T, index=dates, columns=names),
+        drift=pd.DataFrame(drift.T, index=dates, columns=names),
+        costs=pd.DataFrame(costs.T, index=dates, columns=names),
+    )
+    if single:
+        return BacktestResult(*(frame.iloc[:, 0].rename(None) for frame in result))
+    return result
+
+
+def _targets_at(schedule, dates):
+    # Before its first date, a schedule holds cash
+    positions = schedule.index.searchsorted(dates, side='right') - 1
+    values = schedule.to_numpy(dtype=float)[np.maximum(positions, 0)]
+    values[positions < 0] = 0.0
+    return values
+
+
+def _rebalance_rows(index, schedules, rebalance, time_frequency):
+    """
+    Positions in `index` of the rebalance dates: the first date on or after the start of
+    the earliest schedule, then either the schedule dates or the ends of the `rebalance`
+    periods (without the last date, where trading would have no effect).
+    """
+    first = min(schedule.index[0] for schedule in schedules.values() if len(schedule))
+    start = index.searchsorted(pd.Timestamp(first))
+    if rebalance is None:
+        dates = pd.DatetimeIndex(sorted({date for schedule in schedules.values() for date in schedule.index}))
+        rows = index.searchsorted(dates)
+    else:
+        if rebalance not in REBALANCE_FREQUENCIES:
+            raise ValueError("rebalance must be one of the following: " + ", ".join(REBALANCE_FREQUENCIES))
+        data_periods = periods_per_year(time_frequency, 1, index=index)[0]
+        if PERIODS_PER_YEAR[rebalance] > data_periods:
+            raise ValueError(
+                f"Cannot rebalance with frequency {rebalance!r} more often than the returns are observed."
+            )
+        keys = _period_keys(index, rebalance)
+        period_ends = np.flatnonzero(np.append(keys[1:] != keys[:-1], True))
+        rows = np.append(start, period_ends)
+    rows = np.unique(rows)
+    rows = rows[(rows >= start) & (rows < len(index) - 1) | (rows == start)]
+    return rows[rows < len(index)]
+
+
+def _period_keys(index, frequency):
+    if frequency in ('D', 'DA'):
+        return np.arange(len(index))
+    if frequency == 'W':
+        return index.to_period('W').asi8
+    return (index.year * 12 + index.month - 1) // REBALANCE_MONTHS[frequency]
+
+
+def _simulate(log_growth, targets, rows):
+    """
+    Simulates (variants x rebalances x assets) `targets` traded on the positions `rows`.
+
+    Returns:
+        tuple: (value, turnover, drift): value (variants x dates) before costs, NaN before
+               the first trade; turnover and drift (variants x rebalances).
+    """
+    n_variants, n_rebalances, n_assets = targets.shape
+    n_dates = len(log_growth)
+    value = np.full((n_variants, n_dates), np.nan)
+    turnover = np.empty((n_variants, n_rebalances))
+    drift = np.full((n_variants, n_rebalances), np.nan)
+
+    held = np.zeros((n_variants, n_assets))
+    level = np.ones(n_variants)
+    for j, row in enumerate(rows):
+        target = targets[:, j]
+        turnover[:, j] = np.abs(target - held).sum(axis=1)
+        if j:
+            drift[:, j] = np.abs(held - targets[:, j - 1]).sum(axis=1)
+        value[:, row] = level
+        end = rows[j + 1] if j + 1 < len(rows) else n_dates - 1
+        if end == row:
+            continue
+        # Growth of every asset since the rebalance, for all the dates of the period at once
+        growth = np.exp(log_growth[row + 1:end + 1] - log_growth[row])
+        cash = 1.0 - target.sum(axis=1)
+        ratio = target @ growth.T + cash[:, None]
+        value[:, row + 1:end + 1] = level[:, None] * ratio
+        with np.errstate(divide='ignore', invalid='ignore'):
+            held = target * growth[-1] / ratio[:, -1:]
+        level = level * ratio[:, -1]
+    return value, turnover, drift
+
+
+def run_backtest(
+    weights,
+    codes=None,
+    series_group=None,
+    recursive=False,
+    rebalance='M',
+    transaction_cost=0.0,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    session=None,
+):
+    """
+    Backtests weight schedules over stored series (see `app.analytics.load_panel`), with the
+    rebalance frequency checked against the series' `time_frequency`.
+
+    Parameters:
+        weights (DataFrame or dict): As in `backtest`, with columns named by TimeSeries code.
+        codes, series_group, recursive: The universe; defaults to the codes of the weights.
+        rebalance (str, optional): As in `backtest`.
+        levels (bool): If True, the stored values are levels and are turned into returns first.
+
+    Returns:
+        BacktestResult: As `backtest`.
+    """
+    if session is None:
+        session = db.session
+    if codes is None and series_group is None:
+        schedules = weights.values() if isinstance(weights, dict) else [weights]
+        codes = list(dict.fromkeys(code for schedule in schedules for code in schedule.columns))
+    panel, metadata = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    returns = simple_returns(panel) if levels else panel
+    # The finest frequency of the universe bounds the rebalance frequency
+    frequencies = [frequency for frequency in metadata['time_frequency'] if frequency in PERIODS_PER_YEAR]
+    time_frequency = max(frequencies, key=PERIODS_PER_YEAR.get) if frequencies else None
+    return backtest(returns, weights, rebalance=rebalance, transaction_cost=transaction_cost,
+                    time_frequency=time_frequency)
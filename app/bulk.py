@@ -0,0 +1,101 @@
+# app/bulk.py
+
+"""
+Bulk writes of TimeSeries and DataPoints with Core statements, for loads too large for the ORM.
+
+Core statements bypass the flush events that keep the group statistics, the search indexes
+and the search cache current: after writing, call `refresh_series` with the ids of the series
+written, or `refresh_after_bulk_load` to rebuild everything.
+"""
+
+import numpy as np
+from app import db
+from .models import SeriesBase, TimeSeries, DataPoint, SeriesGroupStats
+from .fulltext import rebuild_search_index, sync_search_documents, sync_trigrams, REBUILD_BATCH_SIZE
+from .search_index import get_catalog_index, load_catalog_entries
+from .search_cache import catalog_version, data_point_changes
+
+
+def insert_time_series(connection, rows):
+    """
+    Inserts TimeSeries rows ({name, code, time_frequency, delta_type, description, type_id})
+    with Core statements and returns their ids, in order.
+    """
+    sb = SeriesBase.__table__
+    ts = TimeSeries.__table__
+    result = connection.execute(
+        sb.insert().returning(sb.c.id, sort_by_parameter_order=True),
+        [{'name': row['name'], 'description': row.get('description'), 'type': 'time_series'} for row in rows]
+    )
+    series_ids = result.scalars().all()
+    connection.execute(ts.insert(), [
+        {
+            'id': series_id,
+            'time_series_code': row['code'],
+            'time_frequency': row.get('time_frequency'),
+            'delta_type': row.get('delta_type'),
+            'type_id': row.get('type_id'),
+        }
+        for series_id, row in zip(series_ids, rows)
+    ])
+    return series_ids
+
+
+def insert_data_points(connection, series_ids, dates, values):
+    """
+    Inserts the non-missing `values` (dates x series) as DataPoints; returns their number.
+    """
+    rows, columns = np.nonzero(~np.isnan(values))
+    if not len(rows):
+        return 0
+    series_ids = np.asarray(series_ids)
+    connection.execute(DataPoint.__table__.insert(), [
+        {'time_series_id': int(series_id), 'date': date, 'value': float(value)}
+        for series_id, date, value in zip(series_ids[columns], dates[rows], values[rows, columns])
+    ])
+    return len(rows)
+
+
+def refresh_series(series_ids, session=None):
+    """
+    Does what the flush events would have for series written with Core statements: group
+    statistics, search indexes (the in-memory one on commit), search cache and the record of
+    changed data points of the correlation stores.
+
+    Parameters:
+        series_ids (list of int): Ids of the series written.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    connection = session.connection()
+    catalog_index = get_catalog_index(session)
+    for first in range(0, len(series_ids), REBUILD_BATCH_SIZE):
+        batch = series_ids[first:first + REBUILD_BATCH_SIZE]
+        SeriesGroupStats.refresh(batch, session=session)
+        sync_search_documents(batch, session=session)
+        sync_trigrams(batch, session=session)
+        if catalog_index.is_built:
+            session.info.setdefault('catalog_index_updates', {}).update(
+                {entry.id: entry for entry in load_catalog_entries(connection, batch)}
+            )
+    catalog_version.bump()
+    data_point_changes.record(series_ids)
+
+
+def refresh_after_bulk_load(session=None):
+    """
+    Brings the group statistics, search indexes and caches up to date after Core inserts,
+    rebuilding them entirely.
+
+    Parameters:
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    SeriesGroupStats.rebuild(session=session, commit=False)
+    rebuild_search_index(session=session, commit=False)
+    catalog_index = get_catalog_index(session)
+    if catalog_index.is_built:
+        catalog_index.build(session=session)
+    catalog_version.bump()
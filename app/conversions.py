@@ -0,0 +1,303 @@
+# app/conversions.py
+
+"""
+Conversions between levels and changes of panels of series, following each column's
+`delta_type`.
+
+A 'pct' series moves by relative changes: its changes are simple returns (or log returns)
+and its levels compound them. An 'abs' series moves by absolute changes: its changes are
+differences and its levels are their cumulative sum. Each transform handles every column of
+a panel in one vectorized pass, choosing the formula per column with a mask.
+
+Missing values (NaN) are skipped rather than propagated: a change is measured from the
+previous observation of the column, and levels are NaN before the first observation of a
+column (staggered starts) and where its change is missing, without breaking the compounding.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from app import db
+from .models import (
+    SeriesBase, TimeSeries, TimeSeriesType, DataPoint, DELTA_TYPES, DEFAULT_DELTA_TYPE, CODE_MAX_LEN
+)
+from .analytics import load_panel
+from .bulk import insert_time_series, insert_data_points, refresh_series
+
+CONVERSIONS = ['changes', 'levels', 'rebased']
+
+# Code suffix and name suffix of the derived series of each conversion
+DERIVED_SUFFIXES = {'changes': ('_C', 'changes'), 'levels': ('_L', 'levels'), 'rebased': ('_R', 'rebased')}
+
+# TimeSeriesType of the derived series of each conversion. It records what they hold, since
+# they keep the delta_type of their source: e.g. the changes of a 'pct' series are returns,
+# which only 'levels' can convert.
+DERIVED_TYPES = {'changes': 'Derived changes', 'levels': 'Derived levels', 'rebased': 'Derived rebased levels'}
+
+
+def _pct_columns(delta_type, n_columns):
+    """
+    Boolean mask of the 'pct' columns, from one delta_type for every column or one per column
+    (None values default to DEFAULT_DELTA_TYPE).
+    """
+    if delta_type is None or isinstance(delta_type, str):
+        delta_type = [delta_type] * n_columns
+    delta_type = list(delta_type)
+    if len(delta_type) != n_columns:
+        raise ValueError("delta_type must have one value per column.")
+    mask = np.empty(n_columns, dtype=bool)
+    for i, value in enumerate(delta_type):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            value = DEFAULT_DELTA_TYPE
+        if value not in DELTA_TYPES:
+            raise ValueError("delta_type must be one of the following: " + ", ".join(DELTA_TYPES))
+        mask[i] = value == 'pct'
+    return mask
+
+
+def _previous_observation(values):
+    """
+    Value of the last observation strictly before every row, per column (NaN if none).
+    """
+    rows = np.where(~np.isnan(values), np.arange(len(values))[:, None], -1)
+    previous_row = np.maximum.accumulate(rows, axis=0)
+    previous_row = np.vstack([np.full((1, values.shape[1]), -1), previous_row[:-1]])
+    return np.where(
+        previous_row >= 0,
+        np.take_along_axis(values, np.maximum(previous_row, 0), axis=0),
+        np.nan
+    )
+
+
+def levels_to_changes(levels, delta_type=None, log=False):
+    """
+    Changes between consecutive observations of each column of a panel of levels.
+
+    Parameters:
+        levels (DataFrame): Levels indexed by date.
+        delta_type (str, list or Series, optional): 'pct' or 'abs' for every column, or one per
+                                                    column. Defaults to DEFAULT_DELTA_TYPE.
+        log (bool): If True, 'pct' columns get log returns instead of simple returns.
+
+    Returns:
+        DataFrame: Simple (or log) returns of the 'pct' columns and differences of the 'abs'
+                   ones, NaN at the first observation of each column and where levels are missing.
+    """
+    values = levels.to_numpy(dtype=float)
+    pct = _pct_columns(delta_type, values.shape[1])
+    previous = _previous_observation(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.log(values / previous) if log else values / previous - 1.0
+    changes = np.where(pct, relative, values - previous)
+    return pd.DataFrame(changes, index=levels.index, columns=levels.columns)
+
+
+def changes_to_levels(changes, delta_type=None, log=False, base=100.0, abs_base=0.0):
+    """
+    Cumulative levels of each column of a panel of changes: compounded returns for 'pct'
+    columns, cumulative sums for 'abs' ones, starting from the level before the first change.
+
+    Parameters:
+        changes (DataFrame): Changes indexed by date.
+        delta_type (str, list or Series, optional): As in `levels_to_changes`.
+        log (bool): If True, the changes of 'pct' columns are log returns.
+        base (float): Level of 'pct' columns before their first change.
+        abs_base (float): Level of 'abs' columns before their first change.
+
+    Returns:
+        DataFrame: Levels, NaN where the change is missing.
+    """
+    values = changes.to_numpy(dtype=float)
+    pct = _pct_columns(delta_type, values.shape[1])
+    observed = ~np.isnan(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        increments = np.where(pct, values if log else np.log1p(values), values)
+    cumulative = np.cumsum(np.where(observed, increments, 0.0), axis=0)
+    with np.errstate(over='ignore'):
+        levels = np.where(pct, base * np.exp(cumulative), abs_base + cumulative)
+    return pd.DataFrame(np.where(observed, levels, np.nan), index=changes.index, columns=changes.columns)
+
+
+def rebase_levels(levels, delta_type=None, at=None, base=100.0, abs_base=0.0):
+    """
+    Rebases each column of a panel of levels: 'pct' columns are scaled and 'abs' columns are
+    shifted so that their level at `at` is `base` (resp. `abs_base`).
+
+    Parameters:
+        at (str or date, optional): Date of the rebasing; the last observation on or before it
+                                    is used. Defaults to the first observation of each column.
+
+    Returns:
+        DataFrame: Rebased levels; columns without an observation on or before `at` are NaN.
+    """
+    values = levels.to_numpy(dtype=float)
+    pct = _pct_columns(delta_type, values.shape[1])
+    observed = ~np.isnan(values)
+    if at is None:
+        rows = np.argmax(observed, axis=0)
+        has_reference = observed.any(axis=0)
+    else:
+        end = levels.index.searchsorted(pd.Timestamp(at), side='right')
+        last = np.where(observed[:end], np.arange(end)[:, None], -1).max(axis=0, initial=-1)
+        rows, has_reference = np.maximum(last, 0), last >= 0
+    reference = np.where(has_reference, values[rows, np.arange(values.shape[1])], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rebased = np.where(pct, values / reference * base, values - reference + abs_base)
+    return pd.DataFrame(rebased, index=levels.index, columns=levels.columns)
+
+
+def convert_series(
+    conversion,
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    log=False,
+    at=None,
+    base=100.0,
+    abs_base=0.0,
+    persist=False,
+    session=None,
+    commit=True,
+):
+    """
+    Converts stored series (see `app.analytics.load_panel`) following their `delta_type`:
+    'changes' from levels, 'levels' from changes, or 'rebased' levels.
+
+    Parameters:
+        conversion (str): One of CONVERSIONS.
+        log, base, abs_base, at: As in `levels_to_changes`, `changes_to_levels` and `rebase_levels`.
+        persist (bool): If True, saves every converted column as a TimeSeries whose code is the
+                        source code with the suffix of DERIVED_SUFFIXES and whose type is that of
+                        DERIVED_TYPES, with bulk inserts. A derived series saved before gets its
+                        data points replaced; any other series with the code of a derived one
+                        raises ValueError.
+        commit (bool): With `persist`, commit the transaction.
+
+    Returns:
+        DataFrame: The converted panel, one column per source code.
+
+    Derived series only convert back the other way: 'levels' raises ValueError on derived
+    levels or rebased levels, 'changes' and 'rebased' on derived changes.
+    """
+    if conversion not in CONVERSIONS:
+        raise ValueError("conversion must be one of the following: " + ", ".join(CONVERSIONS))
+    if session is None:
+        session = db.session
+    panel, metadata = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    _check_derived_sources(metadata, conversion, session)
+    delta_type = metadata['delta_type']
+    if conversion == 'changes':
+        result = levels_to_changes(panel, delta_type, log=log)
+    elif conversion == 'levels':
+        result = changes_to_levels(panel, delta_type, log=log, base=base, abs_base=abs_base)
+    else:
+        result = rebase_levels(panel, delta_type, at=at, base=base, abs_base=abs_base)
+    if persist:
+        _persist_derived(result, metadata, conversion, session)
+        if commit:
+            session.commit()
+    return result
+
+
+def _check_derived_sources(metadata, conversion, session):
+    """
+    Raises ValueError if `conversion` does not apply to some derived series of `metadata`.
+    """
+    holds_changes = ['changes'] if conversion != 'levels' else ['levels', 'rebased']
+    ts = TimeSeries.__table__
+    tst = TimeSeriesType.__table__
+    wrong = session.execute(
+        select(ts.c.time_series_code)
+        .join(tst, tst.c.id == ts.c.type_id)
+        .where(
+            ts.c.id.in_(metadata['id'].tolist()),
+            tst.c.name.in_([DERIVED_TYPES[kind] for kind in holds_changes]),
+        )
+        .order_by(ts.c.time_series_code)
+    ).scalars().all()
+    if wrong:
+        raise ValueError(
+            f"Cannot compute the {conversion} of derived " + " or ".join(holds_changes)
+            + " series: " + ", ".join(wrong)
+        )
+
+
+def _derived_type_id(connection, conversion):
+    """
+    Id of the TimeSeriesType of the derived series of `conversion`, created on first use.
+    """
+    tst = TimeSeriesType.__table__
+    name = DERIVED_TYPES[conversion]
+    type_id = connection.execute(select(tst.c.id).where(tst.c.name == name)).scalar()
+    if type_id is None:
+        type_id = connection.execute(
+            tst.insert().returning(tst.c.id),
+            {'name': name, 'description': f"Series saved by convert_series('{conversion}', persist=True)"}
+        ).scalar()
+    return type_id
+
+
+def _persist_derived(panel, metadata, conversion, session):
+    """
+    Saves the columns of `panel` as the derived TimeSeries of the series of `metadata`.
+    Derived series are recognized by their name (the source name, truncated to fit the name
+    column if needed, and the name suffix of DERIVED_SUFFIXES): other series with a derived
+    code are never overwritten.
+    """
+    code_suffix, name_suffix = DERIVED_SUFFIXES[conversion]
+    codes = [f"{code}{code_suffix}" for code in panel.columns]
+    too_long = [code for code in codes if len(code) > CODE_MAX_LEN]
+    if too_long:
+        raise ValueError(f"Derived codes must be {CODE_MAX_LEN} characters or less: " + ", ".join(too_long))
+    name_length = SeriesBase.__table__.c.name.type.length - len(name_suffix) - 3
+    names = {
+        code: f"{metadata.at[source, 'name'][:name_length]} ({name_suffix})"
+        for source, code in zip(panel.columns, codes)
+    }
+
+    connection = session.connection()
+    ts = TimeSeries.__table__
+    sb = SeriesBase.__table__
+    rows = connection.execute(
+        select(ts.c.time_series_code, ts.c.id, sb.c.name)
+        .join(sb, sb.c.id == ts.c.id)
+        .where(ts.c.time_series_code.in_(codes))
+    ).all()
+    foreign = sorted(code for code, _, name in rows if name != names[code])
+    if foreign:
+        raise ValueError(
+            f"Series with the codes of {conversion} series already exist and were not derived "
+            + "from their sources: " + ", ".join(foreign)
+        )
+    existing = {code: series_id for code, series_id, _ in rows}
+    type_id = _derived_type_id(connection, conversion)
+    if existing:
+        connection.execute(DataPoint.__table__.delete().where(
+            DataPoint.__table__.c.time_series_id.in_(list(existing.values()))
+        ))
+        connection.execute(
+            sb.update().where(sb.c.id.in_(list(existing.values()))).values(date_update=func.now())
+        )
+        connection.execute(ts.update().where(ts.c.id.in_(list(existing.values()))).values(type_id=type_id))
+    new_rows = [
+        {
+            'name': names[code],
+            'code': code,
+            'time_frequency': metadata.at[source, 'time_frequency'],
+            'delta_type': metadata.at[source, 'delta_type'],
+            'type_id': type_id,
+        }
+        for source, code in zip(panel.columns, codes) if code not in existing
+    ]
+    if new_rows:
+        existing.update(zip([row['code'] for row in new_rows], insert_time_series(connection, new_rows)))
+
+    series_ids = [existing[code] for code in codes]
+    insert_data_points(connection, series_ids, panel.index.date, panel.to_numpy(dtype=float))
+    refresh_series(series_ids, session=session)
@@ -0,0 +1,248 @@
+# app/correlation_store.py
+
+"""
+Correlation and covariance matrices of a fixed universe of stored series, maintained
+incrementally.
+
+A CorrelationStore keeps the pairwise sums of its universe (see `app.covariance.pairwise_sums`)
+rather than the data: reading the matrices is O(N²), whatever the length of the history.
+Sums are additive over dates, so new data points only cost the dates they touch: every refresh
+loads the points added since the last one (data_point ids above the store's watermark, e.g. from
+`TimeSeries.upsert_data_points`), and for each date they touch it removes the contribution of
+the date as it was and adds the contribution of the date as it is now. New dates, late points on
+old dates and revisions (new points of an existing date) are all handled this way; a date uses
+the same preferred value as `app.analytics.load_panel`.
+
+Changes that cannot be replayed from new points (points updated in place or deleted, series
+added to or removed from the universe, or too many touched dates) rebuild the sums from scratch.
+Values are used as stored (e.g. periodic returns), shifted by fixed per-column references taken
+at the last rebuild to keep the sums accurate.
+
+A refresh with nothing new costs the metadata of the universe and the largest data point id,
+never an aggregate over the data points: updates and deletions are not visible from ids, so
+the flush events of `app.search_cache` (and `app.bulk.refresh_series`, for Core writes) record
+them in `data_point_changes`. Like `app.search_cache.catalog_version`, the record is local to the
+process: updates and deletions made by other processes only show up after `clear()`.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from app import db
+from .models import DataPoint, SeriesGroup, _pivot_panel, _preferred_last
+from .analytics import load_metadata
+from .search_cache import data_point_changes, max_data_point_id
+from .covariance import PairwiseSums, pairwise_sums, covariance_from_sums, correlation_from_sums
+from .fulltext import REBUILD_BATCH_SIZE
+
+# Results of CorrelationStore.refresh
+REFRESH_RESULTS = ['built', 'updated', 'current']
+
+
+class CorrelationStore:
+    """
+    Pairwise sums of the series selected by `codes` or `series_group` (see `load_panel`),
+    refreshed from the database on demand. Thread-safe.
+    """
+
+    def __init__(self, codes=None, series_group=None, recursive=False, min_periods=2):
+        if (codes is None) == (series_group is None):
+            raise ValueError("Exactly one of codes and series_group must be given.")
+        self.codes = list(codes) if codes is not None else None
+        self.series_group = series_group
+        self.recursive = recursive
+        self.min_periods = min_periods
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets the sums; the next refresh rebuilds them.
+        """
+        self.metadata = None
+        self.shift = None
+        self.watermark = None
+        self.generation = None
+        self._n = self._sum_x = self._sum_xx = self._sum_xy = None
+
+    @property
+    def is_built(self):
+        return self.metadata is not None
+
+    @property
+    def sums(self):
+        """
+        PairwiseSums of the shifted values (sum_y and sum_yy are views of sum_x and sum_xx).
+        """
+        return PairwiseSums(
+            n=self._n, sum_x=self._sum_x, sum_y=self._sum_x.T,
+            sum_xx=self._sum_xx, sum_yy=self._sum_xx.T, sum_xy=self._sum_xy,
+        )
+
+    def refresh(self, session=None):
+        """
+        Brings the sums up to date with the stored data points.
+
+        Parameters:
+            session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+
+        Returns:
+            str: One of REFRESH_RESULTS: 'built' (from scratch), 'updated' (from new points)
+                 or 'current' (nothing new).
+        """
+        if session is None:
+            session = db.session
+        with self._lock:
+            metadata = load_metadata(self.codes, self.series_group, self.recursive, session)
+            if not self.is_built or not metadata['id'].equals(self.metadata['id']):
+                self._build(metadata, session)
+                return 'built'
+            series_ids = metadata['id'].tolist()
+            if data_point_changes.changed_since(self.generation, series_ids):
+                self._build(metadata, session)
+                return 'built'
+
+            # Any data point id (the primary key), not only those of the universe: one index lookup
+            dp = DataPoint.__table__
+            watermark = max_data_point_id(session)
+            if watermark <= self.watermark:
+                return 'current'
+            dates = session.execute(
+                select(dp.c.date).distinct().where(
+                    dp.c.time_series_id.in_(series_ids),
+                    dp.c.id > self.watermark,
+                    dp.c.id <= watermark,
+                )
+            ).scalars().all()
+            if not dates:
+                self.watermark = watermark
+                return 'current'
+            if len(dates) > REBUILD_BATCH_SIZE:
+                self._build(metadata, session)
+                return 'built'
+
+            before = self._values(_load_points(series_ids, self.watermark, session, dates=dates))
+            after = self._values(_load_points(series_ids, watermark, session, dates=dates))
+            removed = pairwise_sums(before.reindex(after.index).to_numpy())
+            added = pairwise_sums(after.to_numpy())
+            self._n += added.n - removed.n
+            self._sum_x += added.sum_x - removed.sum_x
+            self._sum_xx += added.sum_xx - removed.sum_xx
+            self._sum_xy += added.sum_xy - removed.sum_xy
+            self.watermark = watermark
+            return 'updated'
+
+    def _build(self, metadata, session):
+        series_ids = metadata['id'].tolist()
+        # Taken before loading: changes recorded while loading trigger another rebuild
+        generation = data_point_changes.generation
+        watermark = max_data_point_id(session)
+        self.metadata = metadata
+        panel = _load_points(series_ids, watermark, session).to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            self.shift = np.nan_to_num(np.nanmean(panel, axis=0)) if len(panel) else np.zeros(len(series_ids))
+        sums = pairwise_sums(panel - self.shift)
+        self._n, self._sum_x, self._sum_xx, self._sum_xy = sums.n, sums.sum_x, sums.sum_xx, sums.sum_xy
+        self.watermark = watermark
+        self.generation = generation
+
+    def _values(self, panel):
+        """
+        Shifted values of a panel of `_load_points`, in the column order of the store.
+        """
+        return panel.reindex(columns=self.metadata['id']) - self.shift
+
+    def covariance(self, ddof=1, refresh=True, session=None):
+        """
+        Pairwise-complete covariance matrix (as `app.covariance.pairwise_covariance`).
+
+        Parameters:
+            refresh (bool): If True, refresh the sums first; otherwise serve them as they are.
+
+        Returns:
+            DataFrame: (codes x codes) covariances, NaN for pairs with fewer than
+                       `min_periods` shared dates.
+        """
+        if refresh or not self.is_built:
+            self.refresh(session=session)
+        with self._lock:
+            covariance = covariance_from_sums(self.sums, ddof=ddof, min_periods=self.min_periods)
+            return pd.DataFrame(covariance, index=self.metadata.index, columns=self.metadata.index)
+
+    def correlation(self, refresh=True, session=None):
+        """
+        Pairwise-complete correlation matrix (as pandas' `DataFrame.corr`).
+
+        Returns:
+            DataFrame: (codes x codes) correlations, NaN for pairs with fewer than
+                       `min_periods` shared dates or a constant value.
+        """
+        if refresh or not self.is_built:
+            self.refresh(session=session)
+        with self._lock:
+            correlation = correlation_from_sums(self.sums, min_periods=self.min_periods)
+            return pd.DataFrame(correlation, index=self.metadata.index, columns=self.metadata.index)
+
+
+def _load_points(series_ids, max_id, session, dates=None):
+    """
+    Panel (dates x series ids) of the data points with an id up to `max_id`, on `dates` only
+    if given, with the preferred value of every date as in `load_panel`.
+    """
+    dp = DataPoint.__table__
+    conditions = [dp.c.time_series_id.in_(series_ids), dp.c.id <= max_id]
+    if dates is not None:
+        conditions.append(dp.c.date.in_(dates))
+    rows = session.execute(
+        select(dp.c.time_series_id, dp.c.time_series_id, dp.c.date, dp.c.value)
+        .where(*conditions)
+        .order_by(dp.c.time_series_id, dp.c.date, *_preferred_last(dp))
+    ).all()
+    return _pivot_panel(
+        [(series_id, series_id, str(date), value) for series_id, _, date, value in rows],
+        columns=[(series_id, series_id) for series_id in series_ids],
+    )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_correlation_store(codes=None, series_group=None, recursive=False, min_periods=2, session=None):
+    """
+    Returns the CorrelationStore of a universe, created on first use and shared afterwards
+    (one per database, universe and options).
+
+    Parameters:
+        codes (list of str, optional): Codes of the TimeSeries of the universe.
+        series_group (SeriesGroup or str, optional): Group (or its code) whose members form the
+                                                     universe, instead of `codes`.
+        recursive (bool): With `series_group`, also include members of nested groups.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    if isinstance(series_group, SeriesGroup):
+        series_group = series_group.series_group_code
+    key = (
+        str(session.get_bind().url),
+        tuple(codes) if codes is not None else None,
+        series_group,
+        recursive,
+        min_periods,
+    )
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CorrelationStore(
+                codes=codes, series_group=series_group, recursive=recursive, min_periods=min_periods
+            )
+        return _stores[key]
+
+
+def clear_correlation_stores():
+    """
+    Forgets every shared CorrelationStore.
+    """
+    with _stores_lock:
+        _stores.clear()
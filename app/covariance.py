@@ -0,0 +1,381 @@
+# app/covariance.py
+
+"""
+Covariance matrices of large panels of series with different histories.
+
+Covariances are pairwise-complete: the covariance of two assets uses the dates where both
+are known, as pandas' `DataFrame.cov`. They are computed from pairwise sums obtained with
+masked matrix products (BLAS), one pair of column blocks at a time, so temporary memory is
+bounded by the block size while the products run at full speed:
+
+    n    = M'M       (dates shared by every pair, M the 0/1 matrix of known values)
+    Sx   = X'M       (sum of x_i over the dates where x_j is known, X zero-filled)
+    Sxy  = X'X       (sum of x_i x_j over the shared dates)
+
+The sums are additive over disjoint sets of dates, which lets them be maintained
+incrementally (see `pairwise_sums`).
+
+Shrinkage estimators (Ledoit-Wolf towards a scaled identity, and towards constant
+correlation) follow the published formulas with every sample moment taken over the dates
+shared by each pair; they reduce to the textbook estimators on complete panels. Pairs without
+enough shared dates take the value of the shrinkage target. `nearest_psd` repairs matrices
+that are not positive semi-definite, which pairwise-complete estimates need not be.
+"""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from app import db
+from .analytics import load_metadata, load_metadata_panel, simple_returns
+from .search_cache import SearchCache, data_point_changes, max_data_point_id
+
+COVARIANCE_METHODS = ['sample', 'ledoit_wolf', 'constant_correlation']
+
+PairwiseSums = namedtuple('PairwiseSums', ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy'])
+
+# Estimates are large and returned as is: callers must not modify them. Keys hold the version
+# of the data points (`_data_version`), so catalog changes do not invalidate them.
+covariance_cache = SearchCache(max_entries=16, ttl=3600.0, copy_values=False, version=None)
+
+
+def pairwise_sums(x, y=None, squares=True):
+    """
+    Sums over the dates where both values of a pair are known, for every pair of a column of
+    `x` and a column of `y`.
+
+    Parameters:
+        x (ndarray): (dates x assets) values, NaN where missing.
+        y (ndarray, optional): (dates x assets) values on the same dates. Defaults to `x`.
+        squares (bool): If False, skip sum_xx and sum_yy (None), which covariances do not need.
+
+    Returns:
+        PairwiseSums: (x columns x y columns) arrays n (shared dates), sum_x, sum_y, sum_xx,
+                      sum_yy and sum_xy. Sums of disjoint sets of dates add up.
+    """
+    x_known, x_filled = _masked(x)
+    if y is None:
+        y_known, y_filled = x_known, x_filled
+    else:
+        y_known, y_filled = _masked(y)
+    return PairwiseSums(
+        n=x_known.T @ y_known,
+        sum_x=x_filled.T @ y_known,
+        sum_y=x_known.T @ y_filled,
+        sum_xx=(x_filled * x_filled).T @ y_known if squares else None,
+        sum_yy=x_known.T @ (y_filled * y_filled) if squares else None,
+        sum_xy=x_filled.T @ y_filled,
+    )
+
+
+def covariance_from_sums(sums, ddof=1, min_periods=2):
+    """
+    Pairwise covariances from PairwiseSums, NaN for pairs with fewer than `min_periods`
+    shared dates.
+    """
+    n = sums.n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = (sums.sum_xy - sums.sum_x * sums.sum_y / n) / (n - ddof)
+    covariance[n < max(min_periods, ddof + 1)] = np.nan
+    return covariance
+
+
+def correlation_from_sums(sums, min_periods=2):
+    """
+    Pairwise correlations from PairwiseSums, NaN for pairs with fewer than `min_periods`
+    shared dates or a constant value.
+    """
+    n = sums.n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sums.sum_xy - sums.sum_x * sums.sum_y / n
+        variance_x = np.maximum(sums.sum_xx - sums.sum_x * sums.sum_x / n, 0.0)
+        variance_y = np.maximum(sums.sum_yy - sums.sum_y * sums.sum_y / n, 0.0)
+        correlation = np.clip(covariance / np.sqrt(variance_x * variance_y), -1.0, 1.0)
+    correlation[n < max(min_periods, 2)] = np.nan
+    return correlation
+
+
+def pairwise_covariance(values, ddof=1, min_periods=2, block_size=1024):
+    """
+    Pairwise-complete covariance matrix of the columns of a (dates x assets) array with NaN
+    for missing values. Equal to pandas' `DataFrame.cov(min_periods=...)` for ddof=1.
+
+    Parameters:
+        block_size (int): Number of columns per block; temporaries are O(dates x block_size)
+                          and O(block_size ** 2).
+    """
+    centered = _centered(values)
+    n_columns = centered.shape[1]
+    covariance = np.empty((n_columns, n_columns))
+    for rows, columns in _block_pairs(n_columns, block_size):
+        block = covariance_from_sums(
+            pairwise_sums(centered[:, rows], centered[:, columns], squares=False),
+            ddof=ddof, min_periods=min_periods,
+        )
+        covariance[rows, columns] = block
+        covariance[columns, rows] = block.T
+    return covariance
+
+
+def ledoit_wolf_shrinkage(values, min_periods=2, block_size=1024):
+    """
+    Ledoit-Wolf (2004) shrinkage of the (biased, ddof=0) pairwise covariance matrix towards
+    a scaled identity. Equal to `sklearn.covariance.ledoit_wolf` on complete data.
+
+    Returns:
+        tuple: (covariance ndarray, shrinkage intensity in [0, 1]).
+    """
+    centered = _centered(values)
+    n_columns = centered.shape[1]
+    sample = np.empty((n_columns, n_columns))
+    # Sum over pairs of the estimated variance of each sample covariance
+    estimation_variance = 0.0
+    for rows, columns in _block_pairs(n_columns, block_size):
+        x, y = centered[:, rows], centered[:, columns]
+        sums = pairwise_sums(x, y, squares=False)
+        block = covariance_from_sums(sums, ddof=0, min_periods=min_periods)
+        sample[rows, columns] = block
+        sample[columns, rows] = block.T
+        fourth = _filled_power(x, 2).T @ _filled_power(y, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = (fourth / sums.n - block * block) / sums.n
+        estimation_variance += _pair_weight(rows, columns) * np.nansum(terms)
+
+    if n_columns == 0:
+        return sample, 0.0
+    mu = np.nanmean(np.diag(sample))
+    target = mu * np.eye(n_columns)
+    distance = np.nansum((sample - target) ** 2) / n_columns
+    beta = min(estimation_variance / n_columns, distance)
+    shrinkage = beta / distance if distance > 0 else 0.0
+    return _shrink(sample, target, shrinkage), shrinkage
+
+
+def constant_correlation_shrinkage(values, min_periods=2, block_size=1024):
+    """
+    Ledoit-Wolf (2003) shrinkage of the (biased, ddof=0) pairwise covariance matrix towards
+    the constant correlation model: every correlation replaced by the average correlation.
+
+    Returns:
+        tuple: (covariance ndarray, shrinkage intensity in [0, 1]).
+    """
+    centered = _centered(values)
+    n_columns = centered.shape[1]
+    variance = _column_mean(centered * centered)
+    sample = np.empty((n_columns, n_columns))
+    # Sums over pairs, each term divided by the pair's number of shared dates:
+    # pi (variances of the sample covariances) and the parts of rho (their covariances
+    # with the sample variances) before the factor (average correlation / 2)
+    pi = 0.0
+    rho_diagonal = 0.0
+    rho_off_diagonal = 0.0
+    for rows, columns in _block_pairs(n_columns, block_size):
+        x, y = centered[:, rows], centered[:, columns]
+        sums = pairwise_sums(x, y)
+        n = sums.n
+        block = covariance_from_sums(sums, ddof=0, min_periods=min_periods)
+        sample[rows, columns] = block
+        sample[columns, rows] = block.T
+
+        fourth = _filled_power(x, 2).T @ _filled_power(y, 2)
+        cube_x = _filled_power(x, 3).T @ _filled_power(y, 1)
+        cube_y = _filled_power(x, 1).T @ _filled_power(y, 3)
+        var_x = variance[rows][:, None]
+        var_y = variance[columns][None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pi_terms = (fourth / n - 2 * block * sums.sum_xy / n + block * block) / n
+            theta_x = (cube_x - block * sums.sum_xx - var_x * sums.sum_xy + n * var_x * block) / n
+            theta_y = (cube_y - block * sums.sum_yy - var_y * sums.sum_xy + n * var_y * block) / n
+            rho_terms = (np.sqrt(var_y / var_x) * theta_x + np.sqrt(var_x / var_y) * theta_y) / n
+
+        weight = _pair_weight(rows, columns)
+        pi += weight * np.nansum(pi_terms)
+        if rows == columns:
+            diagonal = np.eye(block.shape[0], dtype=bool)
+            rho_diagonal += np.nansum(pi_terms[diagonal])
+            rho_terms[diagonal] = 0.0
+        rho_off_diagonal += weight * np.nansum(rho_terms)
+
+    if n_columns < 2:
+        return sample, 0.0
+    volatility = np.sqrt(np.diag(sample))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = sample / np.outer(volatility, volatility)
+    off_diagonal = ~np.eye(n_columns, dtype=bool)
+    average_correlation = np.nanmean(correlation[off_diagonal])
+    target = average_correlation * np.outer(volatility, volatility)
+    np.fill_diagonal(target, np.diag(sample))
+
+    rho = rho_diagonal + average_correlation / 2 * rho_off_diagonal
+    gamma = np.nansum((target - sample) ** 2)
+    shrinkage = float(np.clip((pi - rho) / gamma, 0.0, 1.0)) if gamma > 0 else 0.0
+    return _shrink(sample, target, shrinkage), shrinkage
+
+
+def nearest_psd(matrix, min_eigenvalue=0.0):
+    """
+    Repairs a symmetric matrix into a positive semi-definite one with the same diagonal:
+    eigenvalues below `min_eigenvalue` are raised to it and the result is rescaled to the
+    original variances (a congruence, which keeps it PSD). NaN entries count as 0.
+    """
+    matrix = np.nan_to_num(np.asarray(matrix, dtype=float))
+    matrix = (matrix + matrix.T) / 2
+    if not len(matrix):
+        return matrix
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    if eigenvalues[0] >= min_eigenvalue:
+        return matrix
+    repaired = (eigenvectors * np.maximum(eigenvalues, min_eigenvalue)) @ eigenvectors.T
+    diagonal = np.diag(repaired)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(diagonal > 0, np.sqrt(np.diag(matrix) / diagonal), 0.0)
+    repaired = repaired * np.outer(scale, scale)
+    return (repaired + repaired.T) / 2
+
+
+def covariance_matrix(panel, method='sample', min_periods=2, psd=False, block_size=1024):
+    """
+    Covariance matrix of the columns of a (dates x assets) panel with missing values.
+
+    Parameters:
+        panel (DataFrame): Values (usually returns) indexed by date, one column per asset.
+        method (str): One of COVARIANCE_METHODS. 'sample' is the pairwise-complete sample
+                      covariance (ddof=1); the shrinkage methods shrink the ddof=0 one.
+        min_periods (int): Minimum number of shared dates for a pair covariance.
+        psd (bool): If True, repair the result with `nearest_psd`.
+        block_size (int): Number of columns per block (bounds temporary memory).
+
+    Returns:
+        DataFrame: (assets x assets) covariances; attrs['shrinkage'] holds the shrinkage
+                   intensity (0 for 'sample').
+    """
+    if method not in COVARIANCE_METHODS:
+        raise ValueError("method must be one of the following: " + ", ".join(COVARIANCE_METHODS))
+    values = panel.to_numpy(dtype=float)
+    if method == 'sample':
+        covariance = pairwise_covariance(values, min_periods=min_periods, block_size=block_size)
+        shrinkage = 0.0
+    elif method == 'ledoit_wolf':
+        covariance, shrinkage = ledoit_wolf_shrinkage(values, min_periods=min_periods, block_size=block_size)
+    else:
+        covariance, shrinkage = constant_correlation_shrinkage(
+            values, min_periods=min_periods, block_size=block_size
+        )
+    if psd:
+        covariance = nearest_psd(covariance)
+    result = pd.DataFrame(covariance, index=panel.columns, columns=panel.columns)
+    result.attrs['shrinkage'] = shrinkage
+    return result
+
+
+def estimate_covariance(
+    codes=None,
+    series_group=None,
+    recursive=False,
+    window=None,
+    as_of=None,
+    method='sample',
+    levels=False,
+    min_periods=2,
+    psd=False,
+    use_cache=True,
+    session=None,
+):
+    """
+    Loads stored series (see `app.analytics.load_panel`) and returns their `covariance_matrix`.
+
+    Parameters:
+        window (int, optional): Use only the last `window` dates of the panel.
+        as_of (str or date, optional): Use the data released on or before this date.
+        levels (bool): If True, the stored values are levels and are turned into simple
+                       returns first; otherwise they are periodic returns.
+        use_cache (bool): Cache the result by (codes, window, as_of, options). Entries are
+                          keyed by a version of the stored data points too, so new or updated
+                          data points are picked up. The cached DataFrame is shared: do not
+                          modify it.
+
+    Returns:
+        DataFrame: (codes x codes) covariances, with attrs['shrinkage'].
+    """
+    if method not in COVARIANCE_METHODS:
+        raise ValueError("method must be one of the following: " + ", ".join(COVARIANCE_METHODS))
+    if window is not None and window < 1:
+        raise ValueError("window must be a positive integer.")
+    if session is None:
+        session = db.session
+
+    metadata = load_metadata(codes, series_group, recursive, session)
+
+    def compute():
+        panel = load_metadata_panel(metadata, None, as_of, as_of, session)
+        returns = simple_returns(panel) if levels else panel
+        if window is not None:
+            returns = returns.iloc[-window:]
+        return covariance_matrix(returns, method=method, min_periods=min_periods, psd=psd)
+
+    if not use_cache:
+        return compute()
+    key = (
+        str(session.get_bind().url),
+        tuple(metadata.index),
+        window,
+        str(as_of) if as_of is not None else None,
+        method,
+        levels,
+        min_periods,
+        psd,
+        _data_version(metadata['id'].tolist(), session),
+    )
+    return covariance_cache.get_or_compute(key, compute)
+
+
+def _data_version(series_ids, session):
+    """
+    Version of the stored data points of `series_ids`, as checked by `CorrelationStore.refresh`:
+    the last recorded update or deletion of their points (`data_point_changes`) and the largest
+    data point id, which grows with new points. Costs one index lookup, not an aggregate over
+    the points; new points of other series change it too.
+    """
+    return data_point_changes.last_change(series_ids), max_data_point_id(session)
+
+
+def _masked(values):
+    known = ~np.isnan(values)
+    return known.astype(float), np.where(known, values, 0.0)
+
+
+def _filled_power(values, power):
+    return np.where(np.isnan(values), 0.0, values ** power)
+
+
+def _centered(values):
+    # Covariances are shift invariant; centering keeps the sums small and accurate
+    values = np.asarray(values, dtype=float)
+    return values - np.nan_to_num(_column_mean(values))
+
+
+def _column_mean(values):
+    # Mean of the known values of every column, NaN for empty columns
+    known, filled = _masked(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return filled.sum(axis=0) / known.sum(axis=0)
+
+
+def _block_pairs(n_columns, block_size):
+    """
+    Yields (rows, columns) slices of the upper triangle of blocks of an (n x n) matrix.
+    """
+    starts = range(0, n_columns, block_size)
+    for i in starts:
+        for j in starts:
+            if j >= i:
+                yield slice(i, i + block_size), slice(j, j + block_size)
+
+
+def _pair_weight(rows, columns):
+    # Off-diagonal blocks stand for their mirror image too
+    return 1.0 if rows == columns else 2.0
+
+
+def _shrink(sample, target, shrinkage):
+    # Pairs without a sample covariance take the target value
+    return np.where(np.isnan(sample), target, shrinkage * target + (1.0 - shrinkage) * sample)
@@ -0,0 +1,423 @@
+# app/derived.py
+
+"""
+Derived series defined by expressions over stored TimeSeries codes, evaluated lazily.
+
+An expression reads like pandas code on series named by their codes:
+
+    (UST10Y - UST2Y).rolling(20).mean()
+    zscore(SPX / NDX, 60)
+    log(EURUSD).diff()
+
+It is parsed with `ast` and only the following are accepted (anything else raises ValueError):
+- codes (names), `series("CODE")` for codes that are not identifiers, and numbers (floats, so
+  that arithmetic on constants overflows to inf rather than growing unbounded integers);
+- the operators + - * / ** and unary -/+ (series are aligned on their dates, as in pandas);
+- the methods of SERIES_METHODS, `.rolling(window, min_periods=None)` followed by one of
+  ROLLING_METHODS, and the functions of FUNCTIONS, with numeric arguments only.
+A registered derived series can be used by name in later expressions; redefining it redefines
+the derived series using it, and definitions cannot depend on themselves.
+
+Every expression becomes a graph of nodes identified by their canonical form, so subexpressions
+shared by several derived series are one node, computed once. Nodes are computed only when
+evaluated, and their results are cached with the versions of the stored series they depend on:
+the last update of the series (`date_update`) and the count, last id and last update of its data
+points. Evaluating a derived series again recomputes only the nodes that depend on a series
+that changed since; the other ones are served from the cache.
+"""
+
+import ast
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from app import db
+from .models import SeriesBase, TimeSeries, DataPoint
+from .analytics import load_panel
+
+_BINARY_OPERATORS = {
+    ast.Add: ('+', lambda a, b: a + b),
+    ast.Sub: ('-', lambda a, b: a - b),
+    ast.Mult: ('*', lambda a, b: a * b),
+    ast.Div: ('/', lambda a, b: a / b),
+    ast.Pow: ('**', lambda a, b: a ** b),
+}
+_UNARY_OPERATORS = {
+    ast.USub: ('-', lambda a: -a),
+    ast.UAdd: ('+', lambda a: a),
+}
+
+# Methods of a series: name -> (positional parameters, function of the series and the arguments)
+SERIES_METHODS = {
+    'shift': (['periods'], lambda s, periods=1: s.shift(periods)),
+    'diff': (['periods'], lambda s, periods=1: s.diff(periods)),
+    'pct_change': (['periods'], lambda s, periods=1: s.pct_change(periods, fill_method=None)),
+    'abs': ([], lambda s: s.abs()),
+    'log': ([], lambda s: np.log(s)),
+    'exp': ([], lambda s: np.exp(s)),
+    'cumsum': ([], lambda s: s.cumsum()),
+    'dropna': ([], lambda s: s.dropna()),
+    'ffill': ([], lambda s: s.ffill()),
+}
+ROLLING_METHODS = ['mean', 'std', 'var', 'sum', 'min', 'max', 'median']
+
+
+def _zscore(s, window, min_periods=None):
+    rolling = s.rolling(window, min_periods=min_periods)
+    return (s - rolling.mean()) / rolling.std()
+
+
+# Functions: name -> (positional parameters after the series, function)
+FUNCTIONS = {
+    'log': ([], lambda s: np.log(s)),
+    'exp': ([], lambda s: np.exp(s)),
+    'abs': ([], lambda s: s.abs() if isinstance(s, pd.Series) else abs(s)),
+    'zscore': (['window', 'min_periods'], _zscore),
+}
+
+# A node of the graph: `codes` are the stored series it depends on
+Node = namedtuple('Node', ['key', 'children', 'operation', 'codes'])
+
+
+class DerivedSeriesGraph:
+    """
+    Registry of derived series and cache of the results of their nodes. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._nodes = {}
+        self._definitions = {}
+        # Expressions of the definitions and the derived series names they use
+        self._expressions = {}
+        self._references = {}
+        self._cache = {}
+        self.reset_stats()
+
+    def clear(self):
+        """
+        Forgets the cached results (the definitions are kept).
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, name):
+        return name in self._definitions
+
+    @property
+    def names(self):
+        return list(self._definitions)
+
+    def register(self, name, expression):
+        """
+        Defines (or redefines) the derived series `name`. Derived series using `name` follow
+        its new definition.
+
+        Parameters:
+            name (str): Name of the derived series, usable in later expressions.
+            expression (str): Its expression (see the module documentation).
+
+        Returns:
+            str: The canonical form of the expression.
+        """
+        if not name.isidentifier():
+            raise ValueError(f"Invalid derived series name: {name!r}.")
+        with self._lock:
+            tree = _parse_tree(expression)
+            references = _references(tree, self._definitions)
+            dependents = self._dependents(name)
+            if name in references or references & set(dependents):
+                raise ValueError(f"Derived series {name!r} cannot depend on itself: {expression!r}.")
+            key = self._node(tree.body, expression)
+            self._definitions[name] = key
+            self._expressions[name] = expression
+            self._references[name] = references
+            # Definitions inline the keys of the names they use: build the dependents again,
+            # each after the ones it uses
+            for dependent in dependents:
+                self._definitions[dependent] = self._parse(self._expressions[dependent])
+            return key
+
+    def _dependents(self, name):
+        """
+        Names of the derived series using `name`, directly or not, each after those it uses.
+        """
+        order = []
+
+        def visit(current):
+            for other, references in self._references.items():
+                if current in references and other not in order:
+                    visit(other)
+                    order.append(other)
+
+        visit(name)
+        return order[::-1]
+
+    def codes(self, name_or_expression):
+        """
+        Returns the codes of the stored series a derived series (or an expression) depends on.
+        """
+        with self._lock:
+            return sorted(self._nodes[self._root(name_or_expression)].codes)
+
+    def evaluate(self, name_or_expression, start=None, end=None, session=None):
+        """
+        Evaluates a registered derived series, or an expression, from the stored series.
+
+        Parameters:
+            name_or_expression (str): A registered name or an expression.
+            start, end (str or date, optional): Dates the result is restricted to (the
+                                                computation always uses the whole history).
+            session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+
+        Returns:
+            Series: Values indexed by date, named `name_or_expression`.
+        """
+        return self.to_dataframe([name_or_expression], start=start, end=end, session=session).iloc[:, 0].dropna()
+
+    def to_dataframe(self, names, start=None, end=None, session=None):
+        """
+        Evaluates several derived series (or expressions) together, as a panel with one column
+        per name, sharing their common nodes.
+        """
+        if session is None:
+            session = db.session
+        with self._lock:
+            roots = [self._root(name) for name in names]
+            codes = set().union(*[self._nodes[root].codes for root in roots]) if roots else set()
+            versions = _series_versions(sorted(codes), session)
+            loaded = {}
+            values = [self._evaluate(root, versions, loaded, session) for root in roots]
+        columns = [value if isinstance(value, pd.Series) else pd.Series(dtype=float) for value in values]
+        panel = pd.concat(columns, axis=1, keys=list(names)) if columns else pd.DataFrame()
+        panel.index = pd.DatetimeIndex(panel.index, name='date')
+        panel = panel.sort_index()
+        for i, value in enumerate(values):
+            if not isinstance(value, pd.Series):
+                # Constant expression
+                panel.iloc[:, i] = value
+        if start is not None:
+            panel = panel[panel.index >= pd.Timestamp(start)]
+        if end is not None:
+            panel = panel[panel.index <= pd.Timestamp(end)]
+        return panel
+
+    def _root(self, name_or_expression):
+        if name_or_expression in self._definitions:
+            return self._definitions[name_or_expression]
+        return self._parse(name_or_expression)
+
+    def _evaluate(self, key, versions, loaded, session):
+        node = self._nodes[key]
+        version = tuple(sorted((code, versions[code]) for code in node.codes))
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        if node.operation is None:
+            value = self._load(next(iter(node.codes)), versions, loaded, session)
+        else:
+            arguments = [self._evaluate(child, versions, loaded, session) for child in node.children]
+            with np.errstate(all='ignore'):
+                value = node.operation(*arguments)
+        self._cache[key] = (version, value)
+        return value
+
+    def _load(self, code, versions, loaded, session):
+        """
+        Values of a stored series; every stale series of the evaluation is loaded in one query.
+        """
+        if code not in loaded:
+            stale = [
+                c for c in versions
+                if c not in loaded and self._cache.get(_leaf_key(c), (None,))[0] != ((c, versions[c]),)
+            ]
+            panel, _ = load_panel(codes=stale, session=session)
+            for c in stale:
+                loaded[c] = panel[c].dropna()
+        return loaded[code]
+
+    def _parse(self, expression):
+        return self._node(_parse_tree(expression).body, expression)
+
+    def _add(self, key, children, operation):
+        if key not in self._nodes:
+            codes = frozenset().union(*[self._nodes[child].codes for child in children]) if children else frozenset()
+            self._nodes[key] = Node(key, tuple(children), operation, codes)
+        return key
+
+    def _node(self, tree, expression):
+        """
+        Adds the node of an ast subtree (and its children) to the graph and returns its key.
+        """
+        if isinstance(tree, ast.Name):
+            if tree.id in self._definitions:
+                return self._definitions[tree.id]
+            return self._series(tree.id)
+        if isinstance(tree, ast.Constant) and isinstance(tree.value, (int, float)) and not isinstance(tree.value, bool):
+            try:
+                value = float(tree.value)
+            except OverflowError:
+                raise ValueError(f"Number too large in expression {expression!r}.") from None
+            return self._add(repr(value), [], lambda value=np.float64(value): value)
+        if isinstance(tree, ast.BinOp) and type(tree.op) in _BINARY_OPERATORS:
+            symbol, function = _BINARY_OPERATORS[type(tree.op)]
+            left, right = self._node(tree.left, expression), self._node(tree.right, expression)
+            return self._add(f"({left} {symbol} {right})", [left, right], function)
+        if isinstance(tree, ast.UnaryOp) and type(tree.op) in _UNARY_OPERATORS:
+            symbol, function = _UNARY_OPERATORS[type(tree.op)]
+            operand = self._node(tree.operand, expression)
+            return self._add(f"({symbol}{operand})", [operand], function)
+        if isinstance(tree, ast.Call):
+            return self._call(tree, expression)
+        raise ValueError(f"Unsupported syntax in expression {expression!r}: {ast.unparse(tree)!r}")
+
+    def _series(self, code):
+        key = _leaf_key(code)
+        if key not in self._nodes:
+            self._nodes[key] = Node(key, (), None, frozenset([code]))
+        return key
+
+    def _call(self, tree, expression):
+        function = tree.func
+        if isinstance(function, ast.Name):
+            if function.id == 'series':
+                arguments = [a.value for a in tree.args if isinstance(a, ast.Constant) and isinstance(a.value, str)]
+                if len(arguments) != 1 or len(tree.args) != 1 or tree.keywords:
+                    raise ValueError(f"series() takes one code string, in expression {expression!r}.")
+                return self._series(arguments[0])
+            if function.id not in FUNCTIONS:
+                raise ValueError(
+                    f"Unknown function {function.id!r} in expression {expression!r}. "
+                    + "Must be one of: " + ", ".join(['series'] + list(FUNCTIONS))
+                )
+            if not tree.args:
+                raise ValueError(f"{function.id}() needs a series, in expression {expression!r}.")
+            parameters, operation = FUNCTIONS[function.id]
+            operand = self._node(tree.args[0], expression)
+            arguments = _arguments(function.id, tree.args[1:], tree.keywords, parameters, expression)
+            return self._add(
+                f"{function.id}({operand}{_format(arguments, leading=True)})", [operand],
+                lambda s, arguments=arguments, operation=operation: operation(s, **arguments),
+            )
+
+        if not isinstance(function, ast.Attribute):
+            raise ValueError(f"Unsupported call in expression {expression!r}: {ast.unparse(tree)!r}")
+        receiver = function.value
+        if function.attr in ROLLING_METHODS and _is_method_call(receiver, 'rolling'):
+            if tree.args or tree.keywords:
+                raise ValueError(f".{function.attr}() takes no argument, in expression {expression!r}.")
+            arguments = _arguments('rolling', receiver.args, receiver.keywords, ['window', 'min_periods'], expression)
+            if 'window' not in arguments:
+                raise ValueError(f"rolling() needs a window, in expression {expression!r}.")
+            operand = self._node(receiver.func.value, expression)
+            statistic = function.attr
+            return self._add(
+                f"{operand}.rolling({_format(arguments)}).{statistic}()", [operand],
+                lambda s, arguments=arguments, statistic=statistic: getattr(s.rolling(**arguments), statistic)(),
+            )
+        if function.attr not in SERIES_METHODS:
+            raise ValueError(
+                f"Unknown method {function.attr!r} in expression {expression!r}. Must be one of: "
+                + ", ".join(list(SERIES_METHODS) + [f"rolling(...).{method}" for method in ROLLING_METHODS])
+            )
+        parameters, operation = SERIES_METHODS[function.attr]
+        operand = self._node(receiver, expression)
+        arguments = _arguments(function.attr, tree.args, tree.keywords, parameters, expression)
+        return self._add(
+            f"{operand}.{function.attr}({_format(arguments)})", [operand],
+            lambda s, arguments=arguments, operation=operation: operation(s, **arguments),
+        )
+
+
+def _parse_tree(expression):
+    try:
+        return ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as error:
+        raise ValueError(f"Invalid expression {expression!r}: {error.msg}") from None
+
+
+def _references(tree, definitions):
+    """
+    Names of the derived series (among `definitions`) an expression tree uses.
+    """
+    functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    return {
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and id(node) not in functions and node.id in definitions
+    }
+
+
+def _leaf_key(code):
+    # Codes that are not identifiers keep their series() form, so that no key is ambiguous
+    return code if code.isidentifier() else f"series({code!r})"
+
+
+def _is_method_call(tree, name):
+    return isinstance(tree, ast.Call) and isinstance(tree.func, ast.Attribute) and tree.func.attr == name
+
+
+def _arguments(name, args, keywords, parameters, expression):
+    """
+    Numeric arguments of a call, by parameter name.
+    """
+    if len(args) > len(parameters):
+        raise ValueError(f"Too many arguments to {name}() in expression {expression!r}.")
+    arguments = dict(zip(parameters, args))
+    for keyword in keywords:
+        if keyword.arg not in parameters or keyword.arg in arguments:
+            raise ValueError(f"Invalid argument {keyword.arg!r} to {name}() in expression {expression!r}.")
+        arguments[keyword.arg] = keyword.value
+    values = {}
+    for parameter, value in arguments.items():
+        if isinstance(value, ast.Constant) and value.value is None:
+            continue
+        if not (isinstance(value, ast.Constant) and isinstance(value.value, int) and not isinstance(value.value, bool)):
+            raise ValueError(f"Arguments of {name}() must be integers, in expression {expression!r}.")
+        values[parameter] = value.value
+    for parameter in ['window', 'min_periods']:
+        if parameter in values and values[parameter] < 1:
+            raise ValueError(f"{parameter} of {name}() must be positive, in expression {expression!r}.")
+    return values
+
+
+def _format(arguments, leading=False):
+    text = ', '.join(f"{parameter}={value}" for parameter, value in arguments.items())
+    return f", {text}" if leading and text else text
+
+
+def _series_versions(codes, session):
+    """
+    Version of every stored series of `codes`: its last update and the count, last id and
+    last update of its data points.
+    """
+    if not codes:
+        return {}
+    ts = TimeSeries.__table__
+    sb = SeriesBase.__table__
+    dp = DataPoint.__table__
+    rows = session.execute(
+        select(
+            ts.c.time_series_code, sb.c.date_update,
+            func.count(dp.c.id), func.max(dp.c.id), func.max(dp.c.date_update),
+        )
+        .join(sb, sb.c.id == ts.c.id)
+        .outerjoin(dp, dp.c.time_series_id == ts.c.id)
+        .where(ts.c.time_series_code.in_(codes))
+        .group_by(ts.c.time_series_code, sb.c.date_update)
+    ).all()
+    versions = {row[0]: tuple(str(value) for value in row[1:]) for row in rows}
+    missing = [code for code in codes if code not in versions]
+    if missing:
+        raise ValueError("Unknown TimeSeries codes: " + ", ".join(missing))
+    return versions
+
+
+derived_series = DerivedSeriesGraph()
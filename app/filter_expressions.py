@@ -0,0 +1,110 @@
+# app/filter_expressions.py
+
+"""
+Parser of the catalog filter expressions used by `SeriesSearcher.filter`.
+
+An expression is a whitespace separated list of terms, all of which must hold:
+
+    freq:M keyword:equity group:US_EQ updated>2026-01-01 "credit spread"
+
+- `field:value` or `field<op>value` with <op> one of >, >=, <, <= (date fields only).
+  Values may be quoted: `name:"credit spread"`.
+- Bare words and quoted phrases are text terms, matched against name, code,
+  description and keywords.
+- A leading `-` negates a term: `-freq:D`.
+
+Fields: type, freq (frequency), delta (delta_type), tstype, keyword (kw), group, code,
+name, and the date fields updated, created, start and end (first and last data point).
+"""
+
+import re
+from collections import namedtuple
+from .models import TIME_FREQUENCIES, DELTA_TYPES, _validate_date
+
+FilterTerm = namedtuple('FilterTerm', ['field', 'operator', 'value', 'negated'])
+
+TEXT_FIELDS = ['type', 'freq', 'delta', 'tstype', 'keyword', 'group', 'code', 'name']
+DATE_FIELDS = ['updated', 'created', 'start', 'end']
+FIELD_ALIASES = {
+    'frequency': 'freq',
+    'time_frequency': 'freq',
+    'delta_type': 'delta',
+    'kw': 'keyword',
+}
+SERIES_TYPES = {
+    'timeseries': 'time_series',
+    'time_series': 'time_series',
+    'ts': 'time_series',
+    'seriesgroup': 'series_group',
+    'series_group': 'series_group',
+    'sg': 'series_group',
+}
+
+_TERM = re.compile(
+    r'(?P<negated>-?)(?:'
+    r'(?P<field>[A-Za-z_]+)(?P<operator>:|>=|<=|>|<)(?:"(?P<quoted_value>[^"]*)"|(?P<value>[^\s"]+))'
+    r'|"(?P<phrase>[^"]*)"'
+    r'|(?P<word>[^\s"]+))'
+)
+
+
+def parse_filter_expression(expression):
+    """
+    Parses a filter expression into a list of FilterTerm(field, operator, value, negated).
+    Text terms have `field` and `operator` None. Values are validated and normalized:
+    series types to their discriminator, frequencies to upper case, delta types to lower
+    case and date fields to `datetime.date`.
+
+    Raises:
+        ValueError: On unknown fields, invalid values or unbalanced quotes.
+    """
+    terms = []
+    position = 0
+    expression = expression or ''
+    while True:
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+        if position >= len(expression):
+            return terms
+        match = _TERM.match(expression, position)
+        if match is None:
+            raise ValueError(f"Invalid filter expression at: {expression[position:]!r}")
+        position = match.end()
+        if position < len(expression) and not expression[position].isspace():
+            raise ValueError(f"Invalid filter expression at: {expression[match.start():]!r}")
+        terms.append(_filter_term(match))
+
+
+def _filter_term(match):
+    negated = bool(match.group('negated'))
+    if match.group('field') is None:
+        value = match.group('phrase') if match.group('phrase') is not None else match.group('word')
+        return FilterTerm(None, None, value, negated)
+
+    field = match.group('field').lower()
+    field = FIELD_ALIASES.get(field, field)
+    operator = match.group('operator')
+    value = match.group('quoted_value') if match.group('quoted_value') is not None else match.group('value')
+
+    if field in DATE_FIELDS:
+        return FilterTerm(field, operator, _validate_date(value, field), negated)
+    if field not in TEXT_FIELDS:
+        raise ValueError(
+            f"Unknown filter field {field!r}. Must be one of: " + ", ".join(TEXT_FIELDS + DATE_FIELDS)
+        )
+    if operator != ':':
+        raise ValueError(f"Field {field!r} only supports ':'.")
+
+    if field == 'type':
+        if value.lower() not in SERIES_TYPES:
+            raise ValueError("type must be one of: TimeSeries, SeriesGroup.")
+        value = SERIES_TYPES[value.lower()]
+    elif field == 'freq':
+        if value.upper() not in TIME_FREQUENCIES:
+            raise ValueError("freq must be one of: " + ", ".join(TIME_FREQUENCIES))
+        value = value.upper()
+    elif field == 'delta':
+        if value.lower() not in DELTA_TYPES:
+            raise ValueError("delta must be one of: " + ", ".join(DELTA_TYPES))
+        value = value.lower()
+    return FilterTerm(field, operator, value, negated)
@@ -0,0 +1,326 @@
+# app/fulltext.py
+
+"""
+Full-text and trigram indexes over the SeriesBase catalog.
+
+The full-text index covers name, description, code and keywords. On SQLite it is an FTS5
+virtual table ranked with BM25. On PostgreSQL it is a plain table with a generated
+`tsvector` column and a GIN index, ranked with `ts_rank`.
+
+The trigram index serves substring (`partial=True`) matches on name and code. On SQLite it
+is the `series_trigram` side table; on PostgreSQL `pg_trgm` GIN indexes on the catalog
+columns serve ILIKE directly, so the side table is left empty.
+
+Both indexes are kept in sync by the flush events registered in this module.
+"""
+
+from sqlalchemy import DDL, event, select, func, text, table, column, Integer, Float, String
+from sqlalchemy.orm import Session
+from app import db
+from .models import (
+    SeriesBase, TimeSeries, SeriesGroup, Keyword, seriesbase_keyword, get_catalog_changes
+)
+
+SEARCH_TABLE = 'series_search_fts'
+SEARCH_COLUMNS = ['name', 'description', 'code', 'keywords']
+REBUILD_BATCH_SIZE = 10000
+
+event.listen(
+    db.metadata,
+    'after_create',
+    DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        + "name, description, code, keywords, "
+        + "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    ).execute_if(dialect='sqlite')
+)
+event.listen(
+    db.metadata,
+    'after_create',
+    DDL(
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        + "id INTEGER PRIMARY KEY, name TEXT, description TEXT, code TEXT, keywords TEXT, "
+        + "document tsvector GENERATED ALWAYS AS (to_tsvector('simple', "
+        + "coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || "
+        + "coalesce(code, '') || ' ' || coalesce(keywords, ''))) STORED); "
+        + f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)"
+    ).execute_if(dialect='postgresql')
+)
+event.listen(
+    db.metadata,
+    'before_drop',
+    DDL(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+)
+
+
+TRIGRAM_FIELDS = ['name', 'code']
+
+# (field, trigram) -> series. The primary key order serves trigram lookups per field.
+series_trigram = db.Table(
+    'series_trigram',
+    db.Column('field', db.String(4), primary_key=True),
+    db.Column('trigram', db.String(3), primary_key=True),
+    db.Column(
+        'seriesbase_id', db.Integer, db.ForeignKey('series_base.id', ondelete='CASCADE'),
+        primary_key=True, index=True
+    )
+)
+
+event.listen(
+    db.metadata,
+    'after_create',
+    DDL(
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm; "
+        + "CREATE INDEX IF NOT EXISTS ix_series_base_name_trgm "
+        + "ON series_base USING gin (name gin_trgm_ops); "
+        + "CREATE INDEX IF NOT EXISTS ix_time_series_code_trgm "
+        + "ON time_series USING gin (time_series_code gin_trgm_ops); "
+        + "CREATE INDEX IF NOT EXISTS ix_series_group_code_trgm "
+        + "ON series_group USING gin (series_group_code gin_trgm_ops)"
+    ).execute_if(dialect='postgresql')
+)
+
+
+def _search_table(dialect_name):
+    """
+    Lightweight table construct for the search table (it is not part of the metadata,
+    because create_all cannot create virtual tables). The key is `rowid` on SQLite.
+    """
+    key = 'rowid' if dialect_name == 'sqlite' else 'id'
+    return table(SEARCH_TABLE, column(key, Integer), *[column(c, String) for c in SEARCH_COLUMNS])
+
+
+def keywords_aggregate(dialect_name, series_id_column, separator=', '):
+    """
+    Correlated scalar subquery joining the keywords of a series into a `separator` separated string.
+    """
+    if dialect_name == 'postgresql':
+        aggregate = func.string_agg(Keyword.__table__.c.word, separator)
+    else:
+        aggregate = func.group_concat(Keyword.__table__.c.word, separator)
+    return (
+        select(aggregate)
+        .select_from(seriesbase_keyword)
+        .join(Keyword.__table__, Keyword.__table__.c.id == seriesbase_keyword.c.keyword_id)
+        .where(seriesbase_keyword.c.seriesbase_id == series_id_column)
+        .scalar_subquery()
+    )
+
+
+def sync_search_documents(series_ids, deleted_ids=(), session=None):
+    """
+    Rewrites the search rows of `series_ids` from the catalog and drops those of `deleted_ids`.
+
+    Parameters:
+        series_ids (iterable of int): Ids of SeriesBase rows to (re)index.
+        deleted_ids (iterable of int): Ids of SeriesBase rows to remove from the index.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    series_ids = list(series_ids)
+    stale_ids = series_ids + list(deleted_ids)
+    if not stale_ids:
+        return
+
+    connection = session.connection()
+    dialect_name = connection.dialect.name
+    fts = _search_table(dialect_name)
+    key = fts.c.rowid if dialect_name == 'sqlite' else fts.c.id
+
+    connection.execute(fts.delete().where(key.in_(stale_ids)))
+    if not series_ids:
+        return
+
+    sb = SeriesBase.__table__
+    ts = TimeSeries.__table__
+    sg = SeriesGroup.__table__
+    documents = (
+        select(
+            sb.c.id,
+            sb.c.name,
+            sb.c.description,
+            func.coalesce(ts.c.time_series_code, sg.c.series_group_code),
+            keywords_aggregate(dialect_name, sb.c.id),
+        )
+        .select_from(sb)
+        .outerjoin(ts, ts.c.id == sb.c.id)
+        .outerjoin(sg, sg.c.id == sb.c.id)
+        .where(sb.c.id.in_(series_ids))
+    )
+    connection.execute(fts.insert().from_select([key.name] + SEARCH_COLUMNS, documents))
+
+
+def trigrams(value):
+    """
+    Returns the set of lowercase 3-character substrings of `value`.
+    """
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def sync_trigrams(series_ids, deleted_ids=(), session=None):
+    """
+    Rewrites the trigram rows of `series_ids` and drops those of `deleted_ids`.
+    Does nothing on PostgreSQL, where pg_trgm indexes the catalog columns themselves.
+    """
+    if session is None:
+        session = db.session
+    series_ids = list(series_ids)
+    stale_ids = series_ids + list(deleted_ids)
+    connection = session.connection()
+    if not stale_ids or connection.dialect.name == 'postgresql':
+        return
+
+    connection.execute(series_trigram.delete().where(series_trigram.c.seriesbase_id.in_(stale_ids)))
+    if not series_ids:
+        return
+
+    sb = SeriesBase.__table__
+    ts = TimeSeries.__table__
+    sg = SeriesGroup.__table__
+    values = connection.execute(
+        select(sb.c.id, sb.c.name, func.coalesce(ts.c.time_series_code, sg.c.series_group_code))
+        .select_from(sb)
+        .outerjoin(ts, ts.c.id == sb.c.id)
+        .outerjoin(sg, sg.c.id == sb.c.id)
+        .where(sb.c.id.in_(series_ids))
+    ).all()
+    rows = []
+    for series_id, name, code in values:
+        for field, value in zip(TRIGRAM_FIELDS, (name, code)):
+            for trigram in trigrams(value or ''):
+                rows.append({'field': field, 'trigram': trigram, 'seriesbase_id': series_id})
+    if rows:
+        connection.execute(series_trigram.insert(), rows)
+
+
+def trigram_candidates(search_text, field, id_column, session=None):
+    """
+    Returns a condition restricting `id_column` to the rows whose `field` ('name' or 'code')
+    contains every trigram of `search_text`, or None when the trigram index cannot help
+    (text shorter than 3 characters, or PostgreSQL, where pg_trgm serves ILIKE directly).
+    Candidates still need the ILIKE check, since trigrams do not encode their order.
+    """
+    if session is None:
+        session = db.session
+    grams = trigrams(search_text)
+    if not grams or session.connection().dialect.name == 'postgresql':
+        return None
+    return id_column.in_(
+        select(series_trigram.c.seriesbase_id)
+        .where(series_trigram.c.field == field, series_trigram.c.trigram.in_(sorted(grams)))
+        .group_by(series_trigram.c.seriesbase_id)
+        .having(func.count() == len(grams))
+    )
+
+
+def rebuild_search_index(session=None, commit=True):
+    """
+    Re-indexes the whole catalog (full-text and trigram), e.g. after bulk loads that bypass the ORM.
+    """
+    if session is None:
+        session = db.session
+    connection = session.connection()
+    fts = _search_table(connection.dialect.name)
+    connection.execute(fts.delete())
+    connection.execute(series_trigram.delete())
+    series_ids = connection.execute(select(SeriesBase.__table__.c.id)).scalars().all()
+    # Batches keep the IN lists within the bind parameter limits of the drivers
+    for first in range(0, len(series_ids), REBUILD_BATCH_SIZE):
+        batch = series_ids[first:first + REBUILD_BATCH_SIZE]
+        sync_search_documents(batch, session=session)
+        sync_trigrams(batch, session=session)
+    if commit:
+        session.commit()
+
+
+def _document_expression(columns):
+    """
+    The PostgreSQL tsvector of `columns`: the stored `document` for every column, otherwise
+    one computed from the restricted columns (not served by the GIN index).
+    """
+    if list(columns) == SEARCH_COLUMNS:
+        return 'document'
+    return "to_tsvector('simple', " + " || ' ' || ".join(f"coalesce({c}, '')" for c in columns) + ")"
+
+
+def _match_expression(dialect_name, tokens, prefix, columns, token_operator='or'):
+    """
+    Builds the FTS5 MATCH string (SQLite), restricted to `columns`, or the tsquery string
+    (PostgreSQL, where `_document_expression` restricts the columns) matching any of `tokens`
+    (`token_operator` 'or') or all of them ('and').
+    """
+    if dialect_name == 'postgresql':
+        terms = []
+        for token in tokens:
+            words = [w for w in ''.join(c if c.isalnum() else ' ' for c in token).split() if w]
+            if words:
+                terms.append('(' + ' <-> '.join(w + (':*' if prefix else '') for w in words) + ')')
+        return (' & ' if token_operator == 'and' else ' | ').join(terms)
+
+    terms = ['"' + token.replace('"', '""') + '"' + ('*' if prefix else '') for token in tokens]
+    return '{' + ' '.join(columns) + '} : (' + (' AND ' if token_operator == 'and' else ' OR ').join(terms) + ')'
+
+
+def full_text_matches(
+    search_text,
+    columns=SEARCH_COLUMNS,
+    prefix=True,
+    limit=None,
+    session=None,
+    token_operator='or',
+):
+    """
+    Returns a subquery with the columns (id, score) of the catalog entries matching any token
+    of `search_text` (or every token, with `token_operator` 'and'), best matches first. `score` is the BM25 relevance (SQLite) or `ts_rank`
+    (PostgreSQL); higher is better.
+
+    Parameters:
+        search_text (str): Text to match; whitespace separates tokens.
+        columns (list of str): Indexed columns to match against (among SEARCH_COLUMNS).
+        prefix (bool): If True, tokens also match as prefixes (for typeahead).
+        limit (int, optional): Maximum number of matches.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+        token_operator (str): 'or' to match any token, 'and' to match all of them.
+    """
+    if token_operator not in ('or', 'and'):
+        raise ValueError("token_operator must be one of 'or', 'and'.")
+    if session is None:
+        session = db.session
+    dialect_name = session.connection().dialect.name
+    unknown = [c for c in columns if c not in SEARCH_COLUMNS]
+    if unknown or not columns:
+        raise ValueError("columns must be among: " + ", ".join(SEARCH_COLUMNS))
+    tokens = [token for token in search_text.split() if token]
+    match = _match_expression(dialect_name, tokens, prefix, columns, token_operator)
+
+    if dialect_name == 'postgresql':
+        # Column names are checked against SEARCH_COLUMNS above
+        document = _document_expression(columns)
+        query = (
+            f"SELECT id, ts_rank({document}, to_tsquery('simple', :match)) AS score "
+            + f"FROM {SEARCH_TABLE} WHERE {document} @@ to_tsquery('simple', :match) "
+            + "ORDER BY score DESC, id"
+        )
+    else:
+        query = (
+            f"SELECT rowid AS id, -bm25({SEARCH_TABLE}) AS score "
+            + f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+            + f"ORDER BY bm25({SEARCH_TABLE}), rowid"
+        )
+    if limit is not None:
+        query += " LIMIT :limit"
+    stmt = text(query).bindparams(match=match)
+    if limit is not None:
+        stmt = stmt.bindparams(limit=limit)
+    return stmt.columns(id=Integer, score=Float).subquery('full_text_matches')
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_documents(session, flush_context):
+    # Only rows whose indexed content changes, not e.g. a date_update bumped by new data points
+    changed_ids, deleted_ids = get_catalog_changes(session, content_only=True)
+    if changed_ids or deleted_ids:
+        sync_search_documents(changed_ids, deleted_ids, session=session)
+        sync_trigrams(changed_ids, deleted_ids, session=session)
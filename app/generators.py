@@ -0,0 +1,480 @@
+# app/generators.py
+
+"""
+Synthetic universes and catalogs, written to the database with bulk Core inserts (see
+`app.bulk`) for scaling benchmarks. Standalone helpers that do not touch the database are in
+`app.utils`.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from typing_extensions import Literal
+from sqlalchemy import select
+from app import db
+from app.models import (
+    CODE_MAX_LEN, SeriesBase, SeriesGroup, TimeSeriesType, DataPoint, Keyword,
+    seriesgroup_seriesbase, seriesbase_keyword
+)
+from app.bulk import insert_time_series, insert_data_points, refresh_series
+
+
+class FactorReturnsGenerator:
+    """
+    Synthetic daily returns of a large universe from a low-rank factor model:
+    r[t, i] = alpha[i] + loadings[i] @ factors[t] + volatility[i] * noise[t, i].
+
+    Only the per-asset parameters (O(n_assets * n_factors)) and the factor returns
+    (O(periods * n_factors)) are kept in memory; returns are produced in chunks of columns
+    or dates. Every tile of `date_block` dates x `asset_block` assets draws from its own
+    stream spawned from `seed`, so a value does not depend on how the panel is chunked.
+    A fraction of the assets starts late (NaN before its first date).
+    """
+
+    def __init__(
+            self,
+            n_assets: int = 50000,
+            n_factors: int = 10,
+            periods: int = 7560,
+            start_date: str = "1995-01-02",
+            date_frequency: str = "B",
+            seed: int = 42,
+            mean_return: float = .0003,
+            factor_volatility: float = .01,
+            idiosyncratic_volatility: tuple = (.005, .03),
+            late_start_fraction: float = .3,
+            max_start_offset: float = .9,
+            code_prefix: str = "SYN",
+            asset_block: int = 1024,
+            date_block: int = 256
+        ):
+        if n_assets < 1 or n_factors < 1 or periods < 1:
+            raise ValueError("n_assets, n_factors and periods must be positive.")
+        if not 0 <= late_start_fraction <= 1 or not 0 <= max_start_offset < 1:
+            raise ValueError("late_start_fraction must be in [0, 1] and max_start_offset in [0, 1).")
+        if len(code_prefix) + len(str(n_assets - 1)) > CODE_MAX_LEN:
+            raise ValueError(f"Codes must be {CODE_MAX_LEN} characters or less: shorten code_prefix.")
+        self.n_assets = n_assets
+        self.n_factors = n_factors
+        self.seed = seed
+        self.asset_block = asset_block
+        self.date_block = date_block
+        self.code_prefix = code_prefix
+        self.dates = pd.date_range(start=start_date, periods=periods, freq=date_frequency)
+
+        # The first factor is the market, the others are weaker
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+        factor_scale = factor_volatility / np.sqrt(np.arange(1, n_factors + 1))
+        self.factors = rng.standard_normal((periods, n_factors)) * factor_scale
+
+        self.loadings = np.empty((n_assets, n_factors))
+        self.alpha = np.empty(n_assets)
+        self.volatility = np.empty(n_assets)
+        self.start_rows = np.zeros(n_assets, dtype=np.int64)
+        for block, first in enumerate(range(0, n_assets, asset_block)):
+            last = min(first + asset_block, n_assets)
+            size = last - first
+            rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, block)))
+            self.loadings[first:last, 0] = rng.normal(1.0, .3, size)
+            self.loadings[first:last, 1:] = rng.normal(0.0, .5, (size, n_factors - 1))
+            self.alpha[first:last] = rng.normal(mean_return, mean_return / 2, size)
+            self.volatility[first:last] = rng.uniform(*idiosyncratic_volatility, size)
+            late = rng.random(size) < late_start_fraction
+            self.start_rows[first:last] = np.where(
+                late, rng.integers(1, max(int(max_start_offset * periods), 1) + 1, size), 0
+            )
+
+    @property
+    def codes(self) -> list:
+        width = len(str(self.n_assets - 1))
+        return [f"{self.code_prefix}{i:0{width}d}" for i in range(self.n_assets)]
+
+    def returns(self, rows: slice = slice(None), columns: slice = slice(None)) -> np.ndarray:
+        """
+        Returns of the dates `rows` and assets `columns` (slices with step 1), NaN before the
+        start of every asset.
+        """
+        row_start, row_stop, _ = rows.indices(len(self.dates))
+        col_start, col_stop, _ = columns.indices(self.n_assets)
+        # Factor part summed factor by factor (not with BLAS), so that it is bit-identical
+        # whatever the shape of the chunk
+        result = np.tile(self.alpha[col_start:col_stop], (row_stop - row_start, 1))
+        for k in range(self.n_factors):
+            result += np.multiply.outer(self.factors[row_start:row_stop, k], self.loadings[col_start:col_stop, k])
+        # Idiosyncratic noise, tile by tile
+        for i in range(row_start // self.date_block, -(-row_stop // self.date_block)):
+            for j in range(col_start // self.asset_block, -(-col_stop // self.asset_block)):
+                tile_rows = (i * self.date_block, min((i + 1) * self.date_block, len(self.dates)))
+                tile_columns = (j * self.asset_block, min((j + 1) * self.asset_block, self.n_assets))
+                rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(2, i, j)))
+                noise = rng.standard_normal((tile_rows[1] - tile_rows[0], tile_columns[1] - tile_columns[0]))
+                r0, r1 = max(tile_rows[0], row_start), min(tile_rows[1], row_stop)
+                c0, c1 = max(tile_columns[0], col_start), min(tile_columns[1], col_stop)
+                result[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = (
+                    result[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start]
+                    + noise[r0 - tile_rows[0]:r1 - tile_rows[0], c0 - tile_columns[0]:c1 - tile_columns[0]]
+                    * self.volatility[c0:c1]
+                )
+        before_start = np.arange(row_start, row_stop)[:, None] < self.start_rows[col_start:col_stop]
+        result[before_start] = np.nan
+        return result
+
+    def chunks(self, axis: Literal["columns", "dates"] = "columns", chunk_size: int = 1024):
+        """
+        Yields the panel as DataFrames (dates x codes) of `chunk_size` columns or dates.
+        """
+        if axis not in ("columns", "dates"):
+            raise ValueError("axis must be 'columns' or 'dates'.")
+        codes = np.array(self.codes, dtype=object)
+        size = self.n_assets if axis == "columns" else len(self.dates)
+        for first in range(0, size, chunk_size):
+            part = slice(first, min(first + chunk_size, size))
+            if axis == "columns":
+                yield pd.DataFrame(self.returns(columns=part), index=self.dates, columns=codes[part])
+            else:
+                yield pd.DataFrame(self.returns(rows=part), index=self.dates[part], columns=codes)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(self.returns(), index=self.dates, columns=self.codes)
+
+    def to_csv(
+            self,
+            directory: str,
+            axis: Literal["columns", "dates"] = "columns",
+            chunk_size: int = 1024
+        ) -> list:
+        """
+        Writes the panel to `directory` as one CSV file per chunk and returns their paths.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for k, chunk in enumerate(self.chunks(axis, chunk_size)):
+            path = os.path.join(directory, f"returns-{axis}-{k:05d}.csv")
+            chunk.to_csv(path, index_label="date")
+            paths.append(path)
+        return paths
+
+    def ingest(
+            self,
+            chunk_size: int = 1024,
+            time_frequency: str = "D",
+            series_group=None,
+            session=None,
+            commit: bool = True
+        ) -> int:
+        """
+        Inserts the universe as TimeSeries (named by code, delta_type 'pct') with their
+        DataPoints, chunk of columns by chunk of columns, with bulk Core inserts that bypass
+        the ORM; then refreshes what the flush events would have (group statistics, search
+        indexes and caches) for the new series only. Returns the number of DataPoints inserted.
+
+        Parameters:
+            series_group (SeriesGroup or str, optional): Group (or its code) to add the series to.
+        """
+        if session is None:
+            session = db.session
+        group_id = None
+        if series_group is not None:
+            if isinstance(series_group, str):
+                group = session.query(SeriesGroup).filter_by(series_group_code=series_group).first()
+                if group is None:
+                    raise ValueError(f"SeriesGroup '{series_group}' does not exist.")
+                series_group = group
+            session.flush()
+            group_id = series_group.id
+
+        connection = session.connection()
+        codes = np.array(self.codes, dtype=object)
+        dates = self.dates.date
+        n_points = 0
+        new_ids = []
+        for first in range(0, self.n_assets, chunk_size):
+            part = slice(first, min(first + chunk_size, self.n_assets))
+            series_ids = insert_time_series(
+                connection,
+                [{'name': code, 'code': code, 'time_frequency': time_frequency, 'delta_type': 'pct'}
+                 for code in codes[part]]
+            )
+            new_ids.extend(series_ids)
+            if group_id is not None:
+                connection.execute(seriesgroup_seriesbase.insert(), [
+                    {'seriesgroup_id': group_id, 'seriesbase_id': series_id} for series_id in series_ids
+                ])
+            for row_start in range(0, len(dates), self.date_block):
+                rows = slice(row_start, min(row_start + self.date_block, len(dates)))
+                n_points += insert_data_points(connection, series_ids, dates[rows], self.returns(rows, part))
+        refresh_series(new_ids, session=session)
+        if commit:
+            session.commit()
+        return n_points
+
+
+class CatalogGenerator:
+    """
+    Synthetic catalog for scaling benchmarks: a tree of nested SeriesGroups (through
+    `parent_id`) of `depth` levels below one root, with `branching` children per group;
+    `n_series` TimeSeries, each a member of one leaf group, with a frequency drawn from
+    `frequencies`, a history of `history_length` observations and TimeSeriesTypes; and a
+    vocabulary of `n_keywords` keywords whose usage follows a Zipf law (the keyword of rank k
+    is picked with probability proportional to 1 / k ** zipf_exponent).
+
+    Everything is written with bulk Core inserts, series chunk by series chunk. Every block of
+    `series_block` series draws from its own stream spawned from `seed`, so the catalog depends
+    on the seed only, not on how it is chunked.
+    """
+
+    # Pandas frequency of the dates of each TIME_FREQUENCIES value
+    DATE_FREQUENCIES = {
+        'DA': 'D', 'D': 'B', 'W': 'W-FRI', 'M': 'ME', 'B': '2ME', 'Q': 'QE', 'S': '6ME', 'Y': 'YE'
+    }
+    SYLLABLES = [
+        "ba", "ce", "di", "fo", "gu", "ha", "ke", "li", "mo", "nu",
+        "pa", "re", "si", "to", "vu", "wa", "xe", "yi", "zo", "ru",
+    ]
+
+    def __init__(
+            self,
+            n_series: int = 10000,
+            depth: int = 3,
+            branching: int = 5,
+            n_keywords: int = 1000,
+            keywords_per_series: float = 5.0,
+            zipf_exponent: float = 1.1,
+            history_length: tuple = (4, 24),
+            frequencies: dict = None,
+            n_types: int = 5,
+            end_date: str = "2024-12-31",
+            seed: int = 42,
+            code_prefix: str = "CAT",
+            group_code_prefix: str = "GRP",
+            series_block: int = 1024
+        ):
+        if n_series < 0 or depth < 0 or branching < 1 or n_keywords < 1 or n_types < 0:
+            raise ValueError("n_series, depth and n_types must be non-negative, branching and n_keywords positive.")
+        if history_length[0] < 0 or history_length[1] < history_length[0]:
+            raise ValueError("history_length must be a (minimum, maximum) pair of non-negative integers.")
+        self.frequencies = frequencies or {'D': .25, 'W': .1, 'M': .4, 'Q': .15, 'Y': .1}
+        unknown = set(self.frequencies) - set(self.DATE_FREQUENCIES)
+        if unknown:
+            raise ValueError("frequencies must be TIME_FREQUENCIES values, not: " + ", ".join(sorted(unknown)))
+        n_groups = sum(branching ** level for level in range(depth + 1))
+        if len(code_prefix) + len(str(max(n_series - 1, 0))) > CODE_MAX_LEN or \
+                len(group_code_prefix) + len(str(n_groups - 1)) > CODE_MAX_LEN:
+            raise ValueError(f"Codes must be {CODE_MAX_LEN} characters or less: shorten the prefixes.")
+        self.n_series = n_series
+        self.depth = depth
+        self.branching = branching
+        self.n_keywords = n_keywords
+        self.keywords_per_series = keywords_per_series
+        self.zipf_exponent = zipf_exponent
+        self.history_length = history_length
+        self.n_types = n_types
+        self.end_date = pd.Timestamp(end_date)
+        self.seed = seed
+        self.code_prefix = code_prefix
+        self.group_code_prefix = group_code_prefix
+        self.series_block = series_block
+
+    def word(self, rank: int) -> str:
+        """
+        Keyword of rank `rank` (0 is the most used), spelled with two or more syllables.
+        """
+        n = rank + len(self.SYLLABLES)
+        syllables = []
+        while n:
+            n, digit = divmod(n, len(self.SYLLABLES))
+            syllables.append(self.SYLLABLES[digit])
+        return "".join(reversed(syllables))
+
+    def generate(self, chunk_size: int = 10000, session=None, commit: bool = True) -> dict:
+        """
+        Inserts the catalog, then refreshes what the ORM flush events would have (group
+        statistics, search indexes and caches) for the new groups and series only.
+
+        Returns:
+            dict: Number of rows inserted, by kind (keywords already stored are reused).
+        """
+        if session is None:
+            session = db.session
+        connection = session.connection()
+        counts = dict.fromkeys(
+            ['series_groups', 'time_series', 'keywords', 'keyword_links', 'group_links', 'data_points'], 0
+        )
+
+        group_ids, leaf_ids = self._insert_groups(connection)
+        new_ids = list(group_ids)
+        counts['series_groups'] = sum(self.branching ** level for level in range(self.depth + 1))
+        # Keywords already in the catalog are reused
+        kw = Keyword.__table__
+        words = [self.word(rank) for rank in range(self.n_keywords)]
+        word_ids = dict(connection.execute(select(kw.c.word, kw.c.id).where(kw.c.word.in_(words))).all())
+        missing = [word for word in words if word not in word_ids]
+        if missing:
+            word_ids.update(zip(missing, connection.execute(
+                kw.insert().returning(kw.c.id, sort_by_parameter_order=True),
+                [{'word': word} for word in missing]
+            ).scalars().all()))
+        keyword_ids = np.array([word_ids[word] for word in words])
+        counts['keywords'] = len(missing)
+        type_ids = connection.execute(
+            TimeSeriesType.__table__.insert().returning(TimeSeriesType.__table__.c.id, sort_by_parameter_order=True),
+            [{'name': f"{self.code_prefix} type {k}"} for k in range(self.n_types)]
+        ).scalars().all() if self.n_types else []
+
+        usage = 1.0 / np.arange(1, self.n_keywords + 1) ** self.zipf_exponent
+        usage /= usage.sum()
+        codes_width = len(str(max(self.n_series - 1, 0)))
+        frequencies = list(self.frequencies)
+        frequency_weights = np.array([self.frequencies[f] for f in frequencies], dtype=float)
+        frequency_weights /= frequency_weights.sum()
+        calendars = {
+            f: pd.date_range(end=self.end_date, periods=self.history_length[1] + 4,
+                             freq=self.DATE_FREQUENCIES[f]).date
+            for f in frequencies
+        }
+
+        blocks = {}
+        for first in range(0, self.n_series, chunk_size):
+            size = min(chunk_size, self.n_series - first)
+            draws = self._series_draws(
+                first, first + size, blocks, len(leaf_ids), len(type_ids), usage, frequency_weights
+            )
+            frequency, owners, ranks = draws['frequency'], draws['owners'], draws['ranks']
+            # The two most used keywords of a series name it
+            starts = np.searchsorted(owners, np.arange(size), side='left')
+            ends = np.searchsorted(owners, np.arange(size), side='right')
+            rows = []
+            for k in range(size):
+                words = [self.word(rank).capitalize() for rank in ranks[starts[k]:min(starts[k] + 2, ends[k])]]
+                rows.append({
+                    'name': " ".join(words + [frequencies[frequency[k]], str(first + k)]),
+                    'code': f"{self.code_prefix}{first + k:0{codes_width}d}",
+                    'description': None,
+                    'time_frequency': frequencies[frequency[k]],
+                    'delta_type': 'pct',
+                    'type_id': type_ids[draws['types'][k]] if type_ids else None,
+                })
+            series_ids = np.array(insert_time_series(connection, rows))
+            new_ids.extend(series_ids.tolist())
+
+            groups = leaf_ids[draws['groups']]
+            connection.execute(seriesgroup_seriesbase.insert(), [
+                {'seriesgroup_id': int(group_id), 'seriesbase_id': int(series_id)}
+                for group_id, series_id in zip(groups, series_ids)
+            ])
+            if len(ranks):
+                connection.execute(seriesbase_keyword.insert(), [
+                    {'seriesbase_id': int(series_id), 'keyword_id': int(keyword_id)}
+                    for series_id, keyword_id in zip(series_ids[owners], keyword_ids[ranks])
+                ])
+            counts['data_points'] += self._insert_histories(connection, series_ids, draws, frequencies, calendars)
+            counts['time_series'] += size
+            counts['group_links'] += size
+            counts['keyword_links'] += len(ranks)
+
+        refresh_series(new_ids, session=session)
+        if commit:
+            session.commit()
+        return counts
+
+    def _block_draws(self, block, n_leaves, n_types, usage, frequency_weights):
+        """
+        Random draws of the series of block `block`, from the stream of the block: frequency,
+        type and leaf group indices, keyword links (owner series and keyword rank, sorted by
+        owner) and histories (lengths, lags and the steps of every series, one after the other).
+        """
+        size = min(self.series_block, self.n_series - block * self.series_block)
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(3, block)))
+        frequency = rng.choice(len(frequency_weights), size, p=frequency_weights)
+        keyword_counts = np.minimum(rng.poisson(self.keywords_per_series, size), self.n_keywords)
+        owners = np.repeat(np.arange(size), keyword_counts)
+        links = np.unique(owners * self.n_keywords + rng.choice(self.n_keywords, len(owners), p=usage))
+        owners, ranks = np.divmod(links, self.n_keywords)
+        types = rng.integers(n_types, size=size) if n_types else np.zeros(size, dtype=int)
+        groups = rng.integers(n_leaves, size=size)
+        lengths = rng.integers(self.history_length[0], self.history_length[1] + 1, size)
+        lags = rng.integers(0, 4, size)
+        steps = rng.normal(0.0, .02, lengths.sum())
+        return {
+            'frequency': frequency, 'types': types, 'groups': groups, 'owners': owners, 'ranks': ranks,
+            'lengths': lengths, 'lags': lags, 'steps': steps,
+        }
+
+    def _series_draws(self, start, stop, blocks, *arguments):
+        """
+        Draws of the series `start` to `stop` (see `_block_draws`), owners numbered from `start`.
+        `blocks` caches the draws of the blocks, which are dropped once passed.
+        """
+        parts = []
+        for block in range(start // self.series_block, -(-stop // self.series_block)):
+            if block not in blocks:
+                blocks[block] = self._block_draws(block, *arguments)
+            draws = blocks[block]
+            offset = block * self.series_block
+            low, high = max(start, offset) - offset, min(stop, offset + len(draws['frequency'])) - offset
+            linked = (draws['owners'] >= low) & (draws['owners'] < high)
+            steps = np.concatenate([[0], np.cumsum(draws['lengths'])])
+            parts.append({
+                **{key: draws[key][low:high] for key in ['frequency', 'types', 'groups', 'lengths', 'lags']},
+                'owners': draws['owners'][linked] + offset - start,
+                'ranks': draws['ranks'][linked],
+                'steps': draws['steps'][steps[low]:steps[high]],
+            })
+        for block in [block for block in blocks if (block + 1) * self.series_block <= stop]:
+            del blocks[block]
+        return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    def _insert_groups(self, connection):
+        """
+        Inserts the tree of SeriesGroups, level by level; returns the ids of all the groups and
+        those of the leaves.
+        """
+        sb = SeriesBase.__table__
+        sg = SeriesGroup.__table__
+        parents = [None]
+        group_ids = []
+        number = 0
+        for level in range(self.depth + 1):
+            names = []
+            for parent_index in range(len(parents)):
+                for child in range(1 if level == 0 else self.branching):
+                    names.append(f"{self.word(number).capitalize()} group {number}")
+                    number += 1
+            ids = connection.execute(
+                sb.insert().returning(sb.c.id, sort_by_parameter_order=True),
+                [{'name': name, 'type': 'series_group'} for name in names]
+            ).scalars().all()
+            width = len(str(sum(self.branching ** k for k in range(self.depth + 1)) - 1))
+            first_number = number - len(names)
+            connection.execute(sg.insert(), [
+                {
+                    'id': group_id,
+                    'series_group_code': f"{self.group_code_prefix}{first_number + k:0{width}d}",
+                    'parent_id': parents[k // self.branching] if level else None,
+                }
+                for k, group_id in enumerate(ids)
+            ])
+            parents = ids
+            group_ids.extend(ids)
+        return group_ids, np.array(parents)
+
+    def _insert_histories(self, connection, series_ids, draws, frequencies, calendars):
+        """
+        Inserts random-walk levels ending at most 3 periods before `end_date`, from the
+        history draws of the series (see `_block_draws`).
+        """
+        steps = draws['steps']
+        rows = []
+        position = 0
+        for series_id, f, length, lag in zip(series_ids, draws['frequency'], draws['lengths'], draws['lags']):
+            calendar = calendars[frequencies[f]]
+            dates = calendar[len(calendar) - lag - length:len(calendar) - lag]
+            levels = 100.0 * np.exp(np.cumsum(steps[position:position + length]))
+            position += length
+            rows.extend(
+                {'time_series_id': int(series_id), 'date': date, 'value': float(value)}
+                for date, value in zip(dates, levels)
+            )
+        if rows:
+            connection.execute(DataPoint.__table__.insert(), rows)
+        return len(rows)
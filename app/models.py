@@ -5,6 +5,9 @@ from sqlalchemy.dialects.postgresql import insert as pg_insert
 import pandas as pd
 from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.sql import func
+from sqlalchemy import select, and_, or_, case, event, type_coerce, bindparam, inspect, String, Select
+from sqlalchemy.orm import Session
+import numpy as np
 import datetime
 import re
 
@@ -34,7 +37,7 @@ seriesgroup_seriesbase = db.Table(
 seriesbase_keyword = db.Table(
     'seriesbase_keyword',
     db.Column('seriesbase_id', db.Integer, db.ForeignKey('series_base.id'), primary_key=True),
-    db.Column('keyword_id', db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
+    db.Column('keyword_id', db.Integer, db.ForeignKey('keyword.id'), primary_key=True, index=True)
 )
 
 class BaseModel(db.Model):
@@ -253,12 +256,54 @@ class SeriesGroup(SeriesBase):
         'polymorphic_identity': 'series_group',
     }
 
+    # Denormalized member counts and date coverage, maintained on write
+    stats = db.relationship(
+        'SeriesGroupStats',
+        uselist=False,
+        lazy='select',
+        viewonly=True
+    )
+
     def __repr__(self):
+        n_children = self.stats.member_count if self.stats is not None else self.series.count()
         return (
-            f'SeriesGroup(name={self.name}, code={self.time_series_code}, '
-            + f'n_children={self.series.count()})'
+            f'SeriesGroup(name={self.name}, code={self.series_group_code}, '
+            + f'n_children={n_children})'
         )
 
+    def to_dataframe(self, recursive=False, start=None, end=None, as_of=None, session=None):
+        """
+        Returns the member TimeSeries of the group as a wide pandas DataFrame
+        (one column per member, one row per date), loaded with a single query.
+
+        Parameters:
+            recursive (bool): Also include the members of nested SeriesGroups
+                              (children through `parent_id` and groups that are members).
+            start (str or date, optional): Only include dates greater than or equal to `start`.
+            end (str or date, optional): Only include dates smaller than or equal to `end`.
+            as_of (str or date, optional): Only include data points released up to `as_of`.
+                                           Points without `date_release` count as released on `date`.
+            session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+
+        When a date has several data points, the one kept by `TimeSeries.to_dataframe` is
+        kept: the earliest release, points without `date_release` after released ones.
+        Columns follow the member ids and are named after the members.
+        """
+        if session is None:
+            session = db.session
+
+        start = _validate_date(start, 'start')
+        end = _validate_date(end, 'end')
+        as_of = _validate_date(as_of, 'as_of')
+
+        tree = _series_group_tree([self.id], recursive=recursive)
+        members = (
+            select(seriesgroup_seriesbase.c.seriesbase_id)
+            .where(seriesgroup_seriesbase.c.seriesgroup_id.in_(select(tree.c.group_id)))
+        )
+        stmt = _panel_statement(members, SeriesBase.__table__.c.name, start=start, end=end, as_of=as_of)
+        return _pivot_panel(session.execute(stmt).all())
+
 class TimeSeries(SeriesBase):
     __tablename__ = 'time_series'
     id = db.Column(db.Integer, db.ForeignKey('series_base.id'), primary_key=True)
@@ -845,8 +890,20 @@ class TimeSeries(SeriesBase):
             index_elements=['time_series_id', 'date', 'value']
         )
 
-        # Execute the UPSERT in one bulk query
-        session.execute(stmt)
+        # Execute the UPSERT in one bulk query, returning the dates of the rows inserted
+        new_dates = session.execute(stmt.returning(DataPoint.__table__.c.date)).scalars().all()
+
+        # Core inserts bypass the flush events, so keep the last update of the series
+        # and the statistics of the groups containing it current here (unless every row
+        # was already stored).
+        if new_dates:
+            session.execute(
+                SeriesBase.__table__.update()
+                .where(SeriesBase.__table__.c.id == self.id)
+                .values(date_update=func.now())
+            )
+            SeriesGroupStats.extend({self.id: (min(new_dates), max(new_dates))}, session=session)
+
         if commit:
             session.commit()
 
@@ -997,4 +1054,588 @@ class TimeSeriesType(BaseModel):
     }
 
     def __repr__(self):
-        return f'TimeSeriesType(name={self.name})>'
\ No newline at end of file
+        return f'TimeSeriesType(name={self.name})>'
+
+
+class SeriesGroupStats(BaseModel):
+    """
+    Denormalized statistics of a SeriesGroup, so that catalog listings do not need
+    one aggregate per group. Flushes and `upsert_data_points` that only add data points
+    extend the rows of the containing groups in place; deletions, changes of dates and
+    membership changes recompute them (`refresh`).
+
+    `member_count` counts the direct `series` members, TimeSeries and SeriesGroups alike
+    (as `series.count()`), without the `children` attached through `parent_id`.
+    `recursive_member_count` counts the distinct TimeSeries below the group at any depth,
+    through both `children` and member groups; groups themselves are not counted. The dates
+    and last update are those of these TimeSeries.
+    """
+    __tablename__ = 'series_group_stats'
+    series_group_id = db.Column(
+        db.Integer, db.ForeignKey('series_group.id', ondelete='CASCADE'), primary_key=True
+    )
+    member_count = db.Column(db.Integer, nullable=False, default=0)
+    recursive_member_count = db.Column(db.Integer, nullable=False, default=0)
+    min_date = db.Column(db.Date, nullable=True)
+    max_date = db.Column(db.Date, nullable=True)
+    last_date_update = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return (
+            f'SeriesGroupStats(series_group_id={self.series_group_id}, members={self.member_count}, '
+            + f'recursive_members={self.recursive_member_count}, dates={self.min_date}:{self.max_date})'
+        )
+
+    @classmethod
+    def refresh(cls, series_ids, session=None):
+        """
+        Recomputes the statistics of every SeriesGroup containing one of `series_ids`
+        (SeriesGroup ids count as containing themselves).
+
+        Parameters:
+            series_ids (iterable of int): Ids of the changed TimeSeries and/or SeriesGroups.
+            session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+        """
+        if session is None:
+            session = db.session
+        connection = session.connection()
+
+        group_ids = connection.execute(_series_group_ancestors(series_ids)).scalars().all()
+        if not group_ids:
+            return
+
+        stats = cls.__table__
+        dp = DataPoint.__table__
+        sb = SeriesBase.__table__
+        tree = _series_group_tree(group_ids, recursive=True)
+        members = (
+            select(tree.c.root_id, seriesgroup_seriesbase.c.seriesbase_id.label('time_series_id'))
+            .join(seriesgroup_seriesbase, seriesgroup_seriesbase.c.seriesgroup_id == tree.c.group_id)
+            .join(TimeSeries.__table__, TimeSeries.__table__.c.id == seriesgroup_seriesbase.c.seriesbase_id)
+            .distinct()
+            .subquery('series_group_members')
+        )
+        coverage = (
+            select(
+                dp.c.time_series_id,
+                func.min(dp.c.date).label('min_date'),
+                func.max(dp.c.date).label('max_date'),
+            )
+            .where(dp.c.time_series_id.in_(select(members.c.time_series_id)))
+            .group_by(dp.c.time_series_id)
+            .subquery('series_coverage')
+        )
+        recursive_rows = connection.execute(
+            select(
+                members.c.root_id,
+                func.count(),
+                func.min(coverage.c.min_date),
+                func.max(coverage.c.max_date),
+                func.max(sb.c.date_update),
+            )
+            .select_from(members)
+            .join(sb, sb.c.id == members.c.time_series_id)
+            .outerjoin(coverage, coverage.c.time_series_id == members.c.time_series_id)
+            .group_by(members.c.root_id)
+        ).all()
+        direct_counts = dict(connection.execute(
+            select(seriesgroup_seriesbase.c.seriesgroup_id, func.count())
+            .where(seriesgroup_seriesbase.c.seriesgroup_id.in_(group_ids))
+            .group_by(seriesgroup_seriesbase.c.seriesgroup_id)
+        ).all())
+
+        recursive_stats = {row[0]: row[1:] for row in recursive_rows}
+        rows = []
+        for group_id in group_ids:
+            recursive_count, min_date, max_date, last_date_update = recursive_stats.get(
+                group_id, (0, None, None, None)
+            )
+            rows.append({
+                'series_group_id': group_id,
+                'member_count': direct_counts.get(group_id, 0),
+                'recursive_member_count': recursive_count,
+                'min_date': min_date,
+                'max_date': max_date,
+                'last_date_update': last_date_update,
+            })
+        connection.execute(stats.delete().where(stats.c.series_group_id.in_(group_ids)))
+        connection.execute(stats.insert(), rows)
+
+    @classmethod
+    def extend(cls, coverage, session=None):
+        """
+        Widens the date coverage and bumps the last update of every SeriesGroup containing
+        one of the series of `coverage`, without recomputing any aggregate. Only valid for
+        additions (new data points, updated series): anything that can shrink the coverage
+        or change memberships needs `refresh`.
+
+        Parameters:
+            coverage (dict): {series id: (min_date, max_date)} of the added data points;
+                             (None, None) only bumps the last update.
+            session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+        """
+        if session is None:
+            session = db.session
+        if not coverage:
+            return
+        connection = session.connection()
+
+        widened = {}
+        for series_id, group_id in connection.execute(_series_group_ancestors(coverage, with_origin=True)):
+            dates = [date for date in coverage[series_id] + widened.get(group_id, ()) if date is not None]
+            widened[group_id] = (min(dates), max(dates)) if dates else (None, None)
+        if not widened:
+            return
+
+        stats = cls.__table__
+        min_date = bindparam('new_min_date', type_=db.Date)
+        max_date = bindparam('new_max_date', type_=db.Date)
+        connection.execute(
+            stats.update()
+            .where(stats.c.series_group_id == bindparam('group_id'))
+            .values(
+                min_date=case(
+                    (min_date.is_(None), stats.c.min_date),
+                    (or_(stats.c.min_date.is_(None), stats.c.min_date > min_date), min_date),
+                    else_=stats.c.min_date
+                ),
+                max_date=case(
+                    (max_date.is_(None), stats.c.max_date),
+                    (or_(stats.c.max_date.is_(None), stats.c.max_date < max_date), max_date),
+                    else_=stats.c.max_date
+                ),
+                last_date_update=func.now(),
+            ),
+            [
+                {'group_id': group_id, 'new_min_date': low, 'new_max_date': high}
+                for group_id, (low, high) in widened.items()
+            ]
+        )
+
+    @classmethod
+    def rebuild(cls, session=None, commit=True):
+        """
+        Recomputes the statistics of every SeriesGroup, e.g. after bulk loads that bypass the ORM.
+        """
+        if session is None:
+            session = db.session
+        group_ids = session.execute(select(SeriesGroup.__table__.c.id)).scalars().all()
+        if group_ids:
+            cls.refresh(group_ids, session=session)
+        if commit:
+            session.commit()
+
+    @classmethod
+    def to_dataframe(cls, session=None):
+        """
+        Returns one row per SeriesGroup with its statistics, using a single scan.
+        """
+        if session is None:
+            session = db.session
+
+        sg = SeriesGroup.__table__
+        sb = SeriesBase.__table__
+        stats = cls.__table__
+        rows = session.execute(
+            select(
+                sg.c.id,
+                sb.c.name,
+                sg.c.series_group_code.label('code'),
+                sg.c.parent_id,
+                stats.c.member_count,
+                stats.c.recursive_member_count,
+                stats.c.min_date,
+                stats.c.max_date,
+                stats.c.last_date_update,
+            )
+            .join(sb, sb.c.id == sg.c.id)
+            .outerjoin(stats, stats.c.series_group_id == sg.c.id)
+            .order_by(sg.c.id)
+        ).all()
+        return pd.DataFrame(rows, columns=[
+            'id', 'name', 'code', 'parent_id', 'member_count', 'recursive_member_count',
+            'min_date', 'max_date', 'last_date_update'
+        ])
+
+
+class VolatilityFit(BaseModel):
+    """
+    Estimated parameters of a volatility model of a TimeSeries, on its observations up to
+    `last_date`, so that later forecasts can reuse them instead of estimating from scratch
+    (see `app.volatility`). `model_spec` is the key of the model specification.
+    """
+    __tablename__ = 'volatility_fit'
+    time_series_id = db.Column(
+        db.Integer, db.ForeignKey('time_series.id', ondelete='CASCADE'), primary_key=True
+    )
+    model_spec = db.Column(db.String(100), primary_key=True)
+    last_date = db.Column(db.Date, primary_key=True)
+    observations = db.Column(db.Integer, nullable=False)
+    parameters = db.Column(db.JSON, nullable=False)
+    log_likelihood = db.Column(db.Float, nullable=True)
+    converged = db.Column(db.Boolean, nullable=False, default=True)
+    date_create = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return (
+            f'VolatilityFit(time_series_id={self.time_series_id}, model_spec={self.model_spec!r}, '
+            + f'last_date={self.last_date}, observations={self.observations})'
+        )
+
+
+def _flushed_series_ids(objects):
+    """
+    Returns the ids of the SeriesBase rows touched by `objects` (series and their data points).
+    """
+    series_ids = set()
+    for obj in objects:
+        if isinstance(obj, SeriesBase):
+            series_id = obj.id
+        elif isinstance(obj, DataPoint):
+            series_id = obj.time_series_id
+            if series_id is None and obj.time_series is not None:
+                series_id = obj.time_series.id
+        else:
+            continue
+        if series_id is not None:
+            series_ids.add(series_id)
+    return series_ids
+
+
+def get_catalog_changes(session, content_only=False):
+    """
+    Returns the ids of the SeriesBase rows written by the current flush (with those whose
+    keywords change), as (changed_ids, deleted_ids). With `content_only`, only the rows
+    whose searchable content (name, description, code or keywords) changes count as changed,
+    not e.g. a `date_update` bumped by new data points.
+    Meant to be called from after_flush events, when session.new/dirty/deleted and the
+    attribute histories are still populated; computed once per flush and shared by every
+    listener (do not modify the sets).
+    """
+    changes = session.info.get('catalog_changes')
+    if changes is None:
+        changes = session.info['catalog_changes'] = _catalog_changes(session)
+    changed_ids, content_ids, deleted_ids = changes
+    return (content_ids if content_only else changed_ids), deleted_ids
+
+
+def _catalog_changes(session):
+    changed_ids = set()
+    content_ids = set()
+    deleted_ids = set()
+    keyword_ids = set()
+    for obj in session.new:
+        if isinstance(obj, SeriesBase) and obj.id is not None:
+            changed_ids.add(obj.id)
+            content_ids.add(obj.id)
+        elif isinstance(obj, Keyword) and obj.id is not None:
+            keyword_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, SeriesBase) and obj.id is not None:
+            changed_ids.add(obj.id)
+            if _searchable_content_changed(obj):
+                content_ids.add(obj.id)
+        elif isinstance(obj, Keyword) and obj.id is not None:
+            state = inspect(obj)
+            if state.attrs.word.history.has_changes():
+                keyword_ids.add(obj.id)
+            history = state.attrs.series.history
+            content_ids.update(series.id for series in list(history.added) + list(history.deleted)
+                               if series.id is not None)
+    for obj in session.deleted:
+        if isinstance(obj, SeriesBase) and obj.id is not None:
+            deleted_ids.add(obj.id)
+        elif isinstance(obj, Keyword) and obj.id is not None:
+            keyword_ids.add(obj.id)
+    if keyword_ids:
+        content_ids.update(session.connection().execute(
+            select(seriesbase_keyword.c.seriesbase_id)
+            .where(seriesbase_keyword.c.keyword_id.in_(keyword_ids))
+        ).scalars().all())
+    changed_ids |= content_ids
+    return changed_ids - deleted_ids, content_ids - deleted_ids, deleted_ids
+
+
+def _searchable_content_changed(series):
+    """
+    Returns True if the name, description, code or keywords of a stored SeriesBase are changing.
+    """
+    state = inspect(series)
+    code = 'time_series_code' if isinstance(series, TimeSeries) else 'series_group_code'
+    keys = ['name', 'description', 'keywords'] + ([code] if code in state.attrs else [])
+    return any(state.attrs[key].history.has_changes() for key in keys)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+@event.listens_for(Session, 'after_rollback')
+def _forget_catalog_changes(session, flush_context=None):
+    session.info.pop('catalog_changes', None)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_series_group_stats_of_deleted(session, flush_context, instances):
+    # Memberships of deleted rows are gone after the flush, so resolve their groups now.
+    series_ids = _flushed_series_ids(session.deleted)
+    if series_ids:
+        group_ids = session.connection().execute(_series_group_ancestors(series_ids)).scalars().all()
+        session.info.setdefault('series_group_stats_pending', set()).update(group_ids)
+    # Data points moved to another date or series: their stored series may lose coverage
+    moved_ids = [obj.id for obj in session.dirty if isinstance(obj, DataPoint) and _data_point_moved(obj)]
+    if moved_ids:
+        dp = DataPoint.__table__
+        series_ids = session.connection().execute(
+            select(dp.c.time_series_id).where(dp.c.id.in_(moved_ids)).distinct()
+        ).scalars().all()
+        session.info.setdefault('series_group_stats_pending', set()).update(series_ids)
+    # The statistics rows of deleted groups go with them (ON DELETE CASCADE is not
+    # enforced everywhere, e.g. on SQLite without foreign keys)
+    deleted_group_ids = {obj.id for obj in session.deleted if isinstance(obj, SeriesGroup) and obj.id is not None}
+    if deleted_group_ids:
+        session.info.setdefault('series_group_stats_deleted', set()).update(deleted_group_ids)
+
+
+def _data_point_moved(data_point):
+    """
+    Returns True if a stored DataPoint is being given another date or series.
+    """
+    state = inspect(data_point)
+    return state.persistent and data_point.id is not None and any(
+        state.attrs[key].history.has_changes() for key in ('date', 'time_series_id', 'time_series')
+    )
+
+
+def _series_group_stats_changes(objects):
+    """
+    Sorts the new and updated `objects` of a flush by their effect on SeriesGroupStats, as
+    (refresh_ids, coverage): the ids of the series whose groups must be recomputed (new or
+    updated groups, changed memberships, data points whose date or series changed), and
+    {series id: (min_date, max_date)} of the data points that only add coverage
+    ((None, None) for series updated otherwise, which only bump the last update).
+    """
+    refresh_ids = set()
+    coverage = {}
+
+    def add(series_id, date):
+        low, high = coverage.get(series_id, (None, None))
+        if date is not None:
+            low = date if low is None or date < low else low
+            high = date if high is None or date > high else high
+        coverage[series_id] = (low, high)
+
+    for obj in objects:
+        if isinstance(obj, SeriesGroup):
+            if obj.id is not None:
+                refresh_ids.add(obj.id)
+        elif isinstance(obj, SeriesBase):
+            if obj.id is None:
+                continue
+            if inspect(obj).attrs.series_groups.history.has_changes():
+                refresh_ids.add(obj.id)
+            else:
+                add(obj.id, None)
+        elif isinstance(obj, DataPoint):
+            series_ids = _flushed_series_ids([obj])
+            if _data_point_moved(obj):
+                refresh_ids.update(series_ids)
+            else:
+                for series_id in series_ids:
+                    add(series_id, obj.date)
+    return refresh_ids, coverage
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_series_group_stats(session, flush_context):
+    refresh_ids, coverage = _series_group_stats_changes(list(session.new) + list(session.dirty))
+    refresh_ids.update(session.info.pop('series_group_stats_pending', set()))
+    deleted_group_ids = session.info.pop('series_group_stats_deleted', set())
+    if deleted_group_ids:
+        stats = SeriesGroupStats.__table__
+        session.connection().execute(stats.delete().where(stats.c.series_group_id.in_(deleted_group_ids)))
+    # Additions only widen the coverage; the rest is recomputed for the groups concerned
+    SeriesGroupStats.extend(coverage, session=session)
+    if refresh_ids:
+        SeriesGroupStats.refresh(refresh_ids, session=session)
+
+
+def _validate_date(value, argument_name):
+    """
+    Converts a date-like argument (str, date or datetime) to a `datetime.date`.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            return pd.to_datetime(value).date()
+        except ValueError:
+            raise ValueError(f"{argument_name} must be a valid date string.")
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    raise ValueError(f"{argument_name} must be a valid date string, date or datetime.")
+
+
+def _series_group_edges(include_time_series=False):
+    """
+    Builds a subquery with the columns (parent_id, child_id) listing every nesting edge:
+    `children` through `parent_id` and `series` members through `seriesgroup_seriesbase`.
+    Member edges are restricted to SeriesGroup members unless `include_time_series` is True.
+    """
+    sg = SeriesGroup.__table__
+    member_edges = select(seriesgroup_seriesbase.c.seriesgroup_id, seriesgroup_seriesbase.c.seriesbase_id)
+    if not include_time_series:
+        member_edges = member_edges.join(sg, sg.c.id == seriesgroup_seriesbase.c.seriesbase_id)
+    return (
+        select(sg.c.parent_id.label('parent_id'), sg.c.id.label('child_id'))
+        .where(sg.c.parent_id.isnot(None))
+        .union_all(member_edges)
+        .subquery('series_group_edges')
+    )
+
+
+def _series_group_ancestors(series_ids, with_origin=False):
+    """
+    Returns a select of the ids of every SeriesGroup that contains, directly or through
+    nesting, one of `series_ids`. SeriesGroup ids in `series_ids` are included themselves.
+    With `with_origin`, selects (series_id, group_id) pairs instead, one per containing group
+    of each of `series_ids`.
+    """
+    sg = SeriesGroup.__table__
+    sb = SeriesBase.__table__
+    ancestors = (
+        select(sb.c.id.label('origin_id'), sb.c.id.label('group_id'))
+        .where(sb.c.id.in_(list(series_ids)))
+        .cte('series_group_ancestors', recursive=True)
+    )
+    edges = _series_group_edges(include_time_series=True)
+    child = ancestors.alias('series_group_ancestors_child')
+    ancestors = ancestors.union(
+        select(child.c.origin_id, edges.c.parent_id).join(child, edges.c.child_id == child.c.group_id)
+    )
+    if with_origin:
+        return (
+            select(ancestors.c.origin_id, ancestors.c.group_id)
+            .where(ancestors.c.group_id.in_(select(sg.c.id)))
+        )
+    return select(sg.c.id).where(sg.c.id.in_(select(ancestors.c.group_id)))
+
+
+def _series_group_tree(root_ids, recursive=True, name='series_group_tree'):
+    """
+    Builds a CTE with the columns (root_id, group_id) listing, for each root SeriesGroup,
+    itself and every SeriesGroup nested below it. A group is nested below another when it
+    is one of its `children` or when it is one of its `series` members.
+    `root_ids` is an iterable of ids or a select of them; `name` names the CTE, so that
+    several trees can be used in one statement.
+    """
+    sg = SeriesGroup.__table__
+    if not isinstance(root_ids, Select):
+        root_ids = list(root_ids)
+    tree = (
+        select(sg.c.id.label('root_id'), sg.c.id.label('group_id'))
+        .where(sg.c.id.in_(root_ids))
+        .cte(name, recursive=recursive)
+    )
+    if not recursive:
+        return tree
+
+    edges = _series_group_edges()
+    parent = tree.alias(f'{name}_parent')
+    # UNION (not UNION ALL) so that cyclic memberships terminate.
+    return tree.union(
+        select(parent.c.root_id, edges.c.child_id)
+        .join(edges, edges.c.parent_id == parent.c.group_id)
+    )
+
+
+def _panel_statement(series_ids, label_column, start=None, end=None, as_of=None):
+    """
+    Builds the statement loading the data points of the TimeSeries `series_ids` (ids or a
+    select of them) as long (series_id, label, date, value) rows for `_pivot_panel`, with one
+    NULL-date row for series without points. `label_column` names the columns (e.g. the name
+    or the code); `start`, `end` and `as_of` are dates, as in `SeriesGroup.to_dataframe`.
+    """
+    if not isinstance(series_ids, Select):
+        series_ids = list(series_ids)
+    ts = TimeSeries.__table__
+    dp = DataPoint.__table__
+    join_conditions = [dp.c.time_series_id == ts.c.id]
+    if start is not None:
+        join_conditions.append(dp.c.date >= start)
+    if end is not None:
+        join_conditions.append(dp.c.date <= end)
+    if as_of is not None:
+        join_conditions.append(func.coalesce(dp.c.date_release, dp.c.date) <= as_of)
+
+    return (
+        select(
+            ts.c.id,
+            label_column,
+            # Dates are parsed once per distinct date in _pivot_panel, not once per row.
+            type_coerce(dp.c.date, String).label('date'),
+            dp.c.value,
+        )
+        .select_from(ts)
+        .join(SeriesBase.__table__, SeriesBase.__table__.c.id == ts.c.id)
+        .outerjoin(dp, and_(*join_conditions))
+        .where(ts.c.id.in_(series_ids))
+        .order_by(ts.c.id, dp.c.date, *_preferred_last(dp))
+    )
+
+
+def _preferred_last(dp):
+    """
+    ORDER BY clauses that sort the data points of a date so that the one kept by
+    `TimeSeries.to_dataframe` comes last: the earliest release, points without `date_release`
+    after released ones, then the earliest created.
+    """
+    return [dp.c.date_release.is_(None).desc(), dp.c.date_release.desc(), dp.c.date_create.desc(), dp.c.id.desc()]
+
+
+def _pivot_panel(rows, columns=None):
+    """
+    Pivots long (series_id, name, date, value) rows into a wide DataFrame.
+
+    Parameters:
+        rows (list): Result rows ordered so that, for each (series_id, date), the
+                     preferred value comes last. Rows with a NULL date only declare a column.
+        columns (list of tuple, optional): (series_id, name) pairs in the desired column order.
+                                           Defaults to the order of first appearance in `rows`.
+    """
+    panel = pd.DataFrame.from_records(rows, columns=['series_id', 'name', 'date', 'value'])
+    if columns is None:
+        first_rows = panel.drop_duplicates('series_id')
+        columns = list(zip(first_rows['series_id'], first_rows['name']))
+    column_names = pd.Index([name for _, name in columns])
+    panel = panel[panel['date'].notna()]
+    if panel.empty:
+        return pd.DataFrame(
+            np.empty((0, len(columns))),
+            index=pd.DatetimeIndex([], name='date'),
+            columns=column_names
+        )
+
+    column_position = pd.Index([series_id for series_id, _ in columns])
+    column_index = column_position.get_indexer(panel['series_id'].to_numpy())
+    date_codes, unique_dates = pd.factorize(panel['date'].to_numpy())
+    unique_dates = pd.to_datetime(unique_dates)
+    date_order = np.argsort(unique_dates.values, kind='stable')
+    date_rank = np.empty_like(date_order)
+    date_rank[date_order] = np.arange(len(date_order))
+    date_index = date_rank[date_codes]
+    values = panel['value'].to_numpy(dtype=float)
+
+    # Keep the last row of every (date, column) cell.
+    cell = date_index * len(columns) + column_index
+    order = np.argsort(cell, kind='stable')
+    cell = cell[order]
+    last = np.r_[cell[1:] != cell[:-1], True]
+    keep = order[last]
+
+    matrix = np.full((len(unique_dates), len(columns)), np.nan)
+    matrix[date_index[keep], column_index[keep]] = values[keep]
+    return pd.DataFrame(
+        matrix,
+        index=pd.DatetimeIndex(unique_dates.values[date_order], name='date'),
+        columns=column_names
+    )
@@ -0,0 +1,501 @@
+# app/portfolio.py
+
+"""
+Mean-variance portfolio optimization and efficient frontiers.
+
+`FrontierOptimizer` finds the efficient portfolios
+
+    minimize  w' C w / 2 - lambda * mean' w   subject to   sum(w) = 1,
+                                                           lower <= w <= upper,
+                                                           group_lower <= sum(w[group]) <= group_upper
+
+for every lambda >= 0, i.e. the minimum-variance portfolio of every attainable target return.
+Between two changes of the set of binding constraints, the solution is linear in lambda. The
+whole frontier is therefore traced as one path (the critical line method): starting from the
+highest attainable return (a linear program, lambda infinite), every step solves the
+optimality conditions on the free weights only, then lowers lambda to the next point where a
+weight reaches a bound or a binding constraint is released, down to the minimum-variance
+portfolio (lambda = 0). Each frontier point continues from the binding set and solution of the
+previous one (a warm start), so a point costs a few small linear solves instead of a full
+optimization, and the solutions are exact.
+
+`efficient_frontier` builds the frontier of stored series, with group constraints taken
+from SeriesGroup memberships.
+"""
+
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import linprog
+from sqlalchemy import select
+from app import db
+from .models import TimeSeries, SeriesGroup, seriesgroup_seriesbase, _series_group_tree
+from .analytics import load_panel, simple_returns
+from .covariance import covariance_matrix
+
+FRONTIER_COLUMNS = ['target_return', 'expected_return', 'volatility', 'breakpoints', 'solve_seconds']
+
+# A piece of the path: weights x + lambda * dx for lambda in [low, high], with (scaled)
+# expected returns from t_low to t_high
+_Segment = namedtuple('_Segment', ['low', 'high', 'x', 'dx', 't_low', 't_high', 'seconds'])
+
+# Tolerance on the scaled problem (unit mean variance, unit largest mean return)
+_TOLERANCE = 1e-10
+
+# Smallest eigenvalue of the scaled covariance matrix (see FrontierOptimizer)
+_MIN_EIGENVALUE = 1e-8
+
+
+class FrontierOptimizer:
+    """
+    Efficient portfolios under weight and group constraints, from one traced path.
+
+    Parameters:
+        mean (Series): Expected returns of the assets.
+        covariance (DataFrame): Covariance matrix (positive semi-definite, possibly singular),
+                                same assets.
+        lower, upper (float or Series): Bounds on every weight. Defaults to long-only
+                                        (0 <= w <= 1). Bounds must be finite.
+        groups (dict, optional): {name: (assets, lower, upper)} bounds on the total weight of
+                                 groups of assets (None for an unbounded side).
+        max_iterations (int, optional): Maximum number of binding set changes along the path.
+    """
+
+    def __init__(
+        self,
+        mean,
+        covariance,
+        lower=0.0,
+        upper=1.0,
+        groups=None,
+        max_iterations=None,
+    ):
+        self.assets = pd.Index(mean.index)
+        covariance = covariance.reindex(index=self.assets, columns=self.assets)
+        if covariance.isna().any().any():
+            raise ValueError("covariance must be complete for the assets of mean.")
+        if mean.isna().any():
+            raise ValueError("mean must not contain missing values.")
+        self.mean = mean.to_numpy(dtype=float)
+        self.covariance = covariance.to_numpy(dtype=float)
+        self.lower = self._bounds(lower)
+        self.upper = self._bounds(upper)
+        if not (np.isfinite(self.lower).all() and np.isfinite(self.upper).all()):
+            raise ValueError("Weight bounds must be finite.")
+        if np.any(self.lower > self.upper):
+            raise ValueError("lower bounds must not exceed upper bounds.")
+
+        n = len(self.assets)
+        self.groups = groups or {}
+        rows = []
+        group_lower = []
+        group_upper = []
+        for name, (members, minimum, maximum) in self.groups.items():
+            unknown = set(members) - set(self.assets)
+            if unknown:
+                raise ValueError(f"Group {name!r} has unknown assets: " + ", ".join(map(str, sorted(unknown))))
+            rows.append(self.assets.isin(list(members)).astype(float))
+            group_lower.append(-np.inf if minimum is None else minimum)
+            group_upper.append(np.inf if maximum is None else maximum)
+        self._groups = np.array(rows).reshape(-1, n)
+        self._group_lower = np.array(group_lower, dtype=float)
+        self._group_upper = np.array(group_upper, dtype=float)
+        self.max_iterations = max_iterations or 20 * (n + len(rows)) + 100
+
+        # The path does not depend on the scales of the variance and of the returns, and
+        # tolerances are relative to values of order one
+        self._p = self.covariance / (np.mean(np.diag(self.covariance)) or 1.0)
+        # A singular covariance (e.g. from fewer observations than assets) leaves the
+        # optimality conditions of some binding sets without a unique solution: a ridge raises
+        # the smallest eigenvalue of the scaled matrix to _MIN_EIGENVALUE, so that every free
+        # block is invertible. Variances change by at most that fraction of the mean one.
+        if n:
+            ridge = _MIN_EIGENVALUE - np.linalg.eigvalsh(self._p)[0]
+            if ridge > 0:
+                self._p = self._p + ridge * np.eye(n)
+        self._mean_scale = np.max(np.abs(self.mean)) or 1.0
+        self._m = self.mean / self._mean_scale
+        self._path = None
+
+    def _bounds(self, bound):
+        if isinstance(bound, pd.Series):
+            bound = bound.reindex(self.assets)
+            if bound.isna().any():
+                raise ValueError("Weight bounds must be given for every asset.")
+            return bound.to_numpy(dtype=float)
+        return np.broadcast_to(np.asarray(bound, dtype=float), len(self.assets)).copy()
+
+    def max_return(self):
+        """
+        Returns the highest expected return attainable under the constraints.
+        """
+        return self._trace()[0].t_high * self._mean_scale
+
+    def min_variance_return(self):
+        """
+        Returns the expected return of the minimum-variance portfolio (the low end of the frontier).
+        """
+        return self._trace()[-1].t_low * self._mean_scale
+
+    def solve(self, target_return):
+        """
+        Returns the weights (Series) of the minimum-variance portfolio with expected return
+        `target_return`, between `min_variance_return()` and `max_return()`.
+        """
+        return pd.Series(self._weights_at(target_return / self._mean_scale), index=self.assets)
+
+    def frontier(self, n_points=50, targets=None):
+        """
+        Traces the frontier from the highest attainable return down to the minimum-variance
+        portfolio, each point continuing from the previous one.
+
+        Parameters:
+            n_points (int): Number of evenly spaced target returns.
+            targets (list of float, optional): Target returns to use instead.
+
+        Returns:
+            tuple: (summary, weights). `summary` has one row per point (ascending target) with
+                   the FRONTIER_COLUMNS: the number of binding set changes since the previous
+                   point and the time spent reaching the point (to track regressions);
+                   `weights` has one row per point and one column per asset.
+        """
+        # Traced again, so that the times are those of this call
+        self._path = None
+        path = self._trace()
+        if targets is None:
+            targets = np.linspace(self.min_variance_return(), self.max_return(), n_points)
+        targets = np.sort(np.asarray(targets, dtype=float))[::-1]
+
+        rows = []
+        weights = []
+        reached = 0
+        for target in targets:
+            start = time.perf_counter()
+            x = self._weights_at(target / self._mean_scale)
+            passed = reached
+            while passed < len(path) - 1 and path[passed].t_low > target / self._mean_scale:
+                passed += 1
+            # Time of the segments traced since the previous point (the first point also
+            # pays the linear program)
+            traced = sum(segment.seconds for segment in path[reached + 1 if rows else 0:passed + 1])
+            rows.append([
+                target, float(self.mean @ x), float(np.sqrt(max(x @ self.covariance @ x, 0.0))),
+                passed - reached, traced + time.perf_counter() - start,
+            ])
+            weights.append(x)
+            reached = passed
+        summary = pd.DataFrame(rows[::-1], columns=FRONTIER_COLUMNS)
+        weights = pd.DataFrame(np.array(weights[::-1]).reshape(-1, len(self.assets)), columns=self.assets)
+        return summary, weights
+
+    def _weights_at(self, t):
+        path = self._trace()
+        if t > path[0].t_high + _TOLERANCE or t < path[-1].t_low - _TOLERANCE:
+            raise ValueError("Target returns must be between the minimum-variance return and the maximum return.")
+        for segment in path:
+            if t >= segment.t_low - _TOLERANCE:
+                break
+        # Returns are linear in lambda along a segment
+        rate = self._m @ segment.dx
+        if abs(rate) > _TOLERANCE:
+            lam = np.clip((t - self._m @ segment.x) / rate, segment.low, segment.high)
+        else:
+            lam = segment.low
+        return np.clip(segment.x + lam * segment.dx, self.lower, self.upper)
+
+    def _max_return_portfolio(self):
+        """
+        Solves the linear program of the highest return and returns its binding set, as
+        (fixed, group_state): -1/1 for weights and groups at their lower/upper bound, 0 otherwise.
+        """
+        n = len(self.assets)
+        has_upper, has_lower = np.isfinite(self._group_upper), np.isfinite(self._group_lower)
+        result = linprog(
+            -self._m,
+            A_ub=np.vstack([self._groups[has_upper], -self._groups[has_lower]]).reshape(-1, n),
+            b_ub=np.concatenate([self._group_upper[has_upper], -self._group_lower[has_lower]]),
+            A_eq=np.ones((1, n)),
+            b_eq=[1.0],
+            bounds=list(zip(self.lower, self.upper)),
+            method='highs',
+        )
+        if not result.success:
+            raise ValueError("The weight constraints are infeasible: " + result.message)
+
+        # Weights at a bound with a zero marginal (ties of returns) are free to move
+        x = result.x
+        tolerance = 1e-9
+        at_lower = (x - self.lower <= tolerance) & (np.abs(result.lower.marginals) > tolerance)
+        at_upper = (self.upper - x <= tolerance) & (np.abs(result.upper.marginals) > tolerance)
+        fixed = np.where(at_lower, -1, np.where(at_upper, 1, 0))
+        group_marginals = np.zeros(len(self._groups))
+        group_marginals[has_upper] += result.ineqlin.marginals[:has_upper.sum()]
+        group_marginals[has_lower] += result.ineqlin.marginals[has_upper.sum():]
+        values = self._groups @ x
+        binding = np.abs(group_marginals) > tolerance
+        group_state = np.zeros(len(self._groups), dtype=int)
+        group_state[binding & (values - self._group_lower <= tolerance)] = -1
+        group_state[binding & (self._group_upper - values <= tolerance)] = 1
+        return fixed, group_state
+
+    def _trace(self):
+        """
+        Traces the solutions from lambda infinite (the highest return) down to 0 (the
+        minimum-variance portfolio), as a list of _Segment.
+        """
+        if self._path is not None:
+            return self._path
+        start = time.perf_counter()
+        fixed, group_state = self._max_return_portfolio()
+        inverse = _FreeInverse(self._p, np.flatnonzero(fixed == 0))
+
+        path = []
+        lam = np.inf
+        for _ in range(self.max_iterations):
+            x0, dx, checks = self._segment(fixed, group_state, inverse)
+            # Lowering lambda, a condition f0 + lambda * rate >= 0 fails at -f0 / rate if
+            # rate > 0; the next event is the highest such lambda (at most the current one)
+            next_lam = 0.0
+            event = None
+            for kind, index, f0, rate in checks:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    roots = np.where(rate > _TOLERANCE, np.minimum(-f0 / rate, lam), -np.inf)
+                if len(roots) and roots.max() > next_lam:
+                    position = int(np.argmax(roots))
+                    next_lam, event = roots[position], (kind, index[position])
+
+            x_high = x0 if np.isinf(lam) else x0 + lam * dx
+            now = time.perf_counter()
+            path.append(_Segment(
+                next_lam, lam, x0, dx, float(self._m @ (x0 + next_lam * dx)), float(self._m @ x_high), now - start
+            ))
+            start = now
+            if event is None:
+                break
+
+            kind, i = event
+            if kind == 'free':
+                fixed[i] = -1 if dx[i] > 0 else 1
+                inverse.remove(i)
+            elif kind == 'group':
+                group_state[i] = -1 if self._groups[i] @ dx > 0 else 1
+            elif kind == 'fixed':
+                fixed[i] = 0
+                inverse.add(i)
+            else:
+                group_state[i] = 0
+            lam = next_lam
+        else:
+            raise ValueError("The efficient frontier could not be traced; check the constraints.")
+
+        self._path = path
+        return path
+
+    def _segment(self, fixed, group_state, inverse):
+        """
+        Solves the optimality conditions with a binding set (`fixed`: -1/1 for weights at their
+        lower/upper bound, 0 for free ones; `group_state` likewise for groups), as an affine
+        function of lambda. `inverse` is the _FreeInverse of the free weights.
+
+        Returns:
+            tuple: (x0, dx, checks): the weights x0 + lambda * dx, and the conditions that must
+                   stay nonnegative as (kind, indices, f0, rate) with values f0 + lambda * rate.
+        """
+        n = len(self.assets)
+        free = fixed == 0
+        x_fixed = np.where(free, 0.0, np.where(fixed < 0, self.lower, self.upper))
+        active_groups = np.flatnonzero(group_state)
+        states = group_state[active_groups]
+        constraints = np.vstack([np.ones(n), self._groups[active_groups]])
+        targets = np.concatenate([
+            [1.0],
+            np.where(states < 0, self._group_lower[active_groups], self._group_upper[active_groups]),
+        ])
+
+        # Free weights (in the order of `inverse`) from P_ff x_f + C_f' nu = rhs and
+        # C_f x_f = targets - C x_fixed, for the intercept and the rate in lambda
+        indices = inverse.indices
+        rhs = np.column_stack([-(self._p @ x_fixed)[indices], self._m[indices]])
+        rows = np.column_stack([targets - constraints @ x_fixed, np.zeros(len(targets))])
+        c_free = constraints[:, indices]
+        if inverse.ill_conditioned:
+            # The whole system, factorized directly: the free block is positive definite (see
+            # the ridge), and the least-squares solve only absorbs redundant constraint rows
+            kkt = np.block([[self._p[np.ix_(indices, indices)], c_free.T], [c_free, np.zeros((len(targets),) * 2)]])
+            solution = np.linalg.lstsq(kkt, np.vstack([rhs, rows]), rcond=None)[0]
+            x_free, nu = solution[:len(indices)], solution[len(indices):]
+        else:
+            # Schur complement on the few constraint rows
+            inverse_rhs = inverse.matrix @ rhs
+            inverse_c = inverse.matrix @ c_free.T
+            nu = np.linalg.lstsq(c_free @ inverse_c, c_free @ inverse_rhs - rows, rcond=None)[0]
+            x_free = inverse_rhs - inverse_c @ nu
+        x0 = x_fixed.copy()
+        x0[indices] = x_free[:, 0]
+        dx = np.zeros(n)
+        dx[indices] = x_free[:, 1]
+        nu0, nu_rate = nu[:, 0], nu[:, 1]
+
+        # Multipliers of the bounds (gradient of the Lagrangian at the fixed weights) must be
+        # >= 0 at a lower bound and <= 0 at an upper bound; group multipliers likewise
+        sign = -fixed[~free].astype(float)
+        gradient0 = (self._p @ x0 + constraints.T @ nu0)[~free]
+        gradient_rate = (self._p @ dx - self._m + constraints.T @ nu_rate)[~free]
+        inactive = np.flatnonzero(group_state == 0)
+        values0, value_rates = self._groups[inactive] @ x0, self._groups[inactive] @ dx
+        checks = [
+            ('free', np.flatnonzero(free), (x0 - self.lower)[free], dx[free]),
+            ('free', np.flatnonzero(free), (self.upper - x0)[free], -dx[free]),
+            ('fixed', np.flatnonzero(~free), sign * gradient0, sign * gradient_rate),
+            ('group', inactive, values0 - self._group_lower[inactive], value_rates),
+            ('group', inactive, self._group_upper[inactive] - values0, -value_rates),
+            ('release', active_groups, states * nu0[1:], states * nu_rate[1:]),
+        ]
+        return x0, dx, checks
+
+
+class _FreeInverse:
+    """
+    Inverse of the covariance block of the free weights, updated in O(k^2) when a weight is
+    freed or fixed (block inversion), instead of refactorizing the k x k block.
+    Falls back to solving the full system (`ill_conditioned`) when the block is not invertible
+    or its condition number exceeds MAX_CONDITION: the Schur complement of an inverse with
+    huge entries loses the constraints (weights summing to 1, target returns) to cancellation.
+    """
+
+    # Updates between recomputations from scratch, which cancel rounding drift
+    REFRESH = 100
+    # Largest condition number (estimated) of a block inverted explicitly
+    MAX_CONDITION = 1e6
+
+    def __init__(self, p, indices):
+        self.p = p
+        self._reset(list(indices))
+
+    def _reset(self, indices):
+        self.indices = indices
+        self.updates = 0
+        self.matrix, self.ill_conditioned = np.zeros((0, 0)), False
+        if indices:
+            try:
+                factor = cho_factor(self.p[np.ix_(indices, indices)])
+                self.matrix = cho_solve(factor, np.eye(len(indices)))
+            except np.linalg.LinAlgError:
+                self.matrix, self.ill_conditioned = None, True
+            else:
+                self._check_condition()
+
+    def _check_condition(self):
+        # max(diag(A)) * max(diag(A^-1)) is between cond(A) / k^2 and cond(A)
+        block_diagonal = self.p[self.indices, self.indices]
+        if np.max(block_diagonal) * np.max(np.diag(self.matrix)) > self.MAX_CONDITION:
+            self.matrix, self.ill_conditioned = None, True
+
+    def add(self, j):
+        if self.ill_conditioned or self.updates >= self.REFRESH:
+            return self._reset(self.indices + [j])
+        b = self.p[self.indices, j]
+        u = self.matrix @ b
+        schur = self.p[j, j] - b @ u
+        if schur * self.MAX_CONDITION <= self.p[j, j]:
+            return self._reset(self.indices + [j])
+        self.matrix = np.block([
+            [self.matrix + np.outer(u, u) / schur, -u[:, None] / schur],
+            [-u[None, :] / schur, np.array([[1.0 / schur]])],
+        ])
+        self.indices = self.indices + [j]
+        self.updates += 1
+        self._check_condition()
+
+    def remove(self, j):
+        position = self.indices.index(j)
+        indices = self.indices[:position] + self.indices[position + 1:]
+        if self.ill_conditioned or self.updates >= self.REFRESH:
+            return self._reset(indices)
+        keep = np.arange(len(self.indices)) != position
+        column = self.matrix[keep, position]
+        self.matrix = self.matrix[np.ix_(keep, keep)] - np.outer(column, column) / self.matrix[position, position]
+        self.indices = indices
+        self.updates += 1
+
+
+def efficient_frontier(
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    lower=0.0,
+    upper=1.0,
+    group_bounds=None,
+    covariance_method='sample',
+    n_points=50,
+    session=None,
+):
+    """
+    Builds the efficient frontier of stored series (see `app.analytics.load_panel`).
+    The mean and covariance (`app.covariance.covariance_matrix`, repaired to PSD) are
+    computed once from the panel of periodic returns; the frontier is in the same periodicity.
+
+    Parameters:
+        levels (bool): If True, the stored values are levels and are turned into returns first.
+        lower, upper (float or Series): Weight bounds, as in FrontierOptimizer.
+        group_bounds (dict, optional): {series_group_code: (lower, upper)} bounds on the total
+                                       weight of the members of each SeriesGroup (nested
+                                       members included).
+        covariance_method (str): One of app.covariance.COVARIANCE_METHODS.
+
+    Returns:
+        tuple: (summary, weights), as FrontierOptimizer.frontier.
+    """
+    if session is None:
+        session = db.session
+    panel, _ = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    returns = simple_returns(panel) if levels else panel
+    covariance = covariance_matrix(returns, method=covariance_method, psd=True)
+
+    groups = {}
+    if group_bounds:
+        members = _group_members(list(group_bounds), session)
+        for code, (minimum, maximum) in group_bounds.items():
+            groups[code] = ([c for c in returns.columns if c in members.get(code, ())], minimum, maximum)
+    optimizer = FrontierOptimizer(returns.mean(), covariance, lower=lower, upper=upper, groups=groups)
+    return optimizer.frontier(n_points=n_points)
+
+
+def _group_members(group_codes, session):
+    """
+    Returns {series_group_code: set of TimeSeries codes} of the members of the groups,
+    nested members included.
+
+    Raises:
+        ValueError: If a code is not a SeriesGroup.
+    """
+    sg = SeriesGroup.__table__
+    ts = TimeSeries.__table__
+    found = set(session.execute(
+        select(sg.c.series_group_code).where(sg.c.series_group_code.in_(group_codes))
+    ).scalars())
+    missing = [code for code in group_codes if code not in found]
+    if missing:
+        raise ValueError("Unknown SeriesGroup codes: " + ", ".join(missing))
+
+    tree = _series_group_tree(select(sg.c.id).where(sg.c.series_group_code.in_(group_codes)))
+    rows = session.execute(
+        select(sg.c.series_group_code, ts.c.time_series_code)
+        .select_from(tree)
+        .join(sg, sg.c.id == tree.c.root_id)
+        .join(seriesgroup_seriesbase, seriesgroup_seriesbase.c.seriesgroup_id == tree.c.group_id)
+        .join(ts, ts.c.id == seriesgroup_seriesbase.c.seriesbase_id)
+    ).all()
+    members = {}
+    for group_code, code in rows:
+        members.setdefault(group_code, set()).add(code)
+    return members
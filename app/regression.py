@@ -0,0 +1,270 @@
+# app/regression.py
+
+"""
+Factor regressions of many target series (e.g. funds) on a few factor series, solved together.
+
+`factor_regression` fits y = alpha + X beta + e for every target column at once. Targets are
+grouped by their pattern of missing dates (staggered starts, gaps); each group shares the
+same rows of X, so one QR decomposition of those rows solves all of its targets. Dates where
+a factor is missing are left out for every target.
+
+`rolling_factor_regression` fits the same model over a rolling window of dates, from window
+sums of the masked cross products X'X, X'y and y'y: cumulative sums make every window step
+O(1) per target, and one batched inversion per block of targets solves every (date, target)
+system. Values are centered on per-column references first (with a constant), which keeps
+the sums small and the solutions accurate.
+
+Both return betas, t-statistics (from the usual OLS standard errors, as statsmodels), R²
+(centered with a constant, uncentered without, as statsmodels) and residual volatility
+(standard error of the regression, not annualized).
+"""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from scipy.linalg import solve_triangular
+from app import db
+from .analytics import load_panel, simple_returns
+
+RegressionResult = namedtuple(
+    'RegressionResult', ['betas', 't_stats', 'r_squared', 'residual_volatility', 'observations']
+)
+
+CONSTANT = 'const'
+
+
+def _design(factors, add_constant):
+    x = factors.to_numpy(dtype=float)
+    names = list(factors.columns)
+    if add_constant:
+        x = np.column_stack([np.ones(len(x)), x])
+        names = [CONSTANT] + names
+    return x, names
+
+
+def _aligned(targets, factors):
+    if not targets.index.equals(factors.index):
+        factors = factors.reindex(targets.index)
+    return targets, factors
+
+
+def factor_regression(targets, factors, add_constant=True, min_periods=None):
+    """
+    Regresses every column of `targets` on the columns of `factors`, over the dates where both
+    are known.
+
+    Parameters:
+        targets (DataFrame): Target values indexed by date, one column per series.
+        factors (DataFrame): Factor values, aligned on the dates of `targets`.
+        add_constant (bool): If True, add an intercept ('const').
+        min_periods (int, optional): Minimum number of observations of a target for a fit
+                                     (defaults to the number of regressors + 1).
+
+    Returns:
+        RegressionResult: betas and t_stats are DataFrames (targets x regressors); r_squared,
+                          residual_volatility and observations are Series by target. Targets
+                          with too few observations are NaN.
+    """
+    targets, factors = _aligned(targets, factors)
+    x, names = _design(factors, add_constant)
+    y = targets.to_numpy(dtype=float)
+    n_regressors = x.shape[1]
+    min_periods = n_regressors + 1 if min_periods is None else max(min_periods, n_regressors + 1)
+
+    mask = ~np.isnan(y) & ~np.isnan(x).any(axis=1)[:, None]
+    observations = mask.sum(axis=0)
+    betas = np.full((y.shape[1], n_regressors), np.nan)
+    standard_errors = np.full_like(betas, np.nan)
+    r_squared = np.full(y.shape[1], np.nan)
+    residual_volatility = np.full(y.shape[1], np.nan)
+
+    # One group per pattern of known dates
+    patterns, group = np.unique(np.packbits(mask, axis=0).T, axis=0, return_inverse=True)
+    group = group.ravel()
+    for g in range(len(patterns)):
+        columns = np.flatnonzero(group == g)
+        rows = mask[:, columns[0]]
+        n = int(rows.sum())
+        if n < min_periods:
+            continue
+        xg, yg = x[rows], y[rows][:, columns]
+        q, r = np.linalg.qr(xg)
+        diagonal = np.abs(np.diag(r))
+        if diagonal.min() <= 1e-12 * max(diagonal.max(), 1.0):
+            # Collinear regressors on these dates: minimum-norm solution
+            coefficients = np.linalg.pinv(xg) @ yg
+            inverse_diagonal = np.diag(np.linalg.pinv(xg.T @ xg))
+        else:
+            coefficients = solve_triangular(r, q.T @ yg)
+            r_inverse = solve_triangular(r, np.eye(n_regressors))
+            inverse_diagonal = (r_inverse ** 2).sum(axis=1)
+        residuals = yg - xg @ coefficients
+        ssr = (residuals ** 2).sum(axis=0)
+        sst = ((yg - yg.mean(axis=0)) ** 2).sum(axis=0) if add_constant else (yg ** 2).sum(axis=0)
+        sigma2 = ssr / (n - n_regressors)
+        betas[columns] = coefficients.T
+        standard_errors[columns] = np.sqrt(np.outer(sigma2, inverse_diagonal))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r_squared[columns] = 1.0 - ssr / sst
+        residual_volatility[columns] = np.sqrt(sigma2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stats = betas / standard_errors
+    return RegressionResult(
+        betas=pd.DataFrame(betas, index=targets.columns, columns=names),
+        t_stats=pd.DataFrame(t_stats, index=targets.columns, columns=names),
+        r_squared=pd.Series(r_squared, index=targets.columns),
+        residual_volatility=pd.Series(residual_volatility, index=targets.columns),
+        observations=pd.Series(observations, index=targets.columns),
+    )
+
+
+def rolling_factor_regression(targets, factors, window, add_constant=True, min_periods=None, block_size=64):
+    """
+    Regresses every column of `targets` on `factors` over a rolling window of `window` dates.
+
+    Parameters:
+        window (int): Number of rows (dates) in the window.
+        min_periods (int, optional): Minimum number of observations in the window for a fit
+                                     (defaults to `window`, at least the number of regressors + 1).
+        block_size (int): Number of targets processed at once (bounds temporary memory).
+
+    Returns:
+        RegressionResult: betas and t_stats are {regressor: DataFrame like `targets`};
+                          r_squared, residual_volatility and observations are DataFrames
+                          like `targets`.
+    """
+    if window < 1:
+        raise ValueError("window must be a positive integer.")
+    targets, factors = _aligned(targets, factors)
+    factor_values = factors.to_numpy(dtype=float)
+    y = targets.to_numpy(dtype=float)
+    complete = ~np.isnan(factor_values).any(axis=1)
+    if add_constant:
+        # Centering does not change the slopes; the intercept is shifted back below
+        factor_reference = factor_values[complete].mean(axis=0) if complete.any() else np.zeros(factors.shape[1])
+        with np.errstate(invalid='ignore'):
+            target_reference = np.nan_to_num(np.nanmean(np.where(complete[:, None], y, np.nan), axis=0))
+    else:
+        factor_reference = np.zeros(factors.shape[1])
+        target_reference = np.zeros(y.shape[1])
+    x, names = _design(factors - factor_reference, add_constant)
+    x = np.where(complete[:, None], x, 0.0)
+    n_dates, n_regressors = x.shape
+    min_periods = window if min_periods is None else min_periods
+    min_periods = max(min_periods, n_regressors + 1)
+
+    shape = (n_dates, y.shape[1])
+    betas = np.full(shape + (n_regressors,), np.nan)
+    standard_errors = np.full_like(betas, np.nan)
+    r_squared = np.full(shape, np.nan)
+    residual_volatility = np.full(shape, np.nan)
+    observations = np.zeros(shape)
+    outer = (x[:, :, None] * x[:, None, :]).reshape(n_dates, -1)
+
+    for first in range(0, y.shape[1], block_size):
+        block = slice(first, first + block_size)
+        known = ~np.isnan(y[:, block]) & complete[:, None]
+        yc = np.where(known, y[:, block] - target_reference[block], 0.0)
+        weights = known.astype(float)
+        # Window sums from cumulative sums: O(1) per step and target
+        sums = {
+            'n': weights,
+            'xx': weights[:, :, None] * outer[:, None, :],
+            'xy': yc[:, :, None] * x[:, None, :],
+            'yy': yc * yc,
+            'y': yc,
+        }
+        for name, values in sums.items():
+            values = np.cumsum(values, axis=0)
+            values[window:] -= values[:-window].copy()
+            sums[name] = values
+        n = sums['n']
+        valid = n >= min_periods
+        xx = sums['xx'].reshape(n.shape + (n_regressors, n_regressors))
+        # Invalid windows get an identity system, so that the batched inversion never fails on them
+        xx[~valid] = np.eye(n_regressors)
+        try:
+            inverse = np.linalg.inv(xx)
+        except np.linalg.LinAlgError:
+            inverse = np.linalg.pinv(xx)
+        coefficients = np.einsum('tnij,tnj->tni', inverse, sums['xy'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ssr = np.maximum(sums['yy'] - (coefficients * sums['xy']).sum(axis=2), 0.0)
+            sst = sums['yy'] - sums['y'] ** 2 / n if add_constant else sums['yy']
+            sigma2 = ssr / (n - n_regressors)
+            block_errors = np.sqrt(sigma2[:, :, None] * np.diagonal(inverse, axis1=2, axis2=3))
+            block_r_squared = 1.0 - ssr / sst
+            if add_constant:
+                coefficients[:, :, 0] += target_reference[block] - coefficients[:, :, 1:] @ factor_reference
+                # Standard error of the intercept at the original (uncentered) factor values
+                shift = np.concatenate([[1.0], -factor_reference])
+                block_errors[:, :, 0] = np.sqrt(sigma2 * np.einsum('i,tnij,j->tn', shift, inverse, shift))
+        coefficients[~valid] = np.nan
+        block_errors[~valid] = np.nan
+        block_r_squared[~valid] = np.nan
+        sigma2[~valid] = np.nan
+        betas[:, block] = coefficients
+        standard_errors[:, block] = block_errors
+        r_squared[:, block] = block_r_squared
+        residual_volatility[:, block] = np.sqrt(sigma2)
+        observations[:, block] = n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stats = betas / standard_errors
+
+    def frame(values):
+        return pd.DataFrame(values, index=targets.index, columns=targets.columns)
+
+    return RegressionResult(
+        betas={name: frame(betas[:, :, i]) for i, name in enumerate(names)},
+        t_stats={name: frame(t_stats[:, :, i]) for i, name in enumerate(names)},
+        r_squared=frame(r_squared),
+        residual_volatility=frame(residual_volatility),
+        observations=frame(observations.astype(int)),
+    )
+
+
+def run_factor_regression(
+    factor_codes,
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    window=None,
+    add_constant=True,
+    min_periods=None,
+    session=None,
+):
+    """
+    Regresses stored target series on stored factor series (see `app.analytics.load_panel`).
+
+    Parameters:
+        factor_codes (list of str): Codes of the factor TimeSeries.
+        codes, series_group, recursive: The target series.
+        levels (bool): If True, the stored values are levels and are turned into returns first.
+        window (int, optional): If given, rolling regressions over `window` dates.
+
+    Returns:
+        RegressionResult: As `factor_regression`, or `rolling_factor_regression` with `window`.
+    """
+    if session is None:
+        session = db.session
+    targets, _ = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    factors, _ = load_panel(codes=factor_codes, start=start, end=end, as_of=as_of, session=session)
+    if levels:
+        targets, factors = simple_returns(targets), simple_returns(factors)
+    targets = targets.drop(columns=[code for code in factor_codes if code in targets.columns])
+    index = targets.index.union(factors.index)
+    targets, factors = targets.reindex(index), factors.reindex(index)
+    if window is None:
+        return factor_regression(targets, factors, add_constant=add_constant, min_periods=min_periods)
+    return rolling_factor_regression(
+        targets, factors, window, add_constant=add_constant, min_periods=min_periods
+    )
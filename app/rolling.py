@@ -0,0 +1,198 @@
+# app/rolling.py
+
+"""
+Rolling window statistics maintained with running sums.
+
+`RollingStatistics` computes the rolling mean and volatility of every column of a
+(dates x assets) panel, and their beta and correlation to a benchmark column, from window
+sums of the values, squares and cross products. The whole history is computed in one
+vectorized pass (cumulative sums, so each window step costs O(1) per asset), and new rows
+can then be streamed with `append`, which adds the entering row and removes the leaving
+one without touching the rest of the history.
+
+Values are centered on a per-column reference before summing, which keeps the sums of
+squares small and the variances accurate; missing values (NaN) are left out of every sum,
+and beta and correlation use the dates where both the asset and the benchmark are known.
+Panels from `SeriesGroup.to_dataframe` or `app.analytics.load_panel` can be used directly.
+"""
+
+import numpy as np
+import pandas as pd
+
+ROLLING_STATISTICS = ['mean', 'volatility', 'beta', 'correlation']
+
+# Number of running sums kept per asset: count, sum and sum of squares of the values,
+# then count, sums, sums of squares and sum of cross products over the dates shared with the benchmark
+_N_SUMS = 9
+
+
+class RollingStatistics:
+    """
+    Rolling mean, volatility (sample standard deviation, not annualized), beta and correlation.
+
+    Parameters:
+        window (int): Number of rows (dates) in the window.
+        benchmark (str, optional): Column of the panel used for beta and correlation.
+                                   Without it, only the mean and the volatility are computed.
+        min_periods (int, optional): Minimum number of observations in the window for a value
+                                     (defaults to `window`).
+    """
+
+    def __init__(self, window, benchmark=None, min_periods=None):
+        if window < 1:
+            raise ValueError("window must be a positive integer.")
+        self.window = window
+        self.benchmark = benchmark
+        self.min_periods = window if min_periods is None else min_periods
+        self.columns = None
+        self.last_date = None
+        self._reference = None
+        self._benchmark_reference = 0.0
+        self._buffer = None
+        self._benchmark_buffer = None
+        self._position = 0
+        self._rows = 0
+        self._sums = None
+
+    def compute(self, panel, block_size=256):
+        """
+        Computes the statistics over the whole `panel` and keeps the last window for `append`.
+
+        Parameters:
+            panel (DataFrame): Values indexed by date (ascending), one column per asset.
+            block_size (int): Number of columns processed at once (bounds temporary memory).
+
+        Returns:
+            dict: {statistic: DataFrame like `panel`} for the ROLLING_STATISTICS computed.
+        """
+        self._start(panel)
+        x, y = self._values(panel)
+
+        statistics = {}
+        for first in range(0, x.shape[1], block_size):
+            block = slice(first, first + block_size)
+            # Window sums from cumulative sums: O(1) per step and asset
+            sums = np.cumsum(self._contributions(x[:, block], y, block), axis=1)
+            sums[:, self.window:] -= sums[:, :-self.window].copy()
+            if len(x):
+                self._sums[:, block] = sums[:, -1]
+            for name, values in self._statistics(sums, block).items():
+                statistics.setdefault(name, np.empty(x.shape))[:, block] = values
+
+        kept = min(len(x), self.window)
+        self._buffer[:kept] = x[len(x) - kept:]
+        self._benchmark_buffer[:kept] = y[len(y) - kept:]
+        self._position = kept % self.window
+        self._rows = len(x)
+        if len(panel):
+            self.last_date = panel.index[-1]
+        return self._frames(statistics, panel.index)
+
+    def append(self, rows):
+        """
+        Adds new rows (dates after the last one seen) and returns their statistics.
+        Every step removes the row leaving the window and adds the entering one; the sums
+        are recomputed from the window once every `window` steps to cancel rounding drift.
+
+        Parameters:
+            rows (DataFrame): New values indexed by date, with the columns of the panel.
+
+        Returns:
+            dict: {statistic: DataFrame like `rows`}.
+        """
+        if self.columns is None:
+            self._start(rows)
+        else:
+            rows = rows.reindex(columns=self.columns)
+        if self.last_date is not None and len(rows) and rows.index[0] <= self.last_date:
+            raise ValueError("Appended rows must come after the last date already seen.")
+
+        x, y = self._values(rows)
+        results = np.empty((_N_SUMS, len(x), len(self.columns)))
+        for i in range(len(x)):
+            if self._rows >= self.window:
+                leaving = slice(self._position, self._position + 1)
+                self._sums -= self._contributions(self._buffer[leaving], self._benchmark_buffer[leaving])[:, 0]
+            self._buffer[self._position] = x[i]
+            self._benchmark_buffer[self._position] = y[i]
+            self._position = (self._position + 1) % self.window
+            self._rows += 1
+            if self._position == 0:
+                kept = min(self._rows, self.window)
+                window = slice(0, kept)
+                self._sums = self._contributions(self._buffer[window], self._benchmark_buffer[window]).sum(axis=1)
+            else:
+                self._sums += self._contributions(x[i][None], y[i:i + 1])[:, 0]
+            results[:, i] = self._sums
+        if len(rows):
+            self.last_date = rows.index[-1]
+        return self._frames(self._statistics(results), rows.index)
+
+    def _start(self, panel):
+        self.columns = panel.columns
+        # Column means as references; the benchmark's own reference is a scalar
+        values = panel.to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            reference = np.nanmean(values, axis=0) if len(values) else np.zeros(values.shape[1])
+        self._reference = np.nan_to_num(reference)
+        if self.benchmark is not None:
+            if self.benchmark not in panel.columns:
+                raise ValueError(f"Benchmark column {self.benchmark!r} is not in the panel.")
+            self._benchmark_reference = self._reference[panel.columns.get_loc(self.benchmark)]
+        self._buffer = np.full((self.window, len(panel.columns)), np.nan)
+        self._benchmark_buffer = np.full(self.window, np.nan)
+        self._position = 0
+        self._rows = 0
+        self._sums = np.zeros((_N_SUMS, len(panel.columns)))
+        self.last_date = None
+
+    def _values(self, panel):
+        x = panel.to_numpy(dtype=float)
+        if self.benchmark is None:
+            y = np.full(len(x), np.nan)
+        else:
+            y = panel[self.benchmark].to_numpy(dtype=float)
+        return x, y
+
+    def _contributions(self, x, y, columns=slice(None)):
+        """
+        Per-row contributions to the running sums, as a (_N_SUMS x rows x assets) array,
+        for the assets `columns` of the panel.
+        """
+        known = ~np.isnan(x)
+        xc = np.where(known, x - self._reference[columns], 0.0)
+        pair = known & ~np.isnan(y)[:, None]
+        yc = np.where(pair, (y - self._benchmark_reference)[:, None], 0.0)
+        xp = np.where(pair, xc, 0.0)
+        return np.stack([known, xc, xc * xc, pair, xp, yc, xp * xp, yc * yc, xp * yc]).astype(float)
+
+    def _statistics(self, sums, columns=slice(None)):
+        """
+        Statistics arrays from window sums of the assets `columns`.
+        """
+        n, sx, sxx, n_pair, px, py, pxx, pyy, pxy = sums
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = sx / n + self._reference[columns]
+            volatility = np.sqrt(np.maximum(sxx - sx * sx / n, 0.0) / (n - 1))
+            covariance = (pxy - px * py / n_pair) / (n_pair - 1)
+            variance_x = np.maximum(pxx - px * px / n_pair, 0.0) / (n_pair - 1)
+            variance_y = np.maximum(pyy - py * py / n_pair, 0.0) / (n_pair - 1)
+            beta = covariance / variance_y
+            correlation = covariance / np.sqrt(variance_x * variance_y)
+
+        too_few = n < max(self.min_periods, 1)
+        mean[too_few] = np.nan
+        volatility[too_few | (n < 2)] = np.nan
+        statistics = {'mean': mean, 'volatility': volatility}
+        if self.benchmark is not None:
+            too_few_pairs = (n_pair < max(self.min_periods, 2))
+            beta[too_few_pairs] = np.nan
+            correlation[too_few_pairs] = np.nan
+            statistics.update(beta=beta, correlation=correlation)
+        return statistics
+
+    def _frames(self, statistics, index):
+        return {
+            name: pd.DataFrame(values, index=index, columns=self.columns)
+            for name, values in statistics.items()
+        }
@@ -0,0 +1,229 @@
+# app/search_cache.py
+
+"""
+Memoization of catalog searches.
+
+Results are kept in an LRU cache bounded by number of entries and age (TTL), keyed on the
+normalized search arguments. Every entry records the catalog version it was computed at;
+the version is bumped by the flush events of this module whenever SeriesBase rows or their
+keywords change, which invalidates every entry at once.
+
+The version is local to the process: writes made by other processes (or by bulk statements
+that bypass the ORM) only show up once entries expire, unless `catalog_version.bump()` or
+`search_cache.clear()` is called.
+
+`data_point_changes` is the counterpart for stored data points, recorded by the flush events of
+this module when points are updated or deleted: caches of computations over data points (see
+`app.covariance` and `app.correlation_store`) check it, together with `max_data_point_id`
+for new points, instead of aggregating over the points.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+from .models import DataPoint, get_catalog_changes, _flushed_series_ids
+
+
+class CatalogVersion:
+    """
+    Counter bumped on every change of the searchable catalog.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            return self.value
+
+
+catalog_version = CatalogVersion()
+
+
+class DataPointChanges:
+    """
+    Generation counter of the updates and deletions of stored data points, with the last
+    generation at which the points of every series changed. New points need no record:
+    caches find them above their id watermark (`max_data_point_id`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = 0
+        self._series = {}
+
+    def record(self, series_ids):
+        with self._lock:
+            self.generation += 1
+            for series_id in series_ids:
+                self._series[series_id] = self.generation
+            return self.generation
+
+    def changed_since(self, generation, series_ids):
+        """
+        Returns True if the points of one of `series_ids` changed after `generation`.
+        """
+        with self._lock:
+            return any(self._series.get(series_id, 0) > generation for series_id in series_ids)
+
+    def last_change(self, series_ids):
+        """
+        Returns the last generation at which the points of one of `series_ids` changed (0 if never).
+        """
+        with self._lock:
+            return max((self._series.get(series_id, 0) for series_id in series_ids), default=0)
+
+
+data_point_changes = DataPointChanges()
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'version', 'created'])
+
+
+class SearchCache:
+    """
+    LRU cache of search results, bounded by `max_entries` and `ttl` (seconds), invalidated
+    by `version` (a CatalogVersion; `catalog_version` by default). Caches whose keys already
+    identify the data they depend on pass `version=None`, so that catalog changes do not evict
+    them. Keeps hit/miss counts and latencies for tuning (see `stats`).
+    With `copy_values=False`, cached values are returned as is and callers must not modify them.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0, copy_values=True, version=catalog_version):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.copy_values = copy_values
+        self.version = version
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.reset_stats()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._hit_seconds = 0.0
+            self._miss_seconds = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns a copy of the cached result of `key`, or computes, stores and returns it.
+        """
+        start = time.perf_counter()
+        version = self.version.value if self.version is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.version == version and time.monotonic() - entry.created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    value = _copy(entry.value) if self.copy_values else entry.value
+                    self._hits += 1
+                    self._hit_seconds += time.perf_counter() - start
+                    return value
+                del self._entries[key]
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                _copy(value) if self.copy_values else value, version, time.monotonic()
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+            self._misses += 1
+            self._miss_seconds += time.perf_counter() - start
+        return value
+
+    def stats(self):
+        """
+        Returns a dict with the number of entries, hits, misses, evictions, the hit rate
+        and the mean latency in milliseconds of hits and misses.
+        """
+        with self._lock:
+            calls = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / calls if calls else 0.0,
+                'mean_hit_ms': 1000 * self._hit_seconds / self._hits if self._hits else 0.0,
+                'mean_miss_ms': 1000 * self._miss_seconds / self._misses if self._misses else 0.0,
+            }
+
+
+def _copy(value):
+    # Callers may modify the returned DataFrame; the cached one must stay intact
+    return value.copy() if value is not None else None
+
+
+search_cache = SearchCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_catalog_version(session, flush_context):
+    changed_ids, deleted_ids = get_catalog_changes(session)
+    if changed_ids or deleted_ids:
+        catalog_version.bump()
+        session.info['catalog_version_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _bump_catalog_version_at_end(session):
+    # Results computed between the flush and the end of the transaction saw uncommitted rows
+    if session.info.pop('catalog_version_dirty', False):
+        catalog_version.bump()
+
+
+def max_data_point_id(session):
+    """
+    Largest stored data point id (0 if none).
+    """
+    return session.execute(select(func.max(DataPoint.__table__.c.id))).scalar() or 0
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_data_point_changes(session, flush_context, instances):
+    # Series of the points updated or deleted as stored, before a point moves to another series
+    point_ids = [
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, DataPoint) and obj.id is not None
+    ]
+    if point_ids:
+        dp = DataPoint.__table__
+        session.info.setdefault('data_point_changes', set()).update(session.connection().execute(
+            select(dp.c.time_series_id).where(dp.c.id.in_(point_ids)).distinct()
+        ).scalars())
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_data_point_changes(session, flush_context):
+    # ... and after the flush, when moved points have their new series
+    series_ids = _flushed_series_ids([obj for obj in session.dirty if isinstance(obj, DataPoint)])
+    if series_ids or session.info.get('data_point_changes'):
+        series_ids |= session.info.setdefault('data_point_changes', set())
+        session.info['data_point_changes'] = series_ids
+        data_point_changes.record(series_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _record_data_point_changes_at_end(session):
+    # Caches refreshed between the flush and the end of the transaction saw uncommitted rows
+    series_ids = session.info.pop('data_point_changes', None)
+    if series_ids:
+        data_point_changes.record(series_ids)
@@ -0,0 +1,510 @@
+# app/search_index.py
+
+"""
+In-process search index over the SeriesBase catalog, for interactive search boxes
+that should not hit the database.
+
+The index is built from one bulk scan of the catalog (names, codes, descriptions and
+keywords) and holds an inverted index from terms to series plus a prefix trie over
+the terms. It is kept current from the mapper events of SeriesBase (TimeSeries and
+SeriesGroup) and Keyword: changed rows are re-read inside the flush and applied to
+the index when the transaction commits, so rolled back changes never reach it. Every
+database has its own index (`get_catalog_index`).
+"""
+
+import re
+import threading
+from collections import defaultdict, namedtuple
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session, object_session
+from app import db
+from .models import SeriesBase, TimeSeries, SeriesGroup, Keyword, seriesbase_keyword
+from .fulltext import keywords_aggregate
+
+INDEX_FIELDS = ['name', 'code', 'keyword']
+FUZZY_FIELDS = ['name', 'code']
+FUZZY_MAX_DISTANCE = 2
+KEYWORD_SEPARATOR = '\x1f'
+
+CatalogEntry = namedtuple('CatalogEntry', ['id', 'type', 'name', 'code', 'description', 'keywords'])
+
+
+def _terms(value):
+    """
+    Returns the lowercase terms of a field value: the whole value and its alphanumeric words.
+    """
+    value = value.lower()
+    return {value, *re.findall(r'[0-9a-z]+', value)}
+
+
+def load_catalog_entries(connection, series_ids=None):
+    """
+    Reads catalog entries (optionally only `series_ids`) with a single query.
+    """
+    sb = SeriesBase.__table__
+    ts = TimeSeries.__table__
+    sg = SeriesGroup.__table__
+    stmt = (
+        select(
+            sb.c.id,
+            sb.c.type,
+            sb.c.name,
+            func.coalesce(ts.c.time_series_code, sg.c.series_group_code),
+            sb.c.description,
+            keywords_aggregate(connection.dialect.name, sb.c.id, separator=KEYWORD_SEPARATOR),
+        )
+        .select_from(sb)
+        .outerjoin(ts, ts.c.id == sb.c.id)
+        .outerjoin(sg, sg.c.id == sb.c.id)
+    )
+    if series_ids is not None:
+        stmt = stmt.where(sb.c.id.in_(list(series_ids)))
+    return [
+        CatalogEntry(
+            series_id, series_type, name, code, description,
+            tuple(keywords.split(KEYWORD_SEPARATOR)) if keywords else ()
+        )
+        for series_id, series_type, name, code, description, keywords in connection.execute(stmt)
+    ]
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Levenshtein distance between two strings (insertions, deletions and substitutions).
+    With `max_distance`, stops early and returns `max_distance + 1` once it is exceeded.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _deletion_variants(term, max_deletions):
+    """
+    Returns the strings obtained from `term` by deleting up to `max_deletions` characters.
+    """
+    variants = {term}
+    level = {term}
+    for _ in range(max_deletions):
+        level = {value[:i] + value[i + 1:] for value in level for i in range(len(value))}
+        variants |= level
+    return variants
+
+
+class FuzzyIndex:
+    """
+    Index of terms for edit-distance lookups up to `max_distance`, each term holding a set of ids.
+
+    Every term is cut into `max_distance + 1` segments. A term within d <= max_distance edits
+    of a query keeps at least one segment intact (pigeonhole), found in the query at most d
+    positions away from its place in the term. Lookups therefore probe a few (length, segment
+    number, segment) keys and only compute the distance to the candidates they return.
+
+    Segments of short terms are a character or two long and would match most of the index,
+    so terms of up to `2 * (max_distance + 1)` characters are indexed by their deletion
+    neighbourhood instead: two strings within d edits share a string obtained from each by
+    at most d deletions.
+    """
+
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self.short_length = 2 * (max_distance + 1)
+        self._ids = {}
+        self._segments = defaultdict(set)
+
+    def _bounds(self, length):
+        parts = self.max_distance + 1
+        return [(i * length // parts, (i + 1) * length // parts) for i in range(parts)]
+
+    def _keys(self, term):
+        if len(term) <= self.short_length:
+            return list(_deletion_variants(term, self.max_distance))
+        return [(len(term), i, term[start:end]) for i, (start, end) in enumerate(self._bounds(len(term)))]
+
+    def add(self, term, item_id):
+        ids = self._ids.get(term)
+        if ids is None:
+            ids = self._ids[term] = set()
+            for key in self._keys(term):
+                self._segments[key].add(term)
+        ids.add(item_id)
+
+    def discard(self, term, item_id):
+        ids = self._ids.get(term)
+        if ids is None:
+            return
+        ids.discard(item_id)
+        if not ids:
+            del self._ids[term]
+            for key in self._keys(term):
+                terms = self._segments[key]
+                terms.discard(term)
+                if not terms:
+                    del self._segments[key]
+
+    def find(self, term, max_distance):
+        """
+        Returns {id: distance} of the ids whose term is within `max_distance` of `term`.
+        """
+        if max_distance > self.max_distance:
+            raise ValueError(f"max_distance must be {self.max_distance} or less.")
+        n = len(term)
+        candidates = set()
+        if n - max_distance <= self.short_length:
+            for variant in _deletion_variants(term, max_distance):
+                terms = self._segments.get(variant)
+                if terms:
+                    candidates |= terms
+        for length in range(max(self.short_length + 1, n - max_distance), n + max_distance + 1):
+            for i, (start, end) in enumerate(self._bounds(length)):
+                size = end - start
+                for offset in range(max(0, start - max_distance), min(n - size, start + max_distance) + 1):
+                    terms = self._segments.get((length, i, term[offset:offset + size]))
+                    if terms:
+                        candidates |= terms
+        found = {}
+        for candidate in candidates:
+            distance = edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                for item_id in self._ids[candidate]:
+                    if distance < found.get(item_id, max_distance + 1):
+                        found[item_id] = distance
+        return found
+
+
+class CatalogIndex:
+    """
+    Inverted index (term -> field -> series ids) with a prefix trie over the terms.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """
+        Drops every entry; the index has to be built again before use.
+        """
+        with self._lock:
+            self._entries = {}
+            self._postings = {}
+            self._exact = defaultdict(set)
+            self._trie = {}
+            self._fuzzy = {field: FuzzyIndex(FUZZY_MAX_DISTANCE) for field in FUZZY_FIELDS}
+            self.is_built = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, session=None):
+        """
+        (Re)builds the index from one bulk scan of the catalog.
+        """
+        if session is None:
+            session = db.session
+        entries = load_catalog_entries(session.connection())
+        with self._lock:
+            self.clear()
+            for entry in entries:
+                self._add(entry)
+            self.is_built = True
+
+    def ensure_built(self, session=None):
+        if not self.is_built:
+            self.build(session=session)
+
+    def apply(self, updates):
+        """
+        Applies {series_id: CatalogEntry or None (deleted)} to the index.
+        """
+        with self._lock:
+            for series_id, entry in updates.items():
+                self._remove(series_id)
+                if entry is not None:
+                    self._add(entry)
+
+    def _field_values(self, entry):
+        yield 'name', entry.name
+        yield 'code', entry.code
+        for keyword in entry.keywords:
+            yield 'keyword', keyword
+
+    def _add(self, entry):
+        self._entries[entry.id] = entry
+        for field, value in self._field_values(entry):
+            if not value:
+                continue
+            self._exact[(field, value)].add(entry.id)
+            if field in self._fuzzy:
+                self._fuzzy[field].add(value.lower(), entry.id)
+            for term in _terms(value):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = defaultdict(set)
+                    self._trie_insert(term)
+                postings[field].add(entry.id)
+
+    def _remove(self, series_id):
+        entry = self._entries.pop(series_id, None)
+        if entry is None:
+            return
+        for field, value in self._field_values(entry):
+            if not value:
+                continue
+            exact = self._exact.get((field, value))
+            if exact is not None:
+                exact.discard(series_id)
+                if not exact:
+                    del self._exact[(field, value)]
+            if field in self._fuzzy:
+                self._fuzzy[field].discard(value.lower(), series_id)
+            for term in _terms(value):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings[field].discard(series_id)
+                if not postings[field]:
+                    del postings[field]
+                if not postings:
+                    del self._postings[term]
+                    self._trie_remove(term)
+
+    def _trie_insert(self, term):
+        node = self._trie
+        for char in term:
+            node = node.setdefault(char, {})
+        # '' cannot be a character, so it marks the end of a term
+        node[''] = term
+
+    def _trie_remove(self, term):
+        path = [self._trie]
+        for char in term:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop('', None)
+        # Prune the nodes left without terms below them
+        for depth in range(len(term), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][term[depth - 1]]
+
+    def _prefix_terms(self, prefix):
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        terms = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    terms.append(child)
+                else:
+                    stack.append(child)
+        return terms
+
+    def match(self, token, field, partial=True):
+        """
+        Returns the ids of the series whose `field` matches `token`: a case-insensitive
+        prefix of the value or of one of its words if `partial`, else the whole value.
+        """
+        with self._lock:
+            if not partial:
+                return set(self._exact.get((field, token), ()))
+            ids = set()
+            for term in self._prefix_terms(token.lower()):
+                ids |= self._postings[term].get(field, set())
+            return ids
+
+    def search(
+        self,
+        tokens,
+        search_by_name=True,
+        search_by_code=True,
+        search_by_keyword=True,
+        partial=True,
+        search_time_series=True,
+        search_series_group=True,
+        limit=None,
+        token_operator='or',
+        after=None,
+    ):
+        """
+        Returns the (CatalogEntry, score) pairs matching `tokens`, best first, with the
+        scoring of `SeriesSearcher.search`: one point per (token, field) matched.
+        Partial matches are prefix matches on the value or its words (not arbitrary substrings).
+        `after` = (score, id) keeps only the matches ranked after that one.
+        """
+        fields = [
+            field for field, enabled in zip(INDEX_FIELDS, (search_by_name, search_by_code, search_by_keyword))
+            if enabled
+        ]
+        types = set()
+        if search_time_series:
+            types.add('time_series')
+        if search_series_group:
+            types.add('series_group')
+
+        scores = defaultdict(int)
+        token_ids = []
+        for token in tokens:
+            matched = set()
+            for field in fields:
+                ids = self.match(token, field, partial=partial)
+                for series_id in ids:
+                    scores[series_id] += 1
+                matched |= ids
+            token_ids.append(matched)
+
+        if token_operator == 'and':
+            ids = set.intersection(*token_ids) if token_ids else set()
+        else:
+            ids = set().union(*token_ids)
+
+        with self._lock:
+            entries = [self._entries[i] for i in ids if i in self._entries and self._entries[i].type in types]
+        if after is not None:
+            after_key = (-after[0], after[1])
+            entries = [entry for entry in entries if (-scores[entry.id], entry.id) > after_key]
+        entries.sort(key=lambda entry: (-scores[entry.id], entry.id))
+        if limit is not None:
+            entries = entries[:limit]
+        return [(entry, scores[entry.id]) for entry in entries]
+
+    def fuzzy_search(
+        self,
+        search_text,
+        search_by_name=True,
+        search_by_code=True,
+        search_time_series=True,
+        search_series_group=True,
+        max_distance=2,
+        limit=None,
+        after=None,
+    ):
+        """
+        Returns the (CatalogEntry, distance) pairs whose code and/or name is within
+        `max_distance` edits of `search_text` (case-insensitive), closest first, then by id.
+        `after` = (distance, id) keeps only the matches ranked after that one.
+        """
+        term = search_text.strip().lower()
+        fields = [
+            field for field, enabled in zip(FUZZY_FIELDS, (search_by_name, search_by_code)) if enabled
+        ]
+        types = set()
+        if search_time_series:
+            types.add('time_series')
+        if search_series_group:
+            types.add('series_group')
+
+        distances = {}
+        with self._lock:
+            for field in fields:
+                for series_id, distance in self._fuzzy[field].find(term, max_distance).items():
+                    if distance < distances.get(series_id, max_distance + 1):
+                        distances[series_id] = distance
+            entries = [
+                self._entries[i] for i in distances if i in self._entries and self._entries[i].type in types
+            ]
+        if after is not None:
+            entries = [entry for entry in entries if (distances[entry.id], entry.id) > tuple(after)]
+        entries.sort(key=lambda entry: (distances[entry.id], entry.id))
+        if limit is not None:
+            entries = entries[:limit]
+        return [(entry, distances[entry.id]) for entry in entries]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_catalog_index(session=None):
+    """
+    Returns the CatalogIndex of the database of `session`, created (not built) on first use
+    and shared afterwards: one per database, as the search cache keys and the correlation stores.
+
+    Parameters:
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    key = str(session.get_bind().url)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = CatalogIndex()
+        return _indexes[key]
+
+
+def clear_catalog_indexes():
+    """
+    Forgets every CatalogIndex.
+    """
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def _pending_series_ids(session):
+    return session.info.setdefault('catalog_index_pending', set())
+
+
+@event.listens_for(SeriesBase, 'after_insert', propagate=True)
+@event.listens_for(SeriesBase, 'after_update', propagate=True)
+@event.listens_for(SeriesBase, 'after_delete', propagate=True)
+def _mark_series_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and get_catalog_index(session).is_built:
+        _pending_series_ids(session).add(target.id)
+
+
+@event.listens_for(Keyword, 'after_update')
+@event.listens_for(Keyword, 'before_delete')
+def _mark_keyword_series_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and get_catalog_index(session).is_built:
+        _pending_series_ids(session).update(connection.execute(
+            select(seriesbase_keyword.c.seriesbase_id)
+            .where(seriesbase_keyword.c.keyword_id == target.id)
+        ).scalars().all())
+
+
+@event.listens_for(Session, 'after_flush')
+def _load_pending_entries(session, flush_context):
+    series_ids = session.info.pop('catalog_index_pending', None)
+    if not series_ids:
+        return
+    updates = dict.fromkeys(series_ids)
+    for entry in load_catalog_entries(session.connection(), series_ids):
+        updates[entry.id] = entry
+    session.info.setdefault('catalog_index_updates', {}).update(updates)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_entries(session):
+    updates = session.info.pop('catalog_index_updates', None)
+    if updates:
+        index = get_catalog_index(session)
+        if index.is_built:
+            index.apply(updates)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_entries(session):
+    session.info.pop('catalog_index_pending', None)
+    session.info.pop('catalog_index_updates', None)
@@ -1,10 +1,22 @@
 # app/series.py
 
+import operator
+import datetime
+from functools import reduce
 import pandas as pd
-from sqlalchemy import or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import or_, and_, case, select, func, literal, union_all, type_coerce, true, false, Date
 from app import db
-from .models import TimeSeries, SeriesGroup, Keyword
+from .models import (
+    SeriesBase, TimeSeries, SeriesGroup, TimeSeriesType, Keyword, DataPoint, SeriesGroupStats,
+    seriesbase_keyword, seriesgroup_seriesbase, _series_group_tree
+)
+from .fulltext import full_text_matches, keywords_aggregate, trigram_candidates
+from .search_index import get_catalog_index
+from .search_cache import search_cache
+from .filter_expressions import parse_filter_expression
+
+SERIES_TYPE_LABELS = {'time_series': 'TimeSeries', 'series_group': 'SeriesGroup'}
+FACETS = ['type', 'time_frequency', 'delta_type', 'time_series_type', 'keyword']
 
 class SeriesSearcher:
     """
@@ -25,10 +37,19 @@ class SeriesSearcher:
         session=None,
         limit_rows: int = 100,
         print_findings: bool = False,
+        full_text: bool = False,
+        token_operator: str = 'or',
+        use_index: bool = False,
+        after: tuple = None,
+        use_cache: bool = False,
+        fuzzy: bool = False,
+        max_distance: int = 2,
     ) -> pd.DataFrame:
         """
         Searches TimeSeries and/or SeriesGroup based on a single search string. 
         The user can choose to apply that search string to name, code, and/or keyword fields.
+        Whitespace separates tokens; all tokens, fields and types are matched by a single
+        SQL statement, ranked by score and limited in the database.
         
         Parameters
         ----------
@@ -49,162 +70,651 @@ class SeriesSearcher:
             Whether to include SeriesGroup in the search.
         session : Session, optional
             Existing SQLAlchemy session. If None, uses db.session.
+        full_text : bool, default False
+            If True, answers from the full-text index (see `app.fulltext`), ordered by
+            relevance. Tokens match whole words, or word prefixes when `partial` is True,
+            and the name flag also covers the description.
+        token_operator : {'or', 'and'}, default 'or'
+            Whether a record must match any ('or') or every ('and') token.
+        use_index : bool, default False
+            If True, answers from the in-memory catalog index (see `app.search_index`),
+            built on first use. Partial matches are then prefixes of the value or of
+            its words rather than arbitrary substrings.
+        after : tuple of (score, id), optional
+            Keyset cursor: only returns the records ranked after the record with this
+            score and id, i.e. the next page after a page whose last row it is.
+        use_cache : bool, default False
+            If True, answers from the search cache (see `app.search_cache`) when the same
+            normalized arguments were searched since the last catalog change.
+        fuzzy : bool, default False
+            If True, typo-tolerant lookup: the whole `search_text` is compared, case-insensitively,
+            with codes and/or names in the in-memory catalog index (see `app.search_index`),
+            keeping those within `max_distance` edits, closest first.
+        max_distance : int, default 2
+            Maximum edit distance of fuzzy matches.
 
         Returns
         -------
         pandas.DataFrame
-            A DataFrame containing matched records, with columns:
-            ["type", "id", "name", "code", "description", "keywords"].
-        """
-        # check if space is present in the search_text
-        if ' ' in search_text:
-            search_texts = search_text.split(' ')
-            all_dfs = []
-            for spec_search_text in search_texts:
-                df = cls.search(
-                    search_text=spec_search_text,
-                    search_by_name=search_by_name,
-                    search_by_code=search_by_code,
-                    search_by_keyword=search_by_keyword,
-                    partial=partial,
-                    search_time_series=search_time_series,
-                    search_series_group=search_series_group,
-                    session=session,
-                    limit_rows=limit_rows,
-                    print_findings=print_findings,
-                )
-                if isinstance(df, pd.DataFrame):
-                    all_dfs.append(df)
-            if len(all_dfs) > 0:
-                df = pd.concat(all_dfs)
-                df = df.drop_duplicates(['id'])
-                return cls.limit_rows_of_df(df, limit_rows)
-            else:
-                return None
-        
+            A DataFrame containing matched records, best first, with columns:
+            ["type", "id", "name", "code", "description", "keywords", "score"].
+            The score is the number of (token, field) pairs matched; with `full_text`
+            it is the relevance of the full-text index instead, and with `fuzzy` minus the
+            edit distance. None if nothing matches.
+        """
+        if full_text and (use_index or fuzzy):
+            raise ValueError("full_text cannot be combined with use_index or fuzzy.")
+        if max_distance < 0:
+            raise ValueError("max_distance must be non-negative.")
+        if after is not None and len(after) != 2:
+            raise ValueError("after must be a (score, id) pair.")
+
+        if use_cache:
+            if session is None:
+                session = db.session
+            key = (
+                str(session.get_bind().url),
+                tuple(search_text.split()) if search_text else (),
+                search_by_name, search_by_code, search_by_keyword, partial,
+                search_time_series, search_series_group,
+                cls._limit_value(limit_rows), full_text, token_operator, use_index,
+                None if after is None else (float(after[0]), int(after[1])),
+                fuzzy, max_distance,
+            )
+            return search_cache.get_or_compute(key, lambda: cls.search(
+                search_text,
+                search_by_name=search_by_name,
+                search_by_code=search_by_code,
+                search_by_keyword=search_by_keyword,
+                partial=partial,
+                search_time_series=search_time_series,
+                search_series_group=search_series_group,
+                session=session,
+                limit_rows=limit_rows,
+                print_findings=print_findings,
+                full_text=full_text,
+                token_operator=token_operator,
+                use_index=use_index,
+                after=after,
+                fuzzy=fuzzy,
+                max_distance=max_distance,
+            ))
+
+        if token_operator not in ('or', 'and'):
+            raise ValueError("token_operator must be one of 'or', 'and'.")
+
+        if full_text:
+            return cls._full_text_search(
+                search_text=search_text,
+                search_by_name=search_by_name,
+                search_by_code=search_by_code,
+                search_by_keyword=search_by_keyword,
+                partial=partial,
+                search_time_series=search_time_series,
+                search_series_group=search_series_group,
+                session=session,
+                limit_rows=limit_rows,
+                after=after,
+                token_operator=token_operator,
+            )
+
         if session is None:
             session = db.session
 
         # Normalize search_text just in case:
-        if not search_text:
+        tokens = search_text.split() if search_text else []
+        if not tokens:
             # If there's no text, just return empty results
-            return pd.DataFrame(columns=["type", "id", "name", "code", "description", "keywords"])
+            return pd.DataFrame(columns=["type", "id", "name", "code", "description", "keywords", "score"])
+
+        if fuzzy or use_index:
+            catalog_index = get_catalog_index(session)
+            catalog_index.ensure_built(session=session)
+
+        if fuzzy:
+            matches = catalog_index.fuzzy_search(
+                search_text,
+                search_by_name=search_by_name,
+                search_by_code=search_by_code,
+                search_time_series=search_time_series,
+                search_series_group=search_series_group,
+                max_distance=max_distance,
+                limit=cls._limit_value(limit_rows),
+                after=None if after is None else (-after[0], after[1]),
+            )
+            return cls._index_dataframe([(entry, -distance) for entry, distance in matches])
+
+        if use_index:
+            matches = catalog_index.search(
+                tokens,
+                search_by_name=search_by_name,
+                search_by_code=search_by_code,
+                search_by_keyword=search_by_keyword,
+                partial=partial,
+                search_time_series=search_time_series,
+                search_series_group=search_series_group,
+                limit=cls._limit_value(limit_rows),
+                token_operator=token_operator,
+                after=after,
+            )
+            return cls._index_dataframe(matches)
+
+        types = []
+        if search_time_series:
+            types.append("time_series")
+        if search_series_group:
+            types.append("series_group")
+
+        match_and_score = cls._match_and_score(
+            tokens, search_by_name, search_by_code, search_by_keyword, partial, token_operator, session
+        )
+        if match_and_score is None or not types:
+            return None
+        match, score = match_and_score
+        if after is not None:
+            match = and_(match, cls._keyset_condition(score, SeriesBase.__table__.c.id, after))
+
+        # A single statement for every token, field and type, ranked and limited in SQL.
+        # Only the output columns are selected (no entity hydration), keywords are
+        # aggregated by the database.
+        sb = SeriesBase.__table__
+        ts = TimeSeries.__table__
+        sg = SeriesGroup.__table__
+        stmt = (
+            select(
+                sb.c.type,
+                sb.c.id,
+                sb.c.name,
+                func.coalesce(ts.c.time_series_code, sg.c.series_group_code),
+                sb.c.description,
+                keywords_aggregate(session.connection().dialect.name, sb.c.id),
+                score.label("score"),
+            )
+            .select_from(sb)
+            .outerjoin(ts, ts.c.id == sb.c.id)
+            .outerjoin(sg, sg.c.id == sb.c.id)
+            .where(sb.c.type.in_(types))
+            .where(match)
+            .order_by(score.desc(), sb.c.id)
+        )
+        limit = cls._limit_value(limit_rows)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        df = cls._results_dataframe(session.execute(stmt).all())
+
+        # Debug: Print matched series
+        if print_findings:
+            print(f"Matched series ({0 if df is None else len(df)}):")
+            for row in ([] if df is None else df.itertuples(index=False)):
+                print(
+                    f" - ID: {row.id}, Type: {row.type}, Name: {row.name}, "
+                    + f"Code: {row.code}, Score: {row.score}, Keywords: {row.keywords}"
+                )
+
+        return df
+
+    @classmethod
+    def facets(
+        cls,
+        search_text: str = None,
+        search_by_name: bool = True,
+        search_by_code: bool = True,
+        search_by_keyword: bool = True,
+        partial: bool = True,
+        search_time_series: bool = True,
+        search_series_group: bool = True,
+        token_operator: str = 'or',
+        top_keywords: int = 10,
+        session=None,
+    ) -> pd.DataFrame:
+        """
+        Counts the records matched by `search` (same filter arguments) by type, time_frequency,
+        delta_type, TimeSeriesType name and keyword, with a single grouped SQL statement.
+        Without `search_text`, counts the whole catalog (of the selected types).
+
+        Parameters
+        ----------
+        search_text : str, optional
+            The text to match, as in `search`.
+        search_by_name, search_by_code, search_by_keyword, partial, search_time_series,
+        search_series_group, token_operator
+            As in `search`.
+        top_keywords : int, default 10
+            Number of keywords to count (the most frequent ones).
+        session : Session, optional
+            Existing SQLAlchemy session. If None, uses db.session.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Columns ["facet", "value", "count"], facets in the order "type", "time_frequency",
+            "delta_type", "time_series_type", "keyword", most frequent values first.
+            The value is None for records without one (e.g. SeriesGroup rows in "delta_type").
+        """
+        if token_operator not in ('or', 'and'):
+            raise ValueError("token_operator must be one of 'or', 'and'.")
+        if session is None:
+            session = db.session
+
+        columns = ["facet", "value", "count"]
+        types = []
+        if search_time_series:
+            types.append("time_series")
+        if search_series_group:
+            types.append("series_group")
+        if not types:
+            return pd.DataFrame(columns=columns)
+
+        sb = SeriesBase.__table__
+        ts = TimeSeries.__table__
+        sg = SeriesGroup.__table__
+        tst = TimeSeriesType.__table__
+        matched = (
+            select(sb.c.id, sb.c.type)
+            .select_from(sb)
+            .outerjoin(ts, ts.c.id == sb.c.id)
+            .outerjoin(sg, sg.c.id == sb.c.id)
+            .where(sb.c.type.in_(types))
+        )
+        tokens = search_text.split() if search_text else []
+        if tokens:
+            match_and_score = cls._match_and_score(
+                tokens, search_by_name, search_by_code, search_by_keyword, partial, token_operator, session
+            )
+            if match_and_score is None:
+                return pd.DataFrame(columns=columns)
+            matched = matched.where(match_and_score[0])
+        matched = matched.cte("matched")
+
+        def facet(name, value_column, joined, limit=None):
+            stmt = (
+                select(literal(name).label("facet"), value_column.label("value"), func.count().label("count"))
+                .select_from(joined)
+                .group_by(value_column)
+            )
+            if limit is not None:
+                # A compound member cannot carry its own ORDER BY / LIMIT, so wrap it
+                subquery = stmt.order_by(func.count().desc(), value_column).limit(limit).subquery()
+                stmt = select(subquery.c.facet, subquery.c.value, subquery.c["count"])
+            return stmt
+
+        time_series = matched.join(ts, ts.c.id == matched.c.id)
+        stmt = union_all(
+            facet("type", matched.c.type, matched),
+            facet("time_frequency", ts.c.time_frequency, time_series),
+            facet("delta_type", ts.c.delta_type, time_series),
+            facet("time_series_type", tst.c.name, time_series.outerjoin(tst, tst.c.id == ts.c.type_id)),
+            facet(
+                "keyword",
+                Keyword.__table__.c.word,
+                matched
+                .join(seriesbase_keyword, seriesbase_keyword.c.seriesbase_id == matched.c.id)
+                .join(Keyword.__table__, Keyword.__table__.c.id == seriesbase_keyword.c.keyword_id),
+                limit=top_keywords,
+            ),
+        )
+
+        df = pd.DataFrame(session.execute(stmt).all(), columns=columns)
+        is_type = df["facet"] == "type"
+        df.loc[is_type, "value"] = df.loc[is_type, "value"].map(SERIES_TYPE_LABELS)
+        order = {name: position for position, name in enumerate(FACETS)}
+        df = df.sort_values(
+            ["facet", "count", "value"], key=lambda c: c.map(order) if c.name == "facet" else c,
+            ascending=[True, False, True], na_position="last", kind="stable"
+        )
+        return df.reset_index(drop=True)
+
+    @classmethod
+    def filter(
+        cls,
+        expression: str,
+        session=None,
+        limit_rows: int = 100,
+        after: tuple = None,
+    ) -> pd.DataFrame:
+        """
+        Searches TimeSeries and/or SeriesGroup with a filter expression (see `app.filter_expressions`),
+        e.g. `freq:M keyword:equity group:US_EQ updated>2026-01-01 "credit spread"`,
+        compiled into a single SQL statement. Every term must hold.
+
+        Parameters
+        ----------
+        expression : str
+            The filter expression.
+        session : Session, optional
+            Existing SQLAlchemy session. If None, uses db.session.
+        limit_rows : int, default 100
+            Maximum number of records (True for 100, False or None for no limit).
+        after : tuple of (score, id), optional
+            Keyset cursor, as in `search`.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Same columns as `search`. The score is the number of (text term, field) pairs
+            matched (0 without text terms). None if nothing matches.
+        """
+        if after is not None and len(after) != 2:
+            raise ValueError("after must be a (score, id) pair.")
+        if session is None:
+            session = db.session
+
+        terms = parse_filter_expression(expression)
+        conditions = []
+        score_conditions = []
+        for number, term in enumerate(terms):
+            if term.field is None:
+                field_conditions = cls._field_conditions(term.value, True, True, True, True, session)
+                field_conditions.append(SeriesBase.__table__.c.description.ilike(f"%{term.value}%"))
+                # The codes of the other series type and missing descriptions are NULL: the
+                # condition is False rather than NULL there, so that negated terms keep those rows
+                condition = func.coalesce(or_(*field_conditions), false())
+                if not term.negated:
+                    score_conditions += field_conditions
+            else:
+                condition = cls._filter_condition(term, number)
+            conditions.append(~condition if term.negated else condition)
+
+        if score_conditions:
+            score = reduce(operator.add, [case((condition, 1), else_=0) for condition in score_conditions])
+        else:
+            score = literal(0)
+        if after is not None:
+            conditions.append(cls._keyset_condition(score, SeriesBase.__table__.c.id, after))
+
+        sb = SeriesBase.__table__
+        ts = TimeSeries.__table__
+        sg = SeriesGroup.__table__
+        stmt = (
+            select(
+                sb.c.type,
+                sb.c.id,
+                sb.c.name,
+                func.coalesce(ts.c.time_series_code, sg.c.series_group_code),
+                sb.c.description,
+                keywords_aggregate(session.connection().dialect.name, sb.c.id),
+                score.label("score"),
+            )
+            .select_from(sb)
+            .outerjoin(ts, ts.c.id == sb.c.id)
+            .outerjoin(sg, sg.c.id == sb.c.id)
+            .where(and_(true(), *conditions))
+            .order_by(score.desc(), sb.c.id)
+        )
+        limit = cls._limit_value(limit_rows)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return cls._results_dataframe(session.execute(stmt).all())
+
+    @staticmethod
+    def _filter_condition(term, number):
+        """
+        Compiles a `field:value` FilterTerm into a condition over the series_base, time_series
+        and series_group tables. Conditions on nullable columns are False (not NULL) when the
+        column is NULL, so that negated terms keep those rows. `number` names the group CTEs.
+        """
+        sb = SeriesBase.__table__
+        ts = TimeSeries.__table__
+        sg = SeriesGroup.__table__
+        kw = Keyword.__table__
+
+        def known(column, condition):
+            return and_(column.isnot(None), condition)
+
+        def text_match(column, value):
+            # '*' is a wildcard; otherwise the whole value must match, case-insensitively
+            if '*' in value:
+                return column.ilike(value.replace('*', '%'))
+            return func.lower(column) == value.lower()
+
+        if term.field == 'type':
+            return sb.c.type == term.value
+        if term.field == 'freq':
+            return known(ts.c.time_frequency, ts.c.time_frequency == term.value)
+        if term.field == 'delta':
+            return known(ts.c.delta_type, ts.c.delta_type == term.value)
+        if term.field == 'tstype':
+            tst = TimeSeriesType.__table__
+            return known(ts.c.type_id, ts.c.type_id.in_(select(tst.c.id).where(text_match(tst.c.name, term.value))))
+        if term.field == 'keyword':
+            return sb.c.id.in_(
+                select(seriesbase_keyword.c.seriesbase_id)
+                .join(kw, kw.c.id == seriesbase_keyword.c.keyword_id)
+                .where(text_match(kw.c.word, term.value))
+            )
+        if term.field == 'code':
+            return or_(
+                known(ts.c.time_series_code, text_match(ts.c.time_series_code, term.value)),
+                known(sg.c.series_group_code, text_match(sg.c.series_group_code, term.value)),
+            )
+        if term.field == 'name':
+            return sb.c.name.ilike(f"%{term.value}%")
+        if term.field == 'group':
+            # Members of the group and of the groups nested below it, at any depth
+            tree = _series_group_tree(
+                select(sg.c.id).where(text_match(sg.c.series_group_code, term.value)),
+                name=f"filter_group_{number}",
+            )
+            return or_(
+                sb.c.id.in_(
+                    select(seriesgroup_seriesbase.c.seriesbase_id)
+                    .where(seriesgroup_seriesbase.c.seriesgroup_id.in_(select(tree.c.group_id)))
+                ),
+                sb.c.id.in_(select(tree.c.group_id).where(tree.c.group_id != tree.c.root_id)),
+            )
+
+        # Date fields
+        if term.field in ('updated', 'created'):
+            column = sb.c.date_update if term.field == 'updated' else sb.c.date_create
+            # Timestamps are compared by day
+            day_start = datetime.datetime.combine(term.value, datetime.time())
+            next_day_start = day_start + datetime.timedelta(days=1)
+            return {
+                ':': and_(column >= day_start, column < next_day_start),
+                '>': column >= next_day_start,
+                '>=': column >= day_start,
+                '<': column < day_start,
+                '<=': column < next_day_start,
+            }[term.operator]
+
+        # Coverage: data points of a TimeSeries, maintained statistics of a SeriesGroup
+        dp = DataPoint.__table__
+        stats = SeriesGroupStats.__table__
+        aggregate, stats_column = (func.min, stats.c.min_date) if term.field == 'start' else (func.max, stats.c.max_date)
+        column = type_coerce(func.coalesce(
+            select(aggregate(dp.c.date)).where(dp.c.time_series_id == sb.c.id).scalar_subquery(),
+            select(stats_column).where(stats.c.series_group_id == sb.c.id).scalar_subquery(),
+        ), Date)
+        return known(column, {
+            ':': column == term.value,
+            '>': column > term.value,
+            '>=': column >= term.value,
+            '<': column < term.value,
+            '<=': column <= term.value,
+        }[term.operator])
+
+    @classmethod
+    def _match_and_score(
+        cls, tokens, search_by_name, search_by_code, search_by_keyword, partial, token_operator, session
+    ):
+        """
+        Returns the (match condition, score expression) of `tokens` over the series_base,
+        time_series and series_group tables, or None if no field is searched.
+        """
+        # One condition per (token, field); the score counts how many of them hold
+        token_conditions = []
+        for token in tokens:
+            field_conditions = cls._field_conditions(
+                token, search_by_name, search_by_code, search_by_keyword, partial, session
+            )
+            if field_conditions:
+                token_conditions.append(field_conditions)
+        if not token_conditions:
+            return None
 
-        # Prepare the final list of dict rows for our DataFrame
-        result_rows = []
+        score = reduce(operator.add, [
+            case((condition, 1), else_=0)
+            for field_conditions in token_conditions
+            for condition in field_conditions
+        ])
+        token_matches = [or_(*field_conditions) for field_conditions in token_conditions]
+        match = and_(*token_matches) if token_operator == 'and' else or_(*token_matches)
+        return match, score
 
-        # Define the filter condition based on partial or exact match
-        def get_filter(column):
+    @staticmethod
+    def _field_conditions(token, search_by_name, search_by_code, search_by_keyword, partial, session):
+        """
+        Returns the list of conditions matching `token` against each enabled field.
+        Partial matches on name and code are narrowed down with the trigram index first.
+        """
+        def get_filter(column, field):
             if partial:
-                return column.ilike(f"%{search_text}%")
+                condition = column.ilike(f"%{token}%")
+                candidates = trigram_candidates(token, field, SeriesBase.__table__.c.id, session=session)
+                if candidates is not None:
+                    condition = and_(candidates, condition)
+                return condition
             else:
-                return column == search_text
+                return column == token
 
-        if search_time_series:
-            # Start base query with joinedload for keywords
-            ts_query = session.query(TimeSeries).options(joinedload(TimeSeries.keywords))
-
-            or_conditions = []
-
-            # a) By name
-            if search_by_name:
-                or_conditions.append(get_filter(TimeSeries.name))
-
-            # b) By code
-            if search_by_code:
-                or_conditions.append(get_filter(TimeSeries.time_series_code))
-
-            # c) By keyword using `any()`
-            if search_by_keyword:
-                if partial:
-                    keyword_filter = TimeSeries.keywords.any(Keyword.word.ilike(f"%{search_text}%"))
-                else:
-                    keyword_filter = TimeSeries.keywords.any(Keyword.word == search_text)
-                or_conditions.append(keyword_filter)
-
-            # Combine all conditions with OR
-            if or_conditions:
-                ts_query = ts_query.filter(or_(*or_conditions))
-
-            # Execute the query
-            ts_list = ts_query.all()
-
-            # Debug: Print matched TimeSeries
-            if print_findings:
-                print(f"Matched TimeSeries ({len(ts_list)}):")
-                for ts in ts_list:
-                    print(f" - ID: {ts.id}, Name: {ts.name}, Code: {ts.time_series_code}, Keywords: {[kw.word for kw in ts.keywords]}")
-
-            # Convert TimeSeries results to row dicts
-            for ts in ts_list:
-                kw_list = [kw.word for kw in ts.keywords]
-                row = {
-                    "type": "TimeSeries",
-                    "id": ts.id,
-                    "name": ts.name,
-                    "code": ts.time_series_code,
-                    "description": ts.description,
-                    "keywords": ", ".join(kw_list),
-                }
-                result_rows.append(row)
+        conditions = []
+
+        # a) By name
+        if search_by_name:
+            conditions.append(get_filter(SeriesBase.__table__.c.name, 'name'))
 
+        # b) By code (only one of the two codes is set on each row)
+        if search_by_code:
+            conditions.append(or_(
+                get_filter(TimeSeries.__table__.c.time_series_code, 'code'),
+                get_filter(SeriesGroup.__table__.c.series_group_code, 'code'),
+            ))
+
+        # c) By keyword, as an indexable IN (not a correlated EXISTS),
+        #    so that the OR with the name and code conditions does not force a full scan
+        if search_by_keyword:
+            keyword_series_ids = (
+                select(seriesbase_keyword.c.seriesbase_id)
+                .join(Keyword, Keyword.id == seriesbase_keyword.c.keyword_id)
+                .where(Keyword.word.ilike(f"%{token}%") if partial else Keyword.word == token)
+            )
+            conditions.append(SeriesBase.__table__.c.id.in_(keyword_series_ids))
+
+        return conditions
+
+    @classmethod
+    def _full_text_search(
+        cls,
+        search_text,
+        search_by_name,
+        search_by_code,
+        search_by_keyword,
+        partial,
+        search_time_series,
+        search_series_group,
+        session,
+        limit_rows,
+        after=None,
+        token_operator='or',
+    ):
+        """
+        Answers `search` from the full-text index, best matches first.
+        """
+        if session is None:
+            session = db.session
+
+        columns = []
+        if search_by_name:
+            columns += ["name", "description"]
+        if search_by_code:
+            columns.append("code")
+        if search_by_keyword:
+            columns.append("keywords")
+        types = []
+        if search_time_series:
+            types.append("time_series")
         if search_series_group:
-            # Start base query with joinedload for keywords
-            sg_query = session.query(SeriesGroup).options(joinedload(SeriesGroup.keywords))
-
-            or_conditions = []
-
-            # a) By name
-            if search_by_name:
-                or_conditions.append(get_filter(SeriesGroup.name))
-
-            # b) By code
-            if search_by_code:
-                or_conditions.append(get_filter(SeriesGroup.series_group_code))
-
-            # c) By keyword using `any()`
-            if search_by_keyword:
-                if partial:
-                    keyword_filter = SeriesGroup.keywords.any(Keyword.word.ilike(f"%{search_text}%"))
-                else:
-                    keyword_filter = SeriesGroup.keywords.any(Keyword.word == search_text)
-                or_conditions.append(keyword_filter)
-
-            # Combine all conditions with OR
-            if or_conditions:
-                sg_query = sg_query.filter(or_(*or_conditions))
-
-            # Execute the query
-            sg_list = sg_query.all()
-
-            # Debug: Print matched SeriesGroups
-            if print_findings:
-                print(f"Matched SeriesGroups ({len(sg_list)}):")
-                for sg in sg_list:
-                    print(f" - ID: {sg.id}, Name: {sg.name}, Code: {sg.series_group_code}, Keywords: {[kw.word for kw in sg.keywords]}")
-
-            # Convert SeriesGroup results to row dicts
-            for sg in sg_list:
-                kw_list = [kw.word for kw in sg.keywords]
-                row = {
-                    "type": "SeriesGroup",
-                    "id": sg.id,
-                    "name": sg.name,
-                    "code": sg.series_group_code,
-                    "description": sg.description,
-                    "keywords": ", ".join(kw_list),
-                }
-                result_rows.append(row)
-
-        df = pd.DataFrame(result_rows)
+            types.append("series_group")
+
+        if not search_text or not search_text.strip() or not columns or not types:
+            return pd.DataFrame(columns=["type", "id", "name", "code", "description", "keywords", "score"])
 
+        dialect_name = session.connection().dialect.name
+        matches = full_text_matches(
+            search_text, columns=columns, prefix=partial, session=session, token_operator=token_operator
+        )
+        sb = SeriesBase.__table__
+        ts = TimeSeries.__table__
+        sg = SeriesGroup.__table__
+        stmt = (
+            select(
+                sb.c.type,
+                sb.c.id,
+                sb.c.name,
+                func.coalesce(ts.c.time_series_code, sg.c.series_group_code),
+                sb.c.description,
+                keywords_aggregate(dialect_name, sb.c.id),
+                matches.c.score,
+            )
+            .select_from(matches)
+            .join(sb, sb.c.id == matches.c.id)
+            .outerjoin(ts, ts.c.id == sb.c.id)
+            .outerjoin(sg, sg.c.id == sb.c.id)
+            .where(sb.c.type.in_(types))
+            .order_by(matches.c.score.desc(), sb.c.id)
+        )
+        if after is not None:
+            stmt = stmt.where(cls._keyset_condition(matches.c.score, sb.c.id, after))
+        limit = cls._limit_value(limit_rows)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        return cls._results_dataframe(session.execute(stmt).all())
+
+    @classmethod
+    def _index_dataframe(cls, matches):
+        """
+        Builds the search output from (CatalogEntry, score) pairs of the in-memory index.
+        """
+        return cls._results_dataframe([
+            (entry.type, entry.id, entry.name, entry.code, entry.description, ", ".join(entry.keywords), score)
+            for entry, score in matches
+        ])
+
+    @staticmethod
+    def _results_dataframe(rows):
+        """
+        Builds the search output from (type, id, name, code, description, keywords, score)
+        rows; None if there are no rows.
+        """
+        df = pd.DataFrame(rows, columns=["type", "id", "name", "code", "description", "keywords", "score"])
         if df.empty:
             return None
+        df["type"] = df["type"].map(SERIES_TYPE_LABELS)
+        df["keywords"] = df["keywords"].fillna("")
+        return df
 
-        cls.limit_rows_of_df(df, limit_rows)
+    @staticmethod
+    def _keyset_condition(score, id_column, after):
+        """
+        Condition keeping the rows ranked after `after` = (score, id) in the
+        (score descending, id ascending) order of the search results.
+        """
+        # Plain Python numbers, since cursors are usually taken from a result DataFrame
+        after_score, after_id = float(after[0]), int(after[1])
+        return or_(score < after_score, and_(score == after_score, id_column > after_id))
+
+    @staticmethod
+    def _limit_value(limit_rows):
+        """
+        Converts `limit_rows` to the number of rows to keep (None for no limit).
+        """
+        if isinstance(limit_rows, bool):
+            return 100 if limit_rows else None
+        if isinstance(limit_rows, int):
+            return limit_rows
+        return None
 
-        return df
-    
     @staticmethod
     def limit_rows_of_df(df, limit_rows):
         if isinstance(limit_rows, bool) and limit_rows:
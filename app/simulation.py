@@ -0,0 +1,289 @@
+# app/simulation.py
+
+"""
+Monte Carlo simulation of portfolio wealth paths from a mean and covariance of periodic returns.
+
+Asset returns are drawn as mean + L z, with L the Cholesky factor of the covariance (computed
+once) and z standard normal; returns below -100% are clipped to -100% (total loss). The
+portfolio is either rebalanced to its weights every period or bought and held.
+
+Paths are simulated in chunks of `chunk_size`. Every chunk draws from its own stream,
+spawned from `np.random.SeedSequence(seed)`, and only returns fixed-size aggregates
+(histograms, counts, sums and extremes), which are combined in chunk order. Memory is
+therefore bounded by the chunk size, whatever the number of paths, and the results are
+bit-identical for the same seed, number of paths and chunk size, whatever the number of
+worker processes. Quantiles are interpolated within the histogram bins.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from app import db
+from .analytics import load_panel, simple_returns
+from .covariance import covariance_matrix
+
+SimulationResult = namedtuple('SimulationResult', ['summary', 'quantiles', 'terminal_wealth', 'max_drawdown'])
+
+DEFAULT_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# Aggregates of a chunk of paths
+_ChunkStatistics = namedtuple('_ChunkStatistics', [
+    'wealth_counts', 'drawdown_counts', 'wealth_sum', 'wealth_sum_squares', 'drawdown_sum',
+    'losses', 'wealth_min', 'wealth_max', 'drawdown_max',
+])
+
+
+def simulate_paths(
+    mean,
+    covariance,
+    weights=None,
+    horizon=12,
+    n_paths=10000,
+    seed=None,
+    rebalance=True,
+    chunk_size=10000,
+    n_workers=1,
+    quantiles=None,
+    bins=2000,
+):
+    """
+    Simulates wealth paths of a portfolio starting with a wealth of 1.
+
+    Parameters:
+        mean (Series or array): Mean periodic return of each asset.
+        covariance (DataFrame or array): Covariance of the periodic returns (PSD).
+        weights (Series or array, optional): Portfolio weights; the rest is cash (zero return).
+                                             Defaults to equal weights.
+        horizon (int): Number of periods of every path.
+        n_paths (int): Number of paths.
+        seed (int, optional): Seed of the SeedSequence; None draws fresh entropy.
+        rebalance (bool): If True, rebalance to `weights` every period, else buy and hold.
+        chunk_size (int): Number of paths simulated at once by a worker.
+        n_workers (int): Number of worker processes (1 simulates in this process).
+        quantiles (list of float, optional): Quantile levels. Defaults to DEFAULT_QUANTILES.
+        bins (int): Number of histogram bins of the terminal wealth and the maximum drawdown.
+
+    Returns:
+        SimulationResult: (summary, quantiles, terminal_wealth, max_drawdown). summary is a
+                          Series of path statistics, quantiles a DataFrame (quantile levels x
+                          terminal_wealth, max_drawdown), terminal_wealth and max_drawdown are
+                          histograms (counts indexed by IntervalIndex).
+    """
+    mean = np.asarray(mean, dtype=float)
+    covariance = np.asarray(covariance, dtype=float)
+    n_assets = len(mean)
+    if covariance.shape != (n_assets, n_assets):
+        raise ValueError("covariance must be a square matrix matching mean.")
+    weights = np.full(n_assets, 1.0 / n_assets) if weights is None else np.asarray(weights, dtype=float)
+    if weights.shape != (n_assets,):
+        raise ValueError("weights must have one value per asset.")
+    if horizon < 1 or n_paths < 1 or chunk_size < 1 or n_workers < 1 or bins < 1:
+        raise ValueError("horizon, n_paths, chunk_size, n_workers and bins must be positive.")
+    quantiles = DEFAULT_QUANTILES if quantiles is None else list(quantiles)
+
+    factor = _factor(covariance)
+    wealth_edges = _log_wealth_edges(mean, covariance, weights, horizon, bins)
+    drawdown_edges = np.linspace(0.0, 1.0, bins + 1)
+    sizes = [chunk_size] * (n_paths // chunk_size) + ([n_paths % chunk_size] if n_paths % chunk_size else [])
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [
+        (mean, factor, weights, horizon, size, stream, rebalance, wealth_edges, drawdown_edges)
+        for size, stream in zip(sizes, streams)
+    ]
+    if n_workers == 1 or len(tasks) == 1:
+        chunks = map(_simulate_chunk, tasks)
+        total = _combine(chunks)
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+            total = _combine(executor.map(_simulate_chunk, tasks))
+
+    wealth_mean = total.wealth_sum / n_paths
+    summary = pd.Series({
+        'n_paths': n_paths,
+        'horizon': horizon,
+        'mean_terminal_wealth': wealth_mean,
+        'std_terminal_wealth': np.sqrt(max(total.wealth_sum_squares / n_paths - wealth_mean ** 2, 0.0)),
+        'min_terminal_wealth': total.wealth_min,
+        'max_terminal_wealth': total.wealth_max,
+        'probability_of_loss': total.losses / n_paths,
+        'mean_max_drawdown': total.drawdown_sum / n_paths,
+        'worst_max_drawdown': total.drawdown_max,
+    })
+    wealth_bounds = (total.wealth_min, total.wealth_max)
+    result_quantiles = pd.DataFrame({
+        'terminal_wealth': np.exp(_histogram_quantiles(
+            total.wealth_counts, wealth_edges, quantiles, np.log(np.maximum(wealth_bounds, 1e-300))
+        )),
+        'max_drawdown': _histogram_quantiles(
+            total.drawdown_counts, drawdown_edges, quantiles, (0.0, total.drawdown_max)
+        ),
+    }, index=pd.Index(quantiles, name='quantile'))
+    wealth_intervals = pd.IntervalIndex.from_breaks(np.exp(wealth_edges), name='terminal_wealth')
+    drawdown_intervals = pd.IntervalIndex.from_breaks(drawdown_edges, name='max_drawdown')
+    return SimulationResult(
+        summary=summary,
+        quantiles=result_quantiles,
+        terminal_wealth=pd.Series(total.wealth_counts[1:-1], index=wealth_intervals),
+        max_drawdown=pd.Series(total.drawdown_counts, index=drawdown_intervals),
+    )
+
+
+def _factor(covariance):
+    """
+    Cholesky factor of the covariance, or a square root from its eigenvalues (clipped at zero)
+    when it is only positive semi-definite.
+    """
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh((covariance + covariance.T) / 2)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+
+def _log_wealth_edges(mean, covariance, weights, horizon, bins):
+    """
+    Histogram edges of the log terminal wealth, ten standard deviations around its expected
+    value (from the portfolio's mean and variance). Paths outside go to the outer counts.
+    """
+    portfolio_mean = weights @ mean
+    portfolio_sd = np.sqrt(max(weights @ covariance @ weights, 0.0))
+    center = horizon * (portfolio_mean - portfolio_sd ** 2 / 2)
+    width = max(10 * portfolio_sd * np.sqrt(horizon), 1e-6)
+    return np.linspace(center - width, center + width, bins + 1)
+
+
+def _simulate_chunk(task):
+    mean, factor, weights, horizon, size, stream, rebalance, wealth_edges, drawdown_edges = task
+    rng = np.random.default_rng(stream)
+    cash = 1.0 - weights.sum()
+    wealth = np.ones(size)
+    peak = np.ones(size)
+    drawdown = np.zeros(size)
+    holdings = np.tile(weights, (size, 1))
+    for _ in range(horizon):
+        returns = np.maximum(mean + rng.standard_normal((size, len(mean))) @ factor.T, -1.0)
+        if rebalance:
+            wealth = wealth * (1.0 + returns @ weights)
+        else:
+            holdings *= 1.0 + returns
+            wealth = holdings.sum(axis=1) + cash
+        np.maximum(peak, wealth, out=peak)
+        np.maximum(drawdown, 1.0 - wealth / peak, out=drawdown)
+
+    with np.errstate(divide='ignore'):
+        log_wealth = np.log(np.maximum(wealth, 0.0))
+    # Counts below the first edge, in every bin, and above the last edge
+    positions = np.searchsorted(wealth_edges, log_wealth, side='right')
+    positions[log_wealth == wealth_edges[-1]] = len(wealth_edges) - 1
+    wealth_counts = np.bincount(positions, minlength=len(wealth_edges) + 1)
+    drawdown_positions = np.minimum(np.searchsorted(drawdown_edges, drawdown, side='right') - 1, len(drawdown_edges) - 2)
+    drawdown_counts = np.bincount(drawdown_positions, minlength=len(drawdown_edges) - 1)
+    return _ChunkStatistics(
+        wealth_counts=wealth_counts,
+        drawdown_counts=drawdown_counts,
+        wealth_sum=wealth.sum(),
+        wealth_sum_squares=(wealth ** 2).sum(),
+        drawdown_sum=drawdown.sum(),
+        losses=int((wealth < 1.0).sum()),
+        wealth_min=wealth.min(),
+        wealth_max=wealth.max(),
+        drawdown_max=drawdown.max(),
+    )
+
+
+def _combine(chunks):
+    """
+    Combines chunk aggregates in chunk order, so that floating point sums do not depend on
+    which worker computed which chunk.
+    """
+    total = None
+    for chunk in chunks:
+        if total is None:
+            total = chunk
+            continue
+        total = _ChunkStatistics(
+            wealth_counts=total.wealth_counts + chunk.wealth_counts,
+            drawdown_counts=total.drawdown_counts + chunk.drawdown_counts,
+            wealth_sum=total.wealth_sum + chunk.wealth_sum,
+            wealth_sum_squares=total.wealth_sum_squares + chunk.wealth_sum_squares,
+            drawdown_sum=total.drawdown_sum + chunk.drawdown_sum,
+            losses=total.losses + chunk.losses,
+            wealth_min=min(total.wealth_min, chunk.wealth_min),
+            wealth_max=max(total.wealth_max, chunk.wealth_max),
+            drawdown_max=max(total.drawdown_max, chunk.drawdown_max),
+        )
+    return total
+
+
+def _histogram_quantiles(counts, edges, quantiles, bounds):
+    """
+    Quantiles interpolated linearly within the bins of a histogram. With len(edges) + 1
+    counts, the first and last are the values outside the edges, reported at `bounds`.
+    """
+    outer = len(counts) == len(edges) + 1
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+    result = []
+    for q in quantiles:
+        if not 0 <= q <= 1:
+            raise ValueError("quantiles must be between 0 and 1.")
+        target = q * n
+        k = min(int(np.searchsorted(cumulative, target, side='left')), len(counts) - 1)
+        if outer and k == 0:
+            result.append(bounds[0])
+            continue
+        if outer and k == len(counts) - 1:
+            result.append(bounds[1])
+            continue
+        b = k - 1 if outer else k
+        below = cumulative[k - 1] if k else 0
+        fraction = (target - below) / counts[k] if counts[k] else 0.0
+        value = edges[b] + fraction * (edges[b + 1] - edges[b])
+        result.append(min(max(value, bounds[0]), bounds[1]))
+    return np.array(result)
+
+
+def run_simulation(
+    weights=None,
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    covariance_method='sample',
+    session=None,
+    **kwargs,
+):
+    """
+    Simulates a portfolio of stored series (see `app.analytics.load_panel`), from the mean and
+    covariance (`app.covariance.covariance_matrix`, repaired to PSD) of their periodic returns.
+
+    Parameters:
+        weights (Series, optional): Weights indexed by TimeSeries code; the universe defaults
+                                    to these codes. Defaults to equal weights.
+        levels (bool): If True, the stored values are levels and are turned into returns first.
+        covariance_method (str): One of app.covariance.COVARIANCE_METHODS.
+        **kwargs: Passed to `simulate_paths` (horizon, n_paths, seed, n_workers...).
+
+    Returns:
+        SimulationResult: As `simulate_paths`.
+    """
+    if session is None:
+        session = db.session
+    if codes is None and series_group is None and weights is not None:
+        codes = list(weights.index)
+    panel, _ = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    returns = simple_returns(panel) if levels else panel
+    covariance = covariance_matrix(returns, method=covariance_method, psd=True)
+    if weights is not None:
+        unknown = set(weights.index) - set(returns.columns)
+        if unknown:
+            raise ValueError("weights have codes outside the universe: " + ", ".join(sorted(unknown)))
+        weights = weights.reindex(returns.columns).fillna(0.0)
+    return simulate_paths(returns.mean(), covariance, weights=weights, **kwargs)
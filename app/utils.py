@@ -19,11 +19,11 @@ def create_returns_df(
         raise ValueError("variance_multiplier must be between 0 and 0.5")
     rng = np.random.RandomState(seed)
     asset_names = ["".join(rng.choice(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"), 3)) for i in range(n_assets)]
-    cov_matrix = make_sparse_spd_matrix(n_dim=n_assets, alpha=alpha_sparsity)
+    cov_matrix = make_sparse_spd_matrix(n_dim=n_assets, alpha=alpha_sparsity, random_state=rng)
     cov_matrix /= (np.max(cov_matrix) / variance_multiplier)
-    returns = np.random.multivariate_normal(np.ones(n_assets) * avg_return, cov_matrix, n_samples)
+    returns = rng.multivariate_normal(np.ones(n_assets) * avg_return, cov_matrix, n_samples)
     if truncate:
         returns[returns < -1] = -.95
     returns_df = pd.DataFrame(returns, columns=asset_names)
     returns_df.index = pd.date_range(end=end_date, periods=n_samples, freq=date_frequecy)
-    return returns_df
\ No newline at end of file
+    return returns_df
@@ -0,0 +1,321 @@
+# app/volatility.py
+
+"""
+Conditional volatility forecasts of many series with GARCH-family models (`arch`), estimated
+in a pool of worker processes and reusing earlier estimates.
+
+Every series is handled by one of three methods, from its latest earlier estimate of the same
+model specification (a VolatilityFit):
+    'cold': no usable estimate, the model is estimated from arch's default starting values.
+    'warm': the estimate is `refit_every` observations old or more; the model is estimated
+            again, starting the optimizer from it (which takes fewer iterations). A warm fit
+            that does not converge is redone cold.
+    'filter': the estimate is recent; its parameters are kept and only the variance recursion
+              is run over the data (no optimization at all).
+The first two give new estimates, which `run_volatility_forecast` saves for the next run.
+
+Returns are scaled to percent for the optimizer, as arch recommends; parameters are stored in
+these units and forecasts are given in the units of the returns (not annualized).
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from arch import arch_model
+from sqlalchemy import select, func, tuple_
+from app import db
+from .models import VolatilityFit
+from .analytics import load_panel, simple_returns
+from .fulltext import REBUILD_BATCH_SIZE
+
+MEAN_MODELS = ['Constant', 'Zero']
+VOLATILITY_MODELS = ['GARCH', 'EGARCH']
+DISTRIBUTIONS = ['normal', 't', 'skewt']
+FIT_METHODS = ['cold', 'warm', 'filter']
+
+# Scale of the returns seen by the optimizer (percent)
+SCALE = 100.0
+
+VolatilitySpec = namedtuple(
+    'VolatilitySpec', ['mean', 'vol', 'p', 'o', 'q', 'dist'],
+    defaults=('Constant', 'GARCH', 1, 0, 1, 'normal'),
+)
+VolatilityResult = namedtuple('VolatilityResult', ['forecasts', 'fits'])
+
+FIT_COLUMNS = ['method', 'last_date', 'observations', 'log_likelihood', 'converged', 'parameters']
+
+
+def spec_key(spec=None):
+    """
+    Checks a model specification and returns its key, e.g. 'Constant-GARCH(1,0,1)-normal'.
+
+    Parameters:
+        spec (VolatilitySpec, optional): Defaults to VolatilitySpec() (GARCH(1,1), normal).
+
+    Returns:
+        str: The key under which the estimates of the specification are stored.
+    """
+    spec = VolatilitySpec() if spec is None else spec
+    if spec.mean not in MEAN_MODELS:
+        raise ValueError("mean must be one of the following: " + ", ".join(MEAN_MODELS))
+    if spec.vol not in VOLATILITY_MODELS:
+        raise ValueError("vol must be one of the following: " + ", ".join(VOLATILITY_MODELS))
+    if spec.dist not in DISTRIBUTIONS:
+        raise ValueError("dist must be one of the following: " + ", ".join(DISTRIBUTIONS))
+    if spec.p < 1 or spec.o < 0 or spec.q < 0:
+        raise ValueError("p must be positive, o and q non-negative.")
+    return f"{spec.mean}-{spec.vol}({spec.p},{spec.o},{spec.q})-{spec.dist}"
+
+
+def forecast_volatility(
+    returns,
+    spec=None,
+    horizon=1,
+    fits=None,
+    refit_every=5,
+    min_observations=100,
+    n_workers=1,
+):
+    """
+    Forecasts the conditional volatility of every column of `returns`, from its last observation.
+
+    Parameters:
+        returns (DataFrame): Periodic returns indexed by date, one column per series; missing
+                             values are skipped.
+        spec (VolatilitySpec, optional): The model. Defaults to GARCH(1,1) with normal errors.
+        horizon (int): Number of periods forecast.
+        fits (DataFrame, optional): Earlier estimates indexed by column, with the columns
+                                    last_date, observations and parameters (see `load_fits`).
+                                    Estimates after the last observation of a column are ignored.
+        refit_every (int): Number of new observations after which an estimate is refitted
+                           ('warm') instead of only filtered; 0 refits every time.
+        min_observations (int): Columns with fewer observations are not modelled (NaN).
+        n_workers (int): Number of worker processes (1 fits in this process).
+
+    Returns:
+        VolatilityResult: `forecasts` is a DataFrame indexed by column with the volatility
+                          forecasts 'h.1' to 'h.<horizon>'; `fits` is indexed by the modelled
+                          columns, with FIT_COLUMNS: the method (one of FIT_METHODS) and the
+                          estimate used (for 'filter', the earlier one).
+    """
+    spec_key(spec)
+    spec = VolatilitySpec() if spec is None else spec
+    if horizon < 1 or n_workers < 1 or min_observations < 1:
+        raise ValueError("horizon, n_workers and min_observations must be positive.")
+    if refit_every < 0:
+        raise ValueError("refit_every must be non-negative.")
+    if fits is None:
+        fits = pd.DataFrame(columns=['last_date', 'observations', 'parameters'])
+
+    codes, tasks, estimates = [], [], []
+    for code in returns.columns:
+        values = returns[code].dropna()
+        if len(values) < min_observations:
+            continue
+        last_date = pd.Timestamp(values.index[-1]).date()
+        method, parameters, previous_estimate = 'cold', None, None
+        if code in fits.index:
+            previous = fits.loc[code]
+            previous_estimate = (pd.Timestamp(previous['last_date']).date(), int(previous['observations']))
+            new_observations = len(values) - previous_estimate[1]
+            if previous_estimate[0] <= last_date and new_observations >= 0:
+                parameters = list(previous['parameters'].values())
+                method = 'filter' if new_observations < refit_every else 'warm'
+        codes.append(code)
+        tasks.append((values.to_numpy(dtype=float), spec, parameters, method, horizon))
+        estimates.append(((last_date, len(values)), previous_estimate))
+
+    if n_workers == 1 or len(tasks) <= 1:
+        results = list(map(_fit_series, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+            chunksize = max(1, len(tasks) // (4 * n_workers))
+            results = list(executor.map(_fit_series, tasks, chunksize=chunksize))
+
+    horizons = [f"h.{h}" for h in range(1, horizon + 1)]
+    forecasts = pd.DataFrame(np.nan, index=returns.columns, columns=horizons)
+    rows = []
+    for code, (current_estimate, previous_estimate), result in zip(codes, estimates, results):
+        method, parameters, log_likelihood, converged, volatility = result
+        forecasts.loc[code] = volatility
+        last_date, observations = previous_estimate if method == 'filter' else current_estimate
+        rows.append((method, last_date, observations, log_likelihood, converged, parameters))
+    return VolatilityResult(
+        forecasts=forecasts,
+        fits=pd.DataFrame(rows, index=pd.Index(codes, dtype=returns.columns.dtype), columns=FIT_COLUMNS),
+    )
+
+
+def _fit_series(task):
+    """
+    Estimates (or only filters) the model of one series and forecasts its volatility.
+    """
+    values, spec, parameters, method, horizon = task
+    model = arch_model(
+        values * SCALE, mean=spec.mean, vol=spec.vol, p=spec.p, o=spec.o, q=spec.q,
+        dist=spec.dist, rescale=False,
+    )
+    result = None
+    if method == 'filter':
+        try:
+            result = model.fix(parameters)
+        except ValueError:
+            # Parameters that do not fit the model: estimate it again
+            method = 'cold'
+    elif method == 'warm':
+        result = model.fit(starting_values=np.asarray(parameters), disp='off', show_warning=False)
+        if result.convergence_flag != 0:
+            method = 'cold'
+    if method == 'cold':
+        result = model.fit(disp='off', show_warning=False)
+    converged = method == 'filter' or result.convergence_flag == 0
+
+    if horizon > 1 and spec.vol == 'EGARCH':
+        # No analytic multi-period forecasts: simulated, with a fixed seed for reproducibility
+        forecast = result.forecast(
+            horizon=horizon, method='simulation', random_state=np.random.RandomState(0), reindex=False
+        )
+    else:
+        forecast = result.forecast(horizon=horizon, reindex=False)
+    volatility = np.sqrt(forecast.variance.to_numpy()[-1]) / SCALE
+    parameters = {name: float(value) for name, value in result.params.items()}
+    return method, parameters, float(result.loglikelihood), bool(converged), volatility
+
+
+def load_fits(series_ids, spec=None, end=None, session=None):
+    """
+    Loads the latest stored estimate of a model of every series.
+
+    Parameters:
+        series_ids (iterable of int): Ids of the TimeSeries.
+        spec (VolatilitySpec, optional): The model. Defaults to GARCH(1,1) with normal errors.
+        end (date, optional): Only estimates on data up to this date.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+
+    Returns:
+        DataFrame: Indexed by TimeSeries id, with the columns last_date, observations,
+                   parameters, log_likelihood and converged (series without estimate are left out).
+    """
+    if session is None:
+        session = db.session
+    key = spec_key(spec)
+    series_ids = list(series_ids)
+    vf = VolatilityFit.__table__
+    columns = ['time_series_id', 'last_date', 'observations', 'parameters', 'log_likelihood', 'converged']
+    rows = []
+    for first in range(0, len(series_ids), REBUILD_BATCH_SIZE):
+        batch = series_ids[first:first + REBUILD_BATCH_SIZE]
+        condition = (vf.c.model_spec == key) & vf.c.time_series_id.in_(batch)
+        if end is not None:
+            condition &= vf.c.last_date <= pd.Timestamp(end).date()
+        ranked = (
+            select(
+                *[vf.c[column] for column in columns],
+                func.row_number().over(
+                    partition_by=vf.c.time_series_id, order_by=vf.c.last_date.desc()
+                ).label('position'),
+            )
+            .where(condition)
+            .subquery('ranked_volatility_fit')
+        )
+        rows.extend(session.execute(
+            select(*[ranked.c[column] for column in columns]).where(ranked.c.position == 1)
+        ).all())
+    return pd.DataFrame(rows, columns=columns).set_index('time_series_id')
+
+
+def save_fits(fits, series_ids, spec=None, session=None):
+    """
+    Saves the new estimates ('cold' and 'warm' rows) of `forecast_volatility` fits, replacing
+    stored ones of the same series, model and last date.
+
+    Parameters:
+        fits (DataFrame): The `fits` of a VolatilityResult.
+        series_ids (Series): TimeSeries id of every index value of `fits`.
+        spec (VolatilitySpec, optional): The model of the fits.
+        session (Session, optional): The SQLAlchemy session to use. Defaults to db.session.
+    """
+    if session is None:
+        session = db.session
+    key = spec_key(spec)
+    estimated = fits[fits['method'] != 'filter']
+    rows = [
+        {
+            'time_series_id': int(series_ids[code]),
+            'model_spec': key,
+            'last_date': row.last_date,
+            'observations': int(row.observations),
+            'parameters': row.parameters,
+            'log_likelihood': row.log_likelihood,
+            'converged': bool(row.converged),
+        }
+        for code, row in zip(estimated.index, estimated.itertuples(index=False))
+    ]
+    if not rows:
+        return
+    vf = VolatilityFit.__table__
+    connection = session.connection()
+    # Row values in the IN list take two bind variables each
+    batch_size = REBUILD_BATCH_SIZE // 2
+    for first in range(0, len(rows), batch_size):
+        batch = rows[first:first + batch_size]
+        connection.execute(vf.delete().where(
+            (vf.c.model_spec == key)
+            & tuple_(vf.c.time_series_id, vf.c.last_date).in_(
+                [(row['time_series_id'], row['last_date']) for row in batch]
+            )
+        ))
+        connection.execute(vf.insert(), batch)
+
+
+def run_volatility_forecast(
+    codes=None,
+    series_group=None,
+    recursive=False,
+    start=None,
+    end=None,
+    as_of=None,
+    levels=False,
+    spec=None,
+    use_cache=True,
+    persist=True,
+    session=None,
+    commit=True,
+    **kwargs,
+):
+    """
+    Forecasts the conditional volatility of stored series (see `app.analytics.load_panel`),
+    starting from their stored estimates and saving the new ones.
+
+    Parameters:
+        levels (bool): If True, the stored values are levels and are turned into returns first.
+        spec (VolatilitySpec, optional): The model. Defaults to GARCH(1,1) with normal errors.
+        use_cache (bool): If True, start from the latest stored estimates (up to `end`);
+                          otherwise, every series is estimated cold.
+        persist (bool): If True, save the new estimates as VolatilityFit rows.
+        commit (bool): With `persist`, commit the transaction.
+        **kwargs: Passed to `forecast_volatility` (horizon, refit_every, n_workers...).
+
+    Returns:
+        VolatilityResult: As `forecast_volatility`, indexed by TimeSeries code.
+    """
+    if session is None:
+        session = db.session
+    spec_key(spec)
+    panel, metadata = load_panel(
+        codes=codes, series_group=series_group, recursive=recursive,
+        start=start, end=end, as_of=as_of, session=session,
+    )
+    returns = simple_returns(panel) if levels else panel
+    fits = None
+    if use_cache and len(metadata):
+        stored = load_fits(metadata['id'], spec=spec, end=end, session=session)
+        code_by_id = pd.Series(metadata.index, index=metadata['id'])
+        fits = stored.set_axis(code_by_id.reindex(stored.index).to_numpy())
+    result = forecast_volatility(returns, spec=spec, fits=fits, **kwargs)
+    if persist:
+        save_fits(result.fits, metadata['id'], spec=spec, session=session)
+        if commit:
+            session.commit()
+    return result
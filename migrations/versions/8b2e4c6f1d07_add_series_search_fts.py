@@ -0,0 +1,42 @@
+"""Add series_search_fts full-text index
+
+Revision ID: 8b2e4c6f1d07
+Revises: 3f1c2b7d9a41
+Create Date: 2026-10-19 10:02:41.127530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4c6f1d07'
+down_revision = '3f1c2b7d9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Virtual tables and generated tsvector columns are not autogenerated; see app/fulltext.py
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS series_search_fts ("
+            "id INTEGER PRIMARY KEY, name TEXT, description TEXT, code TEXT, keywords TEXT, "
+            "document tsvector GENERATED ALWAYS AS (to_tsvector('simple', "
+            "coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || "
+            "coalesce(code, '') || ' ' || coalesce(keywords, ''))) STORED)"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_series_search_fts_document "
+            "ON series_search_fts USING gin (document)"
+        )
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS series_search_fts USING fts5("
+            "name, description, code, keywords, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS series_search_fts")
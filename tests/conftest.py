@@ -9,6 +9,8 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import create_app, db
+from app.search_index import clear_catalog_indexes
+from app.search_cache import search_cache
 
 
 @pytest.fixture(scope='function')
@@ -30,6 +32,9 @@ def app():
         # Drop the database tables after the test
         db.session.remove()
         db.drop_all()
+        clear_catalog_indexes()
+        search_cache.clear()
+        search_cache.reset_stats()
 
 
 @pytest.fixture(scope='function')
@@ -55,4 +60,5 @@ from .fixtures import (
     sample_df_multiple_columns,
     create_seriesgroup_and_type,
     basic_tstype,
+    populate_series_for_search,
 )
\ No newline at end of file
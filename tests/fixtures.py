@@ -149,4 +149,44 @@ def basic_tstype(app):
         )
         db.session.add(tstype)
         db.session.commit()
-    return tstype
\ No newline at end of file
+    return tstype
+
+
+@pytest.fixture
+def populate_series_for_search(app, basic_tstype):
+    """
+    Fixture to populate the database with TimeSeries and SeriesGroup objects
+    for testing the SeriesSearcher.
+    
+    Returns:
+        tuple: (list_of_timeseries, list_of_seriesgroups)
+    """
+    with app.app_context():
+        # Create TimeSeries instances
+        ts1 = TimeSeries(name="TS_First", code="ABC123")
+        ts1.add_keyword("Finance")
+        ts1.add_keyword("Investment")
+        
+        ts2 = TimeSeries(name="TS_Second", code="DEF456")
+        ts2.add_keyword("Economics")
+        
+        ts3 = TimeSeries(name="My Timeseries", code="MYCODE")
+        ts3.add_keyword("Investment")
+        ts3.add_keyword("Strategy")
+        
+        # Create SeriesGroup instances
+        sg1 = SeriesGroup(name="SG_Beta", series_group_code="SG001")
+        sg1.add_keyword("Finance")
+        
+        sg2 = SeriesGroup(name="SG_Alpha", series_group_code="SG002")
+        sg2.add_keyword("Investment")
+        
+        sg3 = SeriesGroup(name="Alpha Finance Group", series_group_code="SG003")
+        sg3.add_keyword("Finance")
+        sg3.add_keyword("Alpha")
+        
+        # Add all to the session
+        db.session.add_all([ts1, ts2, ts3, sg1, sg2, sg3])
+        db.session.commit()
+        
+        return [ts1, ts2, ts3], [sg1, sg2, sg3]
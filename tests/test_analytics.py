@@ -0,0 +1,112 @@
+# tests/test_analytics.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app.analytics import load_panel, performance_summary, simple_returns, analyze
+from app.utils import create_returns_df
+from app import db
+
+
+@pytest.fixture
+def stored_returns(app):
+    """
+    Fixture storing three monthly return series (one starting later) and a daily one,
+    the monthly ones in a SeriesGroup.
+    """
+    returns = create_returns_df(n_samples=60, n_assets=3, seed=7)
+    returns.columns = ["R1", "R2", "R3"]
+    returns.iloc[:12, 2] = np.nan
+    group = SeriesGroup(name="Monthly", series_group_code="MONTHLY")
+    db.session.add(group)
+    for code in returns.columns:
+        ts = TimeSeries(name=f"Returns {code}", code=code, time_frequency="M")
+        db.session.add(ts)
+        group.series.append(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts)
+            for date, value in returns[code].dropna().items()
+        ])
+    daily = TimeSeries(name="Daily", code="D1", time_frequency="D")
+    db.session.add(daily)
+    db.session.add_all([
+        DataPoint(date=date.date(), value=0.001 * (-1) ** i, time_series=daily)
+        for i, date in enumerate(pd.bdate_range("2024-01-01", periods=30))
+    ])
+    db.session.commit()
+    return returns
+
+
+def test_load_panel(app, stored_returns):
+    """
+    Test loading a panel by codes and by SeriesGroup, with metadata.
+    """
+    panel, metadata = load_panel(codes=["R3", "R1"])
+    assert list(panel.columns) == ["R3", "R1"]
+    assert list(metadata.index) == ["R3", "R1"]
+    assert list(metadata['time_frequency']) == ["M", "M"]
+    np.testing.assert_allclose(panel["R1"].to_numpy(), stored_returns["R1"].to_numpy())
+    assert panel["R3"].isna().sum() == 12
+
+    panel, metadata = load_panel(series_group="MONTHLY")
+    assert list(panel.columns) == ["R1", "R2", "R3"]
+    group = SeriesGroup.query.filter_by(series_group_code="MONTHLY").one()
+    panel, _ = load_panel(series_group=group, end="2000-01-01")
+    assert panel.empty
+
+    with pytest.raises(ValueError):
+        load_panel(codes=["R1", "NOPE"])
+    with pytest.raises(ValueError):
+        load_panel()
+
+
+def test_performance_summary_matches_pandas(app, stored_returns):
+    """
+    Test the vectorized metrics against per-column pandas computations, with missing values.
+    """
+    returns = stored_returns
+    summary = performance_summary(returns, time_frequency="M", risk_free_rate=0.02)
+    risk_free = 1.02 ** (1 / 12) - 1
+    for code in returns.columns:
+        r = returns[code].dropna()
+        row = summary.loc[code]
+        assert row['observations'] == len(r)
+        assert row['annualized_return'] == pytest.approx((1 + r).prod() ** (12 / len(r)) - 1)
+        assert row['annualized_volatility'] == pytest.approx(r.std() * np.sqrt(12))
+        assert row['sharpe_ratio'] == pytest.approx((r.mean() - risk_free) / r.std() * np.sqrt(12))
+        downside = np.minimum(r - risk_free, 0)
+        assert row['sortino_ratio'] == pytest.approx(
+            (r.mean() - risk_free) / np.sqrt((downside ** 2).mean()) * np.sqrt(12)
+        )
+        wealth = (1 + r).cumprod()
+        assert row['max_drawdown'] == pytest.approx((wealth / wealth.cummax().clip(lower=1) - 1).min())
+        assert row['hit_rate'] == pytest.approx((r > 0).mean())
+        assert row['skewness'] == pytest.approx(r.skew())
+        assert row['excess_kurtosis'] == pytest.approx(r.kurt())
+
+    # Small blocks give the same answer
+    pd.testing.assert_frame_equal(
+        performance_summary(returns, time_frequency="M", risk_free_rate=0.02, block_size=1), summary
+    )
+
+
+def test_analyze_uses_each_time_frequency(app, stored_returns):
+    """
+    Test that `analyze` annualizes every series with its own time_frequency.
+    """
+    summary = analyze(codes=["R1", "D1"])
+    panel, _ = load_panel(codes=["R1", "D1"])
+    assert summary.loc["R1", "annualized_volatility"] == pytest.approx(panel["R1"].std() * np.sqrt(12))
+    assert summary.loc["D1", "annualized_volatility"] == pytest.approx(panel["D1"].std() * np.sqrt(252))
+    assert summary.loc["D1", "hit_rate"] == pytest.approx(0.5)
+
+
+def test_simple_returns_skip_gaps():
+    """
+    Test that returns of a level panel are taken between consecutive observations.
+    """
+    levels = pd.DataFrame({"a": [100.0, np.nan, 110.0, 121.0], "b": [np.nan, 50.0, 55.0, np.nan]})
+    returns = simple_returns(levels)
+    np.testing.assert_allclose(returns["a"].to_numpy(), [np.nan, np.nan, 0.1, 0.1])
+    np.testing.assert_allclose(returns["b"].to_numpy(), [np.nan, np.nan, 0.1, np.nan])
@@ -0,0 +1,140 @@
+# tests/test_backtest.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from app.models import TimeSeries, DataPoint
+from app.backtest import backtest, run_backtest
+from app import db
+
+
+@pytest.fixture
+def daily_returns():
+    """
+    Fixture returning daily returns of 5 assets over two years, one of them starting late.
+    """
+    rng = np.random.default_rng(11)
+    returns = pd.DataFrame(
+        rng.normal(0.0003, 0.01, (520, 5)),
+        columns=[f"S{i}" for i in range(5)],
+        index=pd.bdate_range("2021-01-01", periods=520),
+    )
+    returns.iloc[:30, 4] = np.nan
+    return returns
+
+
+def _reference_backtest(returns, targets, transaction_cost):
+    """
+    Day-by-day simulation: `targets` maps rebalance dates to weights (Series).
+    """
+    held, value, values, turnover = None, 1.0, {}, {}
+    for date, r in returns.fillna(0.0).iterrows():
+        if held is not None:
+            growth = held * (1 + r)
+            value *= growth.sum() + (1 - held.sum())
+            held = growth / (growth.sum() + (1 - held.sum()))
+        if date in targets:
+            current = held if held is not None else targets[date] * 0
+            turnover[date] = (targets[date] - current).abs().sum()
+            value *= 1 - transaction_cost * turnover[date]
+            held = targets[date].copy()
+        if held is not None:
+            values[date] = value
+    return pd.Series(values), pd.Series(turnover)
+
+
+def test_backtest_matches_day_by_day_loop(daily_returns):
+    """
+    Test monthly rebalancing with costs and cash against a day-by-day loop.
+    """
+    schedule = pd.DataFrame(
+        [[0.3, 0.3, 0.2, 0.1, 0.0], [0.1, 0.2, 0.2, 0.2, 0.2], [0.5, -0.1, 0.2, 0.2, 0.1]],
+        index=pd.to_datetime(["2021-01-15", "2021-06-01", "2022-03-15"]),
+        columns=daily_returns.columns,
+    )
+    result = backtest(daily_returns, schedule, rebalance="M", transaction_cost=0.002)
+
+    # First trade on the first date of the schedule, then on the last business day of every month
+    assert result.turnover.index[0] == pd.Timestamp("2021-01-15")
+    assert result.turnover.index[1] == pd.Timestamp("2021-01-29")
+    assert len(result.turnover) == 24
+    targets = {
+        date: schedule.iloc[schedule.index.searchsorted(date, side="right") - 1]
+        for date in result.turnover.index
+    }
+    values, turnover = _reference_backtest(daily_returns, targets, 0.002)
+
+    pd.testing.assert_series_equal(result.value.dropna(), values, check_freq=False, check_names=False)
+    pd.testing.assert_series_equal(result.turnover, turnover, check_freq=False, check_names=False)
+    pd.testing.assert_series_equal(result.costs, 0.002 * turnover, check_freq=False, check_names=False)
+    assert result.turnover.iloc[0] == pytest.approx(0.9)
+    assert result.returns.loc[:"2021-01-14"].isna().all()
+    np.testing.assert_allclose(
+        (1 + result.returns.dropna()).cumprod().to_numpy(), result.value.dropna().to_numpy()
+    )
+    assert np.isnan(result.drift.iloc[0]) and (result.drift.iloc[1:] > 0).all()
+
+
+def test_batched_variants_match_individual_runs(daily_returns):
+    """
+    Test that many variants run at once give the results of separate runs.
+    """
+    rng = np.random.default_rng(2)
+    dates = pd.date_range("2021-01-01", periods=8, freq="QS")
+    variants = {
+        k: pd.DataFrame(rng.dirichlet(np.ones(5), len(dates)), index=dates, columns=daily_returns.columns)
+        for k in range(40)
+    }
+    variants[40] = variants[0].iloc[2:]
+    batch = backtest(daily_returns, variants, rebalance="Q", transaction_cost=0.001)
+    assert list(batch.returns.columns) == list(variants)
+    for k in [0, 17, 39]:
+        single = backtest(daily_returns, variants[k], rebalance="Q", transaction_cost=0.001)
+        np.testing.assert_allclose(batch.value[k].to_numpy(), single.value.to_numpy())
+        np.testing.assert_allclose(batch.turnover[k].to_numpy(), single.turnover.to_numpy())
+
+    # A variant starting later holds cash until its first date
+    assert (batch.value[40].loc[:"2021-07-01"].dropna() == 1).all()
+
+    # Rebalancing on the dates of the schedule
+    on_dates = backtest(daily_returns, variants[0])
+    assert list(on_dates.turnover.index) == list(daily_returns.index[daily_returns.index.searchsorted(dates)])
+
+
+def test_rebalance_frequency_validation(daily_returns):
+    """
+    Test the errors on rebalance frequencies and schedules.
+    """
+    schedule = pd.DataFrame({"S0": [1.0]}, index=pd.to_datetime(["2021-01-04"]))
+    monthly = daily_returns.resample("ME").sum()
+    with pytest.raises(ValueError):
+        backtest(monthly, schedule, rebalance="W")
+    with pytest.raises(ValueError):
+        backtest(daily_returns, schedule, rebalance="D", time_frequency="M")
+    with pytest.raises(ValueError):
+        backtest(daily_returns, schedule, rebalance="X")
+    with pytest.raises(ValueError):
+        backtest(daily_returns, schedule.rename(columns={"S0": "NOPE"}))
+    assert len(backtest(monthly, schedule, rebalance="Q").turnover) == 8
+
+
+def test_run_backtest_on_stored_levels(app, daily_returns):
+    """
+    Test a backtest over stored levels checked against their time_frequency.
+    """
+    levels = (1 + daily_returns.iloc[:, :3].fillna(0)).cumprod() * 100
+    for code in levels.columns:
+        ts = TimeSeries(name=code, code=code, time_frequency="D")
+        db.session.add(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts) for date, value in levels[code].items()
+        ])
+    db.session.commit()
+
+    schedule = pd.DataFrame({"S0": [0.5], "S2": [0.5]}, index=pd.to_datetime(["2021-01-01"]))
+    result = run_backtest(schedule, levels=True, rebalance="Q", transaction_cost=0.001)
+    expected = backtest(
+        levels.pct_change()[["S0", "S2"]], schedule, rebalance="Q", transaction_cost=0.001
+    )
+    np.testing.assert_allclose(result.value.to_numpy(), expected.value.to_numpy())
+    assert len(result.turnover) == 8
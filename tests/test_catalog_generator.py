@@ -0,0 +1,93 @@
+# tests/test_catalog_generator.py
+
+import pytest
+from sqlalchemy import select, func
+from app.models import SeriesGroup, TimeSeries, Keyword, DataPoint, seriesbase_keyword
+from app.series import SeriesSearcher
+from app.generators import CatalogGenerator
+from app import db
+import app.fulltext as fulltext
+
+
+def test_generate_catalog(app, monkeypatch):
+    """
+    Test the shape of a generated catalog and that statistics and search see it.
+    """
+    monkeypatch.setattr(fulltext, "REBUILD_BATCH_SIZE", 100)
+    generator = CatalogGenerator(
+        n_series=500, depth=2, branching=3, n_keywords=50, keywords_per_series=4, history_length=(2, 6), seed=1
+    )
+    counts = generator.generate(chunk_size=120)
+
+    assert counts['series_groups'] == SeriesGroup.query.count() == 1 + 3 + 9
+    assert counts['time_series'] == TimeSeries.query.count() == 500
+    assert counts['keywords'] == Keyword.query.count() == 50
+    assert counts['data_points'] == DataPoint.query.count()
+    assert 2 * 500 <= counts['data_points'] <= 6 * 500
+    assert counts['keyword_links'] == db.session.execute(select(func.count()).select_from(seriesbase_keyword)).scalar()
+
+    # Nested tree below one root, series in the leaves
+    root = SeriesGroup.query.filter_by(series_group_code="GRP00").one()
+    assert root.parent is None and root.children.count() == 3
+    assert root.stats.member_count == 0
+    assert root.stats.recursive_member_count == 500
+    leaves = [group for group in SeriesGroup.query if group.children.count() == 0]
+    assert len(leaves) == 9 and sum(leaf.stats.member_count for leaf in leaves) == 500
+
+    # Zipf usage: the most used keyword is used far more than a rare one
+    usage = dict(db.session.execute(
+        select(seriesbase_keyword.c.keyword_id, func.count()).group_by(seriesbase_keyword.c.keyword_id)
+    ).all())
+    top = Keyword.query.filter_by(word=generator.word(0)).one()
+    rare = Keyword.query.filter_by(word=generator.word(40)).one()
+    assert usage[top.id] > 5 * usage.get(rare.id, 0)
+
+    ts = TimeSeries.query.filter_by(time_series_code="CAT123").one()
+    assert ts.time_frequency in generator.frequencies and ts.type_id is not None
+    assert SeriesSearcher.search("CAT123", full_text=True)["code"].tolist() == ["CAT123"]
+    assert SeriesSearcher.search("CAT123", partial=True, search_by_name=False)["code"].tolist() == ["CAT123"]
+    matches = SeriesSearcher.search(generator.word(0), use_index=True, search_series_group=False, limit_rows=1000)
+    assert len(matches) == usage[top.id]
+
+    # A second catalog only refreshes its own groups and series
+    more = CatalogGenerator(
+        n_series=20, depth=1, branching=2, n_keywords=5, history_length=(2, 6), seed=2,
+        code_prefix="NEW", group_code_prefix="NGR"
+    )
+    more.generate()
+    new_root = SeriesGroup.query.filter_by(series_group_code="NGR0").one()
+    assert new_root.stats.recursive_member_count == 20
+    assert root.stats.recursive_member_count == 500
+    assert SeriesSearcher.search("NEW07", full_text=True)["code"].tolist() == ["NEW07"]
+    assert SeriesSearcher.search("NEW07", use_index=True)["code"].tolist() == ["NEW07"]
+
+
+def test_generator_is_deterministic(app):
+    """
+    Test that the same seed gives the same catalog whatever the chunk size, and the argument checks.
+    """
+    def catalog():
+        return [
+            (ts.name, ts.time_frequency, ts.type_id, sorted(k.word for k in ts.keywords),
+             [(dp.date, dp.value) for dp in ts.data_points], [g.series_group_code for g in ts.series_groups])
+            for ts in TimeSeries.query.order_by(TimeSeries.time_series_code)
+        ]
+
+    generator = CatalogGenerator(n_series=50, depth=1, branching=2, n_keywords=20, seed=7, series_block=16)
+    generator.generate()
+    first = catalog()
+    assert len({word for _, _, _, words, _, _ in first for word in words}) > 1
+    for chunk_size in [7, 16, 33]:
+        db.session.rollback()
+        db.drop_all()
+        db.create_all()
+        generator.generate(chunk_size=chunk_size)
+        assert catalog() == first
+
+    assert len({generator.word(rank) for rank in range(1000)}) == 1000
+    with pytest.raises(ValueError):
+        CatalogGenerator(frequencies={"X": 1.0})
+    with pytest.raises(ValueError):
+        CatalogGenerator(n_series=10, code_prefix="WAYTOOLONGPREFIX")
+    with pytest.raises(ValueError):
+        CatalogGenerator(history_length=(5, 2))
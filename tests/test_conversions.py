@@ -0,0 +1,157 @@
+# tests/test_conversions.py
+
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+from app.models import SeriesBase, SeriesGroup, TimeSeries, DataPoint
+from app.conversions import levels_to_changes, changes_to_levels, rebase_levels, convert_series, DERIVED_TYPES
+from app.series import SeriesSearcher
+from app import db
+
+
+@pytest.fixture
+def mixed_levels():
+    """
+    Fixture returning levels of two 'pct' series (one starting later, with gaps) and an 'abs' one.
+    """
+    rng = np.random.default_rng(4)
+    index = pd.bdate_range("2023-01-02", periods=60)
+    levels = pd.DataFrame({
+        "PX": 50 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))),
+        "PY": 20 * np.exp(np.cumsum(rng.normal(0, 0.02, 60))),
+        "RATE": 3 + np.cumsum(rng.normal(0, 0.05, 60)),
+    }, index=index)
+    levels.iloc[:10, 1] = np.nan
+    levels.iloc[[20, 21, 40], 1] = np.nan
+    return levels
+
+
+def test_levels_to_changes_per_delta_type(mixed_levels):
+    """
+    Test returns and differences chosen per column, skipping missing values.
+    """
+    delta_type = ["pct", "pct", "abs"]
+    changes = levels_to_changes(mixed_levels, delta_type)
+    for code in ["PX", "PY"]:
+        column = mixed_levels[code].dropna()
+        pd.testing.assert_series_equal(changes[code].dropna(), column.pct_change().dropna())
+    pd.testing.assert_series_equal(changes["RATE"].dropna(), mixed_levels["RATE"].diff().dropna())
+    assert changes["PY"].iloc[:11].isna().all() and changes["PY"].iloc[[20, 21, 40]].isna().all()
+
+    log_changes = levels_to_changes(mixed_levels, pd.Series(delta_type), log=True)
+    np.testing.assert_allclose(log_changes["PX"].dropna(), np.log1p(changes["PX"].dropna()))
+    pd.testing.assert_series_equal(log_changes["RATE"], changes["RATE"])
+
+    with pytest.raises(ValueError):
+        levels_to_changes(mixed_levels, ["pct", "abs"])
+    with pytest.raises(ValueError):
+        levels_to_changes(mixed_levels, "log")
+
+
+def test_round_trip_and_rebase(mixed_levels):
+    """
+    Test that levels rebuilt from changes are the rebased levels, and rebasing at a date.
+    """
+    delta_type = ["pct", "pct", "abs"]
+    for log in [False, True]:
+        changes = levels_to_changes(mixed_levels, delta_type, log=log)
+        levels = changes_to_levels(changes, delta_type, log=log, base=1.0)
+        first = mixed_levels.apply(lambda column: column.dropna().iloc[0])
+        expected = mixed_levels / first
+        expected["RATE"] = mixed_levels["RATE"] - first["RATE"]
+        expected[changes.isna()] = np.nan
+        pd.testing.assert_frame_equal(levels, expected)
+
+    rebased = rebase_levels(mixed_levels, delta_type)
+    assert rebased.iloc[0, 0] == 100.0 and rebased["PY"].dropna().iloc[0] == 100.0
+    assert rebased["RATE"].iloc[0] == 0.0
+    at = rebase_levels(mixed_levels, delta_type, at=mixed_levels.index[21], base=1.0)
+    # No observation of PY on that date: its last one before is used
+    assert at["PY"].iloc[19] == 1.0 and at["PX"].iloc[21] == 1.0
+    assert rebase_levels(mixed_levels, delta_type, at="2022-12-30").isna().all().all()
+
+
+def test_convert_and_persist_stored_series(app, mixed_levels):
+    """
+    Test conversions of stored series with their delta_type and the bulk persistence.
+    """
+    group = SeriesGroup(name="Markets", series_group_code="MKT")
+    db.session.add(group)
+    for code, delta_type in zip(mixed_levels.columns, ["pct", "pct", "abs"]):
+        ts = TimeSeries(name=f"Market {code}", code=code, time_frequency="D", delta_type=delta_type)
+        db.session.add(ts)
+        group.series.append(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts)
+            for date, value in mixed_levels[code].dropna().items()
+        ])
+    db.session.commit()
+
+    changes = convert_series("changes", series_group="MKT", persist=True)
+    pd.testing.assert_frame_equal(
+        changes, levels_to_changes(mixed_levels, ["pct", "pct", "abs"]), check_freq=False, check_names=False
+    )
+    derived = TimeSeries.query.filter_by(time_series_code="RATE_C").one()
+    assert derived.name == "Market RATE (changes)"
+    assert derived.delta_type == "abs" and derived.time_frequency == "D"
+    assert derived.time_series_type.name == DERIVED_TYPES["changes"]
+    assert len(derived.data_points) == 59
+    assert SeriesSearcher.search("RATE_C", full_text=True)["code"].tolist() == ["RATE_C"]
+
+    # Converting the persisted changes back gives the levels; persisting again replaces the data
+    levels = convert_series("levels", codes=["PX_C", "RATE_C"], base=mixed_levels["PX"].iloc[0])
+    np.testing.assert_allclose(levels["PX_C"].dropna(), mixed_levels["PX"].iloc[1:])
+    # ... but derived changes are not levels
+    with pytest.raises(ValueError, match="PX_C, RATE_C"):
+        convert_series("changes", codes=["RATE_C", "PX_C"])
+    with pytest.raises(ValueError, match="PX_C"):
+        convert_series("rebased", codes=["PX", "PX_C"])
+    db.session.add(DataPoint(date=mixed_levels.index[-1].date() + pd.Timedelta(days=3), value=60.0,
+                             time_series=TimeSeries.query.filter_by(time_series_code="PX").one()))
+    db.session.commit()
+    convert_series("changes", codes=["PX"], persist=True)
+    assert TimeSeries.query.filter_by(time_series_code="PX_C").one().data_points[-1].value == pytest.approx(
+        60.0 / mixed_levels["PX"].iloc[-1] - 1
+    )
+    assert TimeSeries.query.count() == 6
+
+    rebased = convert_series("rebased", codes=["PX", "RATE"], persist=True, commit=False)
+    assert rebased["PX"].iloc[0] == 100.0
+    db.session.rollback()
+    assert TimeSeries.query.filter_by(time_series_code="PX_R").first() is None
+
+    # A series of another origin with a derived code is not overwritten
+    db.session.add(TimeSeries(name="Rates desk view", code="RATE_R", time_frequency="D"))
+    db.session.commit()
+    with pytest.raises(ValueError, match="RATE_R"):
+        convert_series("rebased", codes=["PX", "RATE"], persist=True)
+    db.session.rollback()
+    assert TimeSeries.query.filter_by(time_series_code="PX_R").first() is None
+
+    with pytest.raises(ValueError):
+        convert_series("returns", codes=["PX"])
+
+
+def test_persist_derived_long_names(app):
+    """
+    Test that derived names are truncated to fit the name column, and that derived levels
+    only convert to changes.
+    """
+    name = "N" * SeriesBase.__table__.c.name.type.length
+    ts = TimeSeries(name=name, code="LONG", time_frequency="D", delta_type="pct")
+    db.session.add_all([
+        ts,
+        DataPoint(date=datetime.date(2024, 1, 1), value=0.01, time_series=ts),
+        DataPoint(date=datetime.date(2024, 1, 2), value=0.02, time_series=ts),
+    ])
+    db.session.commit()
+
+    convert_series("levels", codes=["LONG"], persist=True)
+    derived = TimeSeries.query.filter_by(time_series_code="LONG_L").one()
+    assert len(derived.name) == len(name) and derived.name.endswith("N (levels)")
+    convert_series("levels", codes=["LONG"], persist=True)
+    assert TimeSeries.query.count() == 2
+    with pytest.raises(ValueError, match="LONG_L"):
+        convert_series("levels", codes=["LONG_L"])
+    assert convert_series("changes", codes=["LONG_L"])["LONG_L"].iloc[-1] == pytest.approx(0.02)
@@ -0,0 +1,130 @@
+# tests/test_correlation_store.py
+
+import datetime
+import pytest
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app.analytics import load_panel
+from app.correlation_store import CorrelationStore, get_correlation_store, clear_correlation_stores
+from app import db
+
+
+@pytest.fixture
+def risk_group(app):
+    """
+    Fixture storing a group of 5 correlated return series, one starting later and one with gaps.
+    """
+    rng = np.random.default_rng(3)
+    index = pd.bdate_range("2024-01-01", periods=80)
+    common = rng.normal(0, 0.01, 80)
+    group = SeriesGroup(name="Risk", series_group_code="RISK")
+    db.session.add(group)
+    for i in range(5):
+        values = pd.Series(0.5 * common + rng.normal(0.001 * i, 0.01, 80), index=index)
+        if i == 1:
+            values = values.iloc[30:]
+        if i == 3:
+            values = values.drop(index[[10, 11, 50]])
+        ts = TimeSeries(name=f"Asset {i}", code=f"A{i}", time_frequency="D")
+        db.session.add(ts)
+        group.series.append(ts)
+        db.session.add_all([DataPoint(date=date.date(), value=value, time_series=ts) for date, value in values.items()])
+    db.session.commit()
+    clear_correlation_stores()
+    return group
+
+
+def _assert_matches_panel(store):
+    panel, _ = load_panel(series_group="RISK")
+    pd.testing.assert_frame_equal(store.correlation(refresh=False), panel.corr(), check_names=False)
+    pd.testing.assert_frame_equal(store.covariance(refresh=False), panel.cov(), check_names=False)
+
+
+def test_store_updates_from_new_points(risk_group):
+    """
+    Test that new dates, late points and revisions update the sums to a full recompute.
+    """
+    store = get_correlation_store(series_group="RISK")
+    assert get_correlation_store(series_group=risk_group) is store
+    assert store.refresh() == "built"
+    _assert_matches_panel(store)
+    assert store.refresh() == "current"
+
+    a0, a1, a3 = (TimeSeries.query.filter_by(time_series_code=code).one() for code in ["A0", "A1", "A3"])
+    new_date = datetime.date(2024, 4, 22)
+    a0.upsert_data_points([DataPoint(date=new_date, value=0.02)])
+    a1.upsert_data_points([
+        DataPoint(date=new_date, value=0.01),
+        # Late point on a date the series did not have
+        DataPoint(date=datetime.date(2024, 1, 3), value=-0.015),
+    ])
+    # Revision of an existing date, released later
+    a3.upsert_data_points([DataPoint(date=datetime.date(2024, 2, 1), value=0.03, date_release=datetime.date(2024, 3, 1))])
+    db.session.commit()
+    assert store.refresh() == "updated"
+    _assert_matches_panel(store)
+    assert store.correlation().shape == (5, 5)
+
+
+def test_store_rebuilds_on_other_changes(risk_group):
+    """
+    Test that in-place updates, deletions and changes of the universe rebuild the sums.
+    """
+    store = CorrelationStore(codes=["A0", "A2", "A3"], min_periods=30)
+    store.refresh()
+    point = DataPoint.query.join(TimeSeries).filter(TimeSeries.time_series_code == "A2").first()
+    point.value = 0.5
+    db.session.commit()
+    assert store.refresh() == "built"
+    panel, _ = load_panel(codes=["A0", "A2", "A3"])
+    pd.testing.assert_frame_equal(store.correlation(refresh=False), panel.corr(min_periods=30), check_names=False)
+
+    db.session.delete(point)
+    db.session.commit()
+    assert store.refresh() == "built"
+
+    group_store = get_correlation_store(series_group="RISK")
+    group_store.refresh()
+    ts = TimeSeries(name="Asset 5", code="A5", time_frequency="D")
+    risk_group.series.append(ts)
+    db.session.add(DataPoint(date=datetime.date(2024, 1, 2), value=0.01, time_series=ts))
+    db.session.commit()
+    assert group_store.refresh() == "built"
+    assert list(group_store.correlation().index) == ["A0", "A1", "A2", "A3", "A4", "A5"]
+
+    with pytest.raises(ValueError):
+        CorrelationStore()
+
+
+def test_refresh_without_aggregates(risk_group):
+    """
+    Test that refreshing a current store reads no aggregate over the data points, and that a
+    point moved from one series to another is seen by the stores of both.
+    """
+    store = get_correlation_store(series_group="RISK")
+    store.refresh()
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+
+    event.listen(db.engine, 'before_cursor_execute', record_statement)
+    try:
+        assert store.refresh() == "current"
+        store.correlation()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record_statement)
+    assert not [statement for statement in statements if "count(" in statement or "sum(" in statement]
+
+    stores = [CorrelationStore(codes=["A0", "A4"]), CorrelationStore(codes=["A0", "A2"])]
+    for moved_store in stores:
+        moved_store.refresh()
+    point = DataPoint.query.join(TimeSeries).filter(TimeSeries.time_series_code == "A4").first()
+    point.time_series = TimeSeries.query.filter_by(time_series_code="A2").one()
+    point.date = datetime.date(2023, 12, 29)
+    db.session.commit()
+    for moved_store in stores:
+        assert moved_store.refresh() == "built"
+        panel, _ = load_panel(codes=moved_store.codes)
+        pd.testing.assert_frame_equal(moved_store.covariance(refresh=False), panel.cov(), check_names=False)
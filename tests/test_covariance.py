@@ -0,0 +1,162 @@
+# tests/test_covariance.py
+
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+from app.models import TimeSeries, DataPoint
+from app.search_cache import catalog_version
+from app.covariance import (
+    pairwise_sums, covariance_from_sums, correlation_from_sums, covariance_matrix,
+    estimate_covariance, nearest_psd, covariance_cache
+)
+from app import db
+
+
+@pytest.fixture
+def staggered_panel():
+    """
+    Fixture returning a correlated panel whose columns start on different dates, with gaps.
+    """
+    rng = np.random.default_rng(3)
+    factor = rng.normal(0, 0.02, (400, 1))
+    panel = pd.DataFrame(
+        factor + rng.normal(0.001, 0.01, (400, 7)),
+        columns=[f"A{i}" for i in range(7)],
+        index=pd.bdate_range("2020-01-01", periods=400),
+    )
+    for i in range(7):
+        panel.iloc[:40 * i, i] = np.nan
+    panel.iloc[rng.integers(0, 400, 60), 2] = np.nan
+    panel.iloc[:, 6] = np.nan
+    panel.iloc[395:, 6] = [0.01, 0.02, -0.01, 0.0, 0.01]
+    return panel
+
+
+def test_pairwise_covariance_matches_pandas(staggered_panel):
+    """
+    Test the blocked pairwise-complete covariance and correlation against pandas.
+    """
+    panel = staggered_panel
+    for block_size in [1, 3, 1024]:
+        covariance = covariance_matrix(panel, min_periods=10, block_size=block_size)
+        pd.testing.assert_frame_equal(covariance, panel.cov(min_periods=10))
+    assert covariance.attrs['shrinkage'] == 0.0
+
+    # Sums of two date ranges add up to the sums of the whole panel
+    values = panel.to_numpy()
+    first, second = pairwise_sums(values[:200]), pairwise_sums(values[200:])
+    sums = type(first)(*(a + b for a, b in zip(first, second)))
+    np.testing.assert_allclose(covariance_from_sums(sums), panel.cov().to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(correlation_from_sums(sums), panel.corr().to_numpy(), rtol=1e-9)
+
+
+def test_shrinkage_on_complete_data(staggered_panel):
+    """
+    Test Ledoit-Wolf against scikit-learn and constant correlation against its textbook formula.
+    """
+    panel = staggered_panel.iloc[250:, :6].dropna()
+    x = panel.to_numpy()
+    t, n = x.shape
+
+    sklearn_covariance = pytest.importorskip("sklearn.covariance")
+    expected, expected_shrinkage = sklearn_covariance.ledoit_wolf(x)
+    ledoit_wolf = covariance_matrix(panel, method="ledoit_wolf", block_size=4)
+    np.testing.assert_allclose(ledoit_wolf.to_numpy(), expected, rtol=1e-9)
+    assert ledoit_wolf.attrs['shrinkage'] == pytest.approx(expected_shrinkage)
+
+    # Ledoit and Wolf (2003), "Honey, I shrunk the sample covariance matrix"
+    y = x - x.mean(axis=0)
+    sample = y.T @ y / t
+    sd = np.sqrt(np.diag(sample))
+    r_bar = ((sample / np.outer(sd, sd)).sum() - n) / (n * (n - 1))
+    target = r_bar * np.outer(sd, sd)
+    np.fill_diagonal(target, np.diag(sample))
+    pi_matrix = (y ** 2).T @ (y ** 2) / t - sample ** 2
+    theta = (y ** 3).T @ y / t - np.diag(sample)[:, None] * sample
+    rho_off = r_bar / 2 * (np.outer(1 / sd, sd) * theta + np.outer(sd, 1 / sd) * theta.T)
+    np.fill_diagonal(rho_off, 0)
+    rho = np.trace(pi_matrix) + rho_off.sum()
+    gamma = ((target - sample) ** 2).sum()
+    shrinkage = max(0, min(1, (pi_matrix.sum() - rho) / gamma / t))
+
+    constant_correlation = covariance_matrix(panel, method="constant_correlation", block_size=4)
+    assert constant_correlation.attrs['shrinkage'] == pytest.approx(shrinkage)
+    np.testing.assert_allclose(
+        constant_correlation.to_numpy(), shrinkage * target + (1 - shrinkage) * sample, rtol=1e-9
+    )
+
+
+def test_shrinkage_and_repair_with_missing_values(staggered_panel):
+    """
+    Test that shrinkage handles staggered histories and that the repaired matrix is PSD.
+    """
+    panel = staggered_panel
+    for method in ["ledoit_wolf", "constant_correlation"]:
+        covariance = covariance_matrix(panel, method=method, min_periods=5)
+        assert 0 < covariance.attrs['shrinkage'] < 1
+        assert not covariance.isna().any().any()
+        np.testing.assert_allclose(covariance.to_numpy(), covariance.to_numpy().T)
+
+    # Pairwise estimates need not be PSD; the repair keeps the variances
+    broken = np.array([[1.0, 0.9, -0.9], [0.9, 1.0, 0.9], [-0.9, 0.9, 2.0]])
+    repaired = nearest_psd(broken)
+    assert np.linalg.eigvalsh(repaired).min() > -1e-12
+    np.testing.assert_allclose(np.diag(repaired), np.diag(broken))
+    np.testing.assert_array_equal(nearest_psd(np.eye(2)), np.eye(2))
+    sample = covariance_matrix(panel, min_periods=10, psd=True)
+    assert np.linalg.eigvalsh(sample.to_numpy()).min() > -1e-12
+
+
+def test_estimate_covariance_from_stored_series(app, staggered_panel):
+    """
+    Test the covariance of stored series with a window, as_of and the cache.
+    """
+    panel = staggered_panel.iloc[:, :3]
+    for code in panel.columns:
+        ts = TimeSeries(name=code, code=code)
+        db.session.add(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts)
+            for date, value in panel[code].dropna().items()
+        ])
+    db.session.commit()
+    covariance_cache.clear()
+
+    covariance = estimate_covariance(codes=["A0", "A1", "A2"], window=100)
+    np.testing.assert_allclose(covariance.to_numpy(), panel.iloc[-100:].cov().to_numpy())
+    assert estimate_covariance(codes=["A0", "A1", "A2"], window=100) is covariance
+    assert covariance_cache.stats()['hits'] == 1
+    # Catalog changes (e.g. a renamed series) do not evict covariances
+    catalog_version.bump()
+    assert estimate_covariance(codes=["A0", "A1", "A2"], window=100) is covariance
+
+    as_of = estimate_covariance(codes=["A0", "A1"], as_of=panel.index[199].date())
+    np.testing.assert_allclose(as_of.to_numpy(), panel.iloc[:200, :2].cov().to_numpy())
+
+    # New data points give a new estimate
+    ts = TimeSeries.query.filter_by(time_series_code="A0").one()
+    db.session.add(DataPoint(date=datetime.date(2030, 1, 1), value=1.0, time_series=ts))
+    db.session.commit()
+    updated = estimate_covariance(codes=["A0", "A1", "A2"], window=100)
+    assert updated is not covariance
+    assert updated.loc["A0", "A0"] > covariance.loc["A0", "A0"]
+
+    # Points updated in place too, through the recorded data point changes
+    point = DataPoint.query.filter_by(time_series_id=ts.id, date=datetime.date(2030, 1, 1)).one()
+    point.value = 2.0
+    db.session.commit()
+    revised = estimate_covariance(codes=["A0", "A1", "A2"], window=100)
+    assert revised is not updated
+    assert revised.loc["A0", "A0"] > updated.loc["A0", "A0"]
+    # ... while updates of series outside the universe keep the estimate
+    other = TimeSeries(name="Other", code="OTHER")
+    db.session.add(DataPoint(date=datetime.date(2030, 1, 1), value=1.0, time_series=other))
+    db.session.commit()
+    cached = estimate_covariance(codes=["A0", "A1", "A2"], window=100)
+    other.data_points[0].value = 3.0
+    db.session.commit()
+    assert estimate_covariance(codes=["A0", "A1", "A2"], window=100) is cached
+
+    with pytest.raises(ValueError):
+        estimate_covariance(codes=["A0"], method="nope")
@@ -0,0 +1,155 @@
+# tests/test_derived.py
+
+import datetime
+import pytest
+import numpy as np
+import pandas as pd
+from app.models import TimeSeries, DataPoint
+from app.derived import DerivedSeriesGraph
+from app import db
+
+
+@pytest.fixture
+def rates_and_equities(app):
+    """
+    Fixture storing two yields, an index and a series whose code is not an identifier.
+    """
+    rng = np.random.default_rng(8)
+    index = pd.bdate_range("2025-01-01", periods=60)
+    frame = pd.DataFrame({
+        "UST10Y": 4.2 + np.cumsum(rng.normal(0, 0.03, 60)),
+        "UST2Y": 3.9 + np.cumsum(rng.normal(0, 0.03, 60)),
+        "SPX": 5000 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))),
+        "EU-STOXX": 500 * np.exp(np.cumsum(rng.normal(0, 0.01, 60))),
+    }, index=index)
+    frame.iloc[[5, 6], 1] = np.nan
+    for code in frame.columns:
+        ts = TimeSeries(name=code, code=code, time_frequency="D")
+        db.session.add(ts)
+        db.session.add_all([DataPoint(date=date.date(), value=value, time_series=ts) for date, value in frame[code].dropna().items()])
+    db.session.commit()
+    frame.index.name = "date"
+    return frame
+
+
+def test_evaluate_expressions(rates_and_equities):
+    """
+    Test that expressions evaluate as the same pandas code on the stored series.
+    """
+    frame = rates_and_equities
+    graph = DerivedSeriesGraph()
+    spread = frame["UST10Y"] - frame["UST2Y"]
+    pd.testing.assert_series_equal(
+        graph.evaluate("(UST10Y - UST2Y).rolling(20).mean()"), spread.rolling(20).mean().dropna(),
+        check_names=False, check_freq=False,
+    )
+    graph.register("SPREAD", "UST10Y-UST2Y")
+    assert graph.register("SPREAD_Z", "zscore(SPREAD, 10)") == "zscore((UST10Y - UST2Y), window=10)"
+    expected = (spread - spread.rolling(10).mean()) / spread.rolling(10).std()
+    pd.testing.assert_series_equal(graph.evaluate("SPREAD_Z"), expected.dropna(), check_names=False, check_freq=False)
+    assert graph.codes("SPREAD_Z") == ["UST10Y", "UST2Y"]
+
+    ratio = graph.evaluate('log(SPX / series("EU-STOXX")).diff(2) * 100 + -1', start="2025-02-03", end="2025-02-28")
+    expected = np.log(frame["SPX"] / frame["EU-STOXX"]).diff(2) * 100 - 1
+    pd.testing.assert_series_equal(ratio, expected["2025-02-03":"2025-02-28"], check_names=False, check_freq=False)
+
+    panel = graph.to_dataframe(["SPREAD", "SPX.pct_change()", "2 ** 3"])
+    assert list(panel.columns) == ["SPREAD", "SPX.pct_change()", "2 ** 3"]
+    assert (panel["2 ** 3"] == 8).all() and np.isnan(panel["SPREAD"].iloc[5])
+
+
+def test_shared_nodes_and_incremental_recomputation(rates_and_equities):
+    """
+    Test that shared subexpressions are computed once and only nodes of changed inputs again.
+    """
+    graph = DerivedSeriesGraph()
+    graph.register("SPREAD_MA", "(UST10Y - UST2Y).rolling(5).mean()")
+    graph.register("CARRY", "(UST10Y - UST2Y) / SPX.rolling(5).std()")
+
+    graph.to_dataframe(["SPREAD_MA", "CARRY"])
+    # Leaves UST10Y, UST2Y, SPX; spread, its rolling mean, SPX rolling std and the ratio
+    assert (graph.misses, graph.hits) == (7, 1)
+    graph.reset_stats()
+    graph.to_dataframe(["SPREAD_MA", "CARRY"])
+    assert (graph.misses, graph.hits) == (0, 2)
+
+    spx = TimeSeries.query.filter_by(time_series_code="SPX").one()
+    spx.upsert_data_points([DataPoint(date=datetime.date(2025, 3, 26), value=5100.0)])
+    db.session.commit()
+    graph.reset_stats()
+    carry = graph.evaluate("CARRY")
+    # SPX, its rolling std and the ratio are recomputed; the spread is reused
+    assert (graph.misses, graph.hits) == (3, 1)
+    assert graph.evaluate("SPREAD_MA").index[-1] == pd.Timestamp("2025-03-25")
+    assert carry.index[-1] == pd.Timestamp("2025-03-25")
+
+    # Data points added through the ORM are seen too
+    db.session.add(DataPoint(date=datetime.date(2025, 3, 26), value=4.5, time_series=TimeSeries.query.filter_by(time_series_code="UST10Y").one()))
+    db.session.add(DataPoint(date=datetime.date(2025, 3, 26), value=4.0, time_series=TimeSeries.query.filter_by(time_series_code="UST2Y").one()))
+    db.session.commit()
+    assert graph.evaluate("SPREAD_MA").index[-1] == pd.Timestamp("2025-03-26")
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "UST10Y.to_csv('x')",
+    "UST10Y.rolling(0).mean()",
+    "UST10Y.rolling(5).apply(print)",
+    "UST10Y[0]",
+    "lambda: 1",
+    "UST10Y.shift(UST2Y)",
+    "UST10Y +",
+    "'text'",
+])
+def test_rejected_expressions(rates_and_equities, expression):
+    """
+    Test that expressions outside the whitelist are rejected.
+    """
+    with pytest.raises(ValueError):
+        DerivedSeriesGraph().evaluate(expression)
+
+
+def test_unknown_code_and_name(rates_and_equities):
+    """
+    Test that unknown codes and invalid names raise ValueError.
+    """
+    graph = DerivedSeriesGraph()
+    with pytest.raises(ValueError):
+        graph.evaluate("UST10Y - UST30Y")
+    with pytest.raises(ValueError):
+        graph.register("not a name", "UST10Y")
+
+
+def test_constant_arithmetic_is_bounded(rates_and_equities):
+    """
+    Test that numbers are floats, so that huge powers overflow instead of hanging.
+    """
+    graph = DerivedSeriesGraph()
+    panel = graph.to_dataframe(["9 ** 9 ** 9", "1 / 0", "UST10Y ** 9 ** 9"])
+    assert np.isinf(panel["9 ** 9 ** 9"]).all() and np.isinf(panel["1 / 0"]).all()
+    assert np.isinf(panel["UST10Y ** 9 ** 9"]).all()
+    with pytest.raises(ValueError):
+        graph.evaluate("1" + "0" * 400)
+
+
+def test_redefinition_updates_dependents(rates_and_equities):
+    """
+    Test that redefining a derived series redefines the ones using it, and that cycles are rejected.
+    """
+    frame = rates_and_equities
+    graph = DerivedSeriesGraph()
+    graph.register("SPREAD", "UST10Y - UST2Y")
+    graph.register("SPREAD_MA", "SPREAD.rolling(5).mean()")
+    graph.register("SIGNAL", "SPREAD_MA - SPREAD")
+    graph.register("SPREAD", "UST10Y - SPX")
+
+    spread = frame["UST10Y"] - frame["SPX"]
+    expected = spread.rolling(5).mean() - spread
+    pd.testing.assert_series_equal(graph.evaluate("SIGNAL"), expected.dropna(), check_names=False, check_freq=False)
+    assert graph.codes("SIGNAL") == ["SPX", "UST10Y"]
+
+    with pytest.raises(ValueError):
+        graph.register("SPREAD", "SIGNAL * 2")
+    with pytest.raises(ValueError):
+        graph.register("SPREAD", "SPREAD + 1")
+    assert graph.codes("SPREAD_MA") == ["SPX", "UST10Y"]
@@ -0,0 +1,86 @@
+# tests/test_factor_returns_generator.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from app.models import SeriesGroup, TimeSeries
+from app.analytics import load_panel
+from app.series import SeriesSearcher
+from app.generators import FactorReturnsGenerator
+from app import db
+
+
+@pytest.fixture
+def generator():
+    """
+    Fixture returning a small generator with tiles smaller than the universe.
+    """
+    return FactorReturnsGenerator(
+        n_assets=300, n_factors=4, periods=400, seed=9, asset_block=64, date_block=50, code_prefix="F"
+    )
+
+
+def test_chunks_do_not_change_values(generator):
+    """
+    Test that chunks of columns or dates assemble into the same panel, for the same seed.
+    """
+    full = generator.to_dataframe()
+    assert full.shape == (400, 300)
+    assert list(full.columns[:2]) == ["F000", "F001"]
+    by_columns = pd.concat(list(generator.chunks("columns", chunk_size=70)), axis=1)
+    by_dates = pd.concat(list(generator.chunks("dates", chunk_size=33)))
+    pd.testing.assert_frame_equal(by_columns, full)
+    pd.testing.assert_frame_equal(by_dates, full)
+    again = FactorReturnsGenerator(
+        n_assets=300, n_factors=4, periods=400, seed=9, asset_block=64, date_block=50, code_prefix="F"
+    )
+    pd.testing.assert_frame_equal(again.to_dataframe(), full)
+
+    # Missing histories: NaN before the start of every asset, complete after
+    first_valid = full.notna().idxmax().map(full.index.get_loc).to_numpy()
+    np.testing.assert_array_equal(first_valid, generator.start_rows)
+    assert 0 < (generator.start_rows > 0).mean() < 0.6
+    assert full.notna().sum().sum() == (400 - generator.start_rows).sum()
+
+    # The factors drive the common part: assets are positively correlated through the market
+    assert full.iloc[:, :50].corr().to_numpy()[np.triu_indices(50, 1)].mean() > 0.1
+
+    with pytest.raises(ValueError):
+        FactorReturnsGenerator(n_assets=10, code_prefix="TOOLONGPREFIX")
+    with pytest.raises(ValueError):
+        list(generator.chunks("rows"))
+
+
+def test_to_csv(generator, tmp_path):
+    """
+    Test that the chunks written to disk read back as the panel.
+    """
+    paths = generator.to_csv(str(tmp_path), axis="columns", chunk_size=128)
+    assert len(paths) == 3
+    read = pd.concat([pd.read_csv(path, index_col="date", parse_dates=True) for path in paths], axis=1)
+    pd.testing.assert_frame_equal(read, generator.to_dataframe(), check_freq=False, check_names=False)
+
+
+def test_ingest(app, generator):
+    """
+    Test the bulk ingestion into a SeriesGroup, with statistics and search kept current.
+    """
+    group = SeriesGroup(name="Synthetic", series_group_code="SYNTH")
+    db.session.add(group)
+    db.session.commit()
+    n_points = generator.ingest(chunk_size=100, series_group="SYNTH")
+
+    full = generator.to_dataframe()
+    assert n_points == full.notna().sum().sum()
+    assert TimeSeries.query.count() == 300
+    assert group.stats.member_count == 300
+    assert group.stats.min_date == full.index[0].date()
+    panel, metadata = load_panel(codes=["F000", "F123", "F299"])
+    expected = full[["F000", "F123", "F299"]].dropna(how="all")
+    np.testing.assert_array_equal(panel.to_numpy(), expected.to_numpy())
+    assert (metadata["time_frequency"] == "D").all()
+    assert SeriesSearcher.search("F123", full_text=True)["code"].tolist() == ["F123"]
+    assert SeriesSearcher.search("F123", use_index=True, partial=False)["code"].tolist() == ["F123"]
+
+    with pytest.raises(ValueError):
+        generator.ingest(series_group="NOPE")
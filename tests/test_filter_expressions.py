@@ -0,0 +1,116 @@
+# tests/test_filter_expressions.py
+
+import pytest
+import datetime
+from sqlalchemy import event
+from app.models import TimeSeries, SeriesGroup, TimeSeriesType, DataPoint
+from app.series import SeriesSearcher
+from app.filter_expressions import parse_filter_expression, FilterTerm
+from app import db
+
+
+@pytest.fixture
+def catalog_for_filters(app, populate_series_for_search):
+    """
+    Fixture adding frequencies, a type, descriptions, data points and group memberships
+    to the search catalog.
+    """
+    ts1 = TimeSeries.query.filter_by(name="TS_First").one()
+    ts2 = TimeSeries.query.filter_by(name="TS_Second").one()
+    ts3 = TimeSeries.query.filter_by(name="My Timeseries").one()
+    sg1 = SeriesGroup.query.filter_by(name="SG_Beta").one()
+    sg2 = SeriesGroup.query.filter_by(name="SG_Alpha").one()
+    ts1.time_frequency = "D"
+    ts1.description = "Investment grade credit spread"
+    ts1.time_series_type = TimeSeriesType.query.filter_by(name="BasicType").one()
+    ts2.delta_type = "abs"
+    sg1.series.append(ts1)
+    sg1.series.append(sg2)
+    sg2.series.append(ts3)
+    db.session.add_all([
+        DataPoint(date=datetime.date(1999, 12, 31), value=1.0, time_series=ts1),
+        DataPoint(date=datetime.date(2024, 1, 31), value=2.0, time_series=ts3),
+    ])
+    db.session.commit()
+
+
+def names(df):
+    return [] if df is None else sorted(df['name'])
+
+
+def test_parse_filter_expression():
+    """
+    Test the tokenization, aliases, negation and validation of filter expressions.
+    """
+    terms = parse_filter_expression('freq:m kw:equity -group:"US EQ" updated>2026-01-01 "credit spread" rates')
+    assert terms == [
+        FilterTerm('freq', ':', 'M', False),
+        FilterTerm('keyword', ':', 'equity', False),
+        FilterTerm('group', ':', 'US EQ', True),
+        FilterTerm('updated', '>', datetime.date(2026, 1, 1), False),
+        FilterTerm(None, None, 'credit spread', False),
+        FilterTerm(None, None, 'rates', False),
+    ]
+    assert parse_filter_expression("  ") == []
+    for expression in ['color:red', 'freq:X', 'freq>M', 'updated>soon', '"credit spread', 'type:other']:
+        with pytest.raises(ValueError):
+            parse_filter_expression(expression)
+
+
+def test_filter_fields(app, catalog_for_filters):
+    """
+    Test each field against the catalog.
+    """
+    assert names(SeriesSearcher.filter("freq:D")) == ["TS_First"]
+    assert names(SeriesSearcher.filter("freq:M")) == ["My Timeseries", "TS_Second"]
+    assert names(SeriesSearcher.filter("-freq:M")) == ["Alpha Finance Group", "SG_Alpha", "SG_Beta", "TS_First"]
+    assert names(SeriesSearcher.filter("delta:abs")) == ["TS_Second"]
+    assert names(SeriesSearcher.filter("tstype:basictype")) == ["TS_First"]
+    assert names(SeriesSearcher.filter("type:sg keyword:finance")) == ["Alpha Finance Group", "SG_Beta"]
+    assert names(SeriesSearcher.filter("code:sg00*")) == ["Alpha Finance Group", "SG_Alpha", "SG_Beta"]
+    assert names(SeriesSearcher.filter("code:abc123")) == ["TS_First"]
+    assert names(SeriesSearcher.filter("name:series")) == ["My Timeseries"]
+    # Nested membership: SG_Alpha and its member are below SG_Beta
+    assert names(SeriesSearcher.filter("group:SG001")) == ["My Timeseries", "SG_Alpha", "TS_First"]
+    assert names(SeriesSearcher.filter("group:SG002")) == ["My Timeseries"]
+    assert names(SeriesSearcher.filter("start<2000-01-01")) == ["SG_Beta", "TS_First"]
+    assert names(SeriesSearcher.filter("end:2024-01-31")) == ["My Timeseries", "SG_Alpha", "SG_Beta"]
+    today = datetime.date.today()
+    assert len(SeriesSearcher.filter(f"updated>={today - datetime.timedelta(days=1)}")) == 6
+    assert SeriesSearcher.filter(f"created>{today + datetime.timedelta(days=1)}") is None
+
+
+def test_filter_text_terms_single_statement(app, catalog_for_filters):
+    """
+    Test text terms (name, code, description, keywords) combined with field terms,
+    ranked by text matches and compiled to a single statement.
+    """
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statements)
+    try:
+        df = SeriesSearcher.filter('"credit spread" freq:D group:SG001 start<2000-01-01')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statements)
+    assert len(statements) == 1
+    assert list(df['name']) == ["TS_First"]
+    assert list(df['score']) == [1]
+
+    df = SeriesSearcher.filter("investment -type:ts")
+    assert list(df['name']) == ["SG_Alpha"]
+    df = SeriesSearcher.filter("finance alpha", limit_rows=1)
+    assert list(df['name']) == ["Alpha Finance Group"]
+    assert list(df['score']) == [4]
+    assert len(SeriesSearcher.filter("")) == 6
+
+
+def test_filter_negated_text_terms(app, populate_series_for_search):
+    """
+    Test that negated text terms keep series whose code or description is NULL.
+    """
+    df = SeriesSearcher.filter("-Alpha")
+    assert sorted(df['name']) == sorted(["TS_First", "TS_Second", "My Timeseries", "SG_Beta"])
+    df = SeriesSearcher.filter("-Alpha -type:ts")
+    assert list(df['name']) == ["SG_Beta"]
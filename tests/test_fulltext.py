@@ -0,0 +1,190 @@
+# tests/test_fulltext.py
+
+import pytest
+import datetime
+from sqlalchemy import text, select, event, func
+from app.models import TimeSeries, DataPoint
+from app.series import SeriesSearcher
+from app.fulltext import (
+    SEARCH_TABLE, SEARCH_COLUMNS, rebuild_search_index, series_trigram, trigrams, full_text_matches,
+    _document_expression, _match_expression
+)
+from app import db
+
+
+def indexed_rows():
+    return db.session.execute(
+        text(f"SELECT rowid, name, code, keywords FROM {SEARCH_TABLE} ORDER BY rowid")
+    ).all()
+
+
+def test_index_follows_catalog_changes(app, populate_series_for_search):
+    """
+    Test that inserts, updates, keyword changes and deletes are reflected in the index.
+    """
+    rows = indexed_rows()
+    assert len(rows) == 6, "Every TimeSeries and SeriesGroup should be indexed."
+    ts1 = TimeSeries.query.filter_by(name="TS_First").one()
+    row = [r for r in rows if r[0] == ts1.id][0]
+    assert row[1] == "TS_First"
+    assert row[2] == "ABC123"
+    assert set(row[3].split(", ")) == {"Finance", "Investment"}
+
+    ts1.name = "Renamed Series"
+    ts1.add_keyword("Rates")
+    db.session.commit()
+    row = [r for r in indexed_rows() if r[0] == ts1.id][0]
+    assert row[1] == "Renamed Series"
+    assert "Rates" in row[3]
+
+    db.session.delete(ts1)
+    db.session.commit()
+    assert ts1.id not in [r[0] for r in indexed_rows()]
+
+
+def test_full_text_search_ranked(app, populate_series_for_search):
+    """
+    Test full-text search output, prefix matching and relevance ordering.
+    """
+    df = SeriesSearcher.search("Finance", full_text=True)
+    assert df is not None
+    assert set(df['name']) == {"TS_First", "SG_Beta", "Alpha Finance Group"}
+    assert list(df.columns) == ["type", "id", "name", "code", "description", "keywords", "score"]
+    assert df.iloc[0]['name'] == "Alpha Finance Group", "Name and keyword matches should rank first."
+    assert df['score'].is_monotonic_decreasing
+
+    # Prefix matching only when partial=True
+    assert set(SeriesSearcher.search("Invest", full_text=True)['name']) == {"TS_First", "My Timeseries", "SG_Alpha"}
+    assert SeriesSearcher.search("Invest", partial=False, full_text=True) is None
+
+    # Field and type flags restrict the match
+    df_code = SeriesSearcher.search(
+        "SG001", search_by_name=False, search_by_keyword=False, full_text=True
+    )
+    assert list(df_code['code']) == ["SG001"]
+    df_ts = SeriesSearcher.search("Finance", search_series_group=False, full_text=True)
+    assert set(df_ts['type']) == {"TimeSeries"}
+    assert len(SeriesSearcher.search("Finance", limit_rows=1, full_text=True)) == 1
+
+
+def test_full_text_search_description_and_rebuild(app, populate_series_for_search):
+    """
+    Test that descriptions are indexed and that the index can be rebuilt from scratch.
+    """
+    ts = TimeSeries(name="TS_Desc", code="DESC1", description="Investment grade credit spread")
+    ts.save()
+    df = SeriesSearcher.search("credit spread", full_text=True)
+    assert list(df['name']) == ["TS_Desc"]
+
+    db.session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    db.session.commit()
+    assert SeriesSearcher.search("credit", full_text=True) is None
+    rebuild_search_index()
+    assert len(indexed_rows()) == 7
+    assert list(SeriesSearcher.search("credit", full_text=True)['name']) == ["TS_Desc"]
+
+
+def test_trigram_index_follows_catalog(app, populate_series_for_search):
+    """
+    Test that the trigram side table covers names and codes and follows renames.
+    """
+    ts1 = TimeSeries.query.filter_by(name="TS_First").one()
+    rows = db.session.execute(
+        select(series_trigram.c.field, series_trigram.c.trigram)
+        .where(series_trigram.c.seriesbase_id == ts1.id)
+    ).all()
+    assert set(rows) == (
+        {("name", t) for t in trigrams("TS_First")} | {("code", t) for t in trigrams("ABC123")}
+    )
+
+    ts1.time_series_code = "XYZ999"
+    db.session.commit()
+    codes = db.session.execute(
+        select(series_trigram.c.trigram)
+        .where(series_trigram.c.seriesbase_id == ts1.id, series_trigram.c.field == "code")
+    ).scalars().all()
+    assert set(codes) == {"xyz", "yz9", "z99", "999"}
+
+
+def test_partial_search_uses_trigram_candidates(app, populate_series_for_search):
+    """
+    Test that partial searches give the same answers through the trigram index,
+    including case-insensitive matches, trigrams out of order and short texts.
+    """
+    df = SeriesSearcher.search("c12", search_by_name=False, search_by_keyword=False)
+    assert list(df['code']) == ["ABC123"]
+
+    df = SeriesSearcher.search("first", search_by_code=False, search_by_keyword=False)
+    assert list(df['name']) == ["TS_First"]
+
+    df = SeriesSearcher.search("s_s", search_by_code=False, search_by_keyword=False)
+    assert list(df['name']) == ["TS_Second"]
+
+    # Most trigrams of "seriies" are in "My Timeseries", but not all of them
+    df = SeriesSearcher.search("seriies", search_by_code=False, search_by_keyword=False)
+    assert df is None
+
+    # Every trigram of "tfirstf" is in "Firstfirst", but the text is not,
+    # so the ILIKE check on the trigram candidates rejects it
+    ts = TimeSeries(name="Firstfirst", code="FF1")
+    ts.save()
+    df = SeriesSearcher.search("tfirst", search_by_code=False, search_by_keyword=False)
+    assert list(df['name']) == ["Firstfirst"]
+    df = SeriesSearcher.search("tfirstf", search_by_code=False, search_by_keyword=False)
+    assert df is None
+
+    # Texts shorter than a trigram fall back to a plain ILIKE
+    df = SeriesSearcher.search("SG", search_by_name=False, search_by_keyword=False, search_time_series=False)
+    assert len(df) == 3
+
+
+def test_full_text_columns_restriction(app, populate_series_for_search):
+    """
+    Test the column restriction of full-text matches, including the PostgreSQL document.
+    """
+    df = SeriesSearcher.search("ABC123", full_text=True, search_by_code=False)
+    assert df is None
+    assert _document_expression(["name", "description", "code", "keywords"]) == "document"
+    assert _document_expression(["name", "keywords"]) == (
+        "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(keywords, ''))"
+    )
+    with pytest.raises(ValueError):
+        full_text_matches("x", columns=["name; DROP TABLE series_base"])
+
+
+def test_full_text_token_operator(app, populate_series_for_search):
+    """
+    Test that token_operator='and' requires every token in full-text searches.
+    """
+    df_or = SeriesSearcher.search("Finance Invest", full_text=True)
+    df_and = SeriesSearcher.search("Finance Invest", full_text=True, token_operator='and')
+    assert set(df_and['name']) == {"TS_First"}
+    assert set(df_and['name']) < set(df_or['name'])
+    assert SeriesSearcher.search("Finance Rates", full_text=True, token_operator='and') is None
+    assert _match_expression('postgresql', ['a', 'b'], True, SEARCH_COLUMNS, 'and') == "(a:*) & (b:*)"
+    with pytest.raises(ValueError):
+        SeriesSearcher.search("Finance", full_text=True, token_operator='xor')
+
+
+def test_data_loads_do_not_resync_search_rows(app, populate_series_for_search):
+    """
+    Test that series changed only by their data points are not rewritten in the search index.
+    """
+    statements = []
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+
+    ts = TimeSeries.query.filter_by(name="TS_First").one()
+    event.listen(db.engine, 'before_cursor_execute', record_statement)
+    try:
+        ts.data_points.append(DataPoint(date=datetime.date(2024, 1, 2), value=1.0))
+        ts.date_update = func.now()
+        db.session.commit()
+        assert not [s for s in statements if SEARCH_TABLE in s or "series_trigram" in s]
+
+        ts.description = "Updated description"
+        db.session.commit()
+        assert [s for s in statements if SEARCH_TABLE in s]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record_statement)
+    assert list(SeriesSearcher.search("Updated", full_text=True)['name']) == ["TS_First"]
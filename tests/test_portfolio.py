@@ -0,0 +1,167 @@
+# tests/test_portfolio.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app.portfolio import FrontierOptimizer, efficient_frontier, FRONTIER_COLUMNS
+from app.covariance import covariance_matrix
+from app import db
+
+
+@pytest.fixture
+def factor_returns():
+    """
+    Fixture returning monthly returns of 12 assets driven by two factors.
+    """
+    rng = np.random.default_rng(5)
+    factors = rng.normal(0, 0.03, (240, 2))
+    returns = factors @ rng.normal(0.5, 0.5, (2, 12)) + rng.normal(0.006, 0.02, (240, 12))
+    return pd.DataFrame(
+        returns,
+        columns=[f"R{i:02d}" for i in range(12)],
+        index=pd.date_range("2000-01-31", periods=240, freq="ME"),
+    )
+
+
+def _reference_solution(mean, covariance, target, upper, group, group_bounds):
+    """
+    Cold-started SLSQP solution of one frontier point.
+    """
+    m, c = mean.to_numpy(), covariance.to_numpy()
+    n = len(m)
+    members = np.isin(mean.index, group)
+    constraints = [
+        {'type': 'eq', 'fun': lambda w: w.sum() - 1},
+        {'type': 'eq', 'fun': lambda w: m @ w - target},
+        {'type': 'ineq', 'fun': lambda w: w[members].sum() - group_bounds[0]},
+        {'type': 'ineq', 'fun': lambda w: group_bounds[1] - w[members].sum()},
+    ]
+    result = minimize(
+        lambda w: w @ c @ w, np.full(n, 1 / n), jac=lambda w: 2 * c @ w, method='SLSQP',
+        bounds=[(0, upper)] * n, constraints=constraints, options={'ftol': 1e-15, 'maxiter': 1000},
+    )
+    return result.x
+
+
+def test_frontier_matches_reference_solver(factor_returns):
+    """
+    Test the traced frontier against independent solves of each point, with box and group constraints.
+    """
+    mean, covariance = factor_returns.mean(), factor_returns.cov()
+    group = ["R00", "R01", "R02", "R03"]
+    optimizer = FrontierOptimizer(mean, covariance, upper=0.3, groups={"G": (group, 0.2, 0.4)})
+    summary, weights = optimizer.frontier(n_points=15)
+
+    assert list(summary.columns) == FRONTIER_COLUMNS
+    assert len(summary) == len(weights) == 15
+    assert (summary['solve_seconds'] >= 0).all()
+    assert summary['target_return'].is_monotonic_increasing
+    assert summary['volatility'].is_monotonic_increasing
+    np.testing.assert_allclose(summary['expected_return'], summary['target_return'], atol=1e-12)
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+    assert weights.min().min() >= 0 and weights.max().max() <= 0.3 + 1e-12
+    group_weights = weights[group].sum(axis=1)
+    assert group_weights.min() >= 0.2 - 1e-12 and group_weights.max() <= 0.4 + 1e-12
+
+    for k in [0, 5, 10, 14]:
+        target = summary['target_return'].iloc[k]
+        reference = _reference_solution(mean, covariance, target, 0.3, group, (0.2, 0.4))
+        w = weights.iloc[k].to_numpy()
+        # Exact solutions: never worse than the reference solver
+        assert w @ covariance.to_numpy() @ w <= reference @ covariance.to_numpy() @ reference * (1 + 1e-9)
+        np.testing.assert_allclose(w, reference, atol=1e-4)
+
+
+def test_frontier_end_points(factor_returns):
+    """
+    Test the minimum-variance and maximum-return ends of the frontier and `solve`.
+    """
+    mean, covariance = factor_returns.mean(), factor_returns.cov()
+    optimizer = FrontierOptimizer(mean, covariance, upper=0.5)
+    assert optimizer.max_return() == pytest.approx(np.sort(mean)[-2:].sum() / 2)
+
+    # Minimum variance portfolio: no other feasible portfolio has a lower variance
+    w = optimizer.solve(optimizer.min_variance_return()).to_numpy()
+    c = covariance.to_numpy()
+    result = minimize(
+        lambda x: x @ c @ x, np.full(12, 1 / 12), jac=lambda x: 2 * c @ x, method='SLSQP',
+        bounds=[(0, 0.5)] * 12, constraints=[{'type': 'eq', 'fun': lambda x: x.sum() - 1}],
+        options={'ftol': 1e-15},
+    )
+    assert w @ c @ w <= result.fun * (1 + 1e-9)
+
+    with pytest.raises(ValueError):
+        optimizer.solve(optimizer.max_return() * 1.1)
+    with pytest.raises(ValueError):
+        FrontierOptimizer(mean, covariance, lower=None)
+    with pytest.raises(ValueError):
+        FrontierOptimizer(mean, covariance, groups={"G": (["NOPE"], 0, 1)})
+
+
+def test_frontier_of_singular_covariance():
+    """
+    Test the frontier of more assets than observations (a singular covariance) against
+    independent solves of each point.
+    """
+    rng = np.random.default_rng(2)
+    returns = pd.DataFrame(rng.normal(0.01, 0.05, (25, 40)), columns=[f"A{i:02d}" for i in range(40)])
+    mean, covariance = returns.mean(), covariance_matrix(returns, psd=True)
+    summary, weights = FrontierOptimizer(mean, covariance, upper=0.1).frontier(n_points=20)
+
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0, atol=1e-12)
+    np.testing.assert_allclose(summary['expected_return'], summary['target_return'], atol=1e-12)
+    assert weights.min().min() >= 0 and weights.max().max() <= 0.1 + 1e-12
+    assert (summary['volatility'].diff().dropna() >= -1e-9).all()
+    c = covariance.to_numpy()
+    for k in [0, 7, 13, 19]:
+        reference = _reference_solution(mean, covariance, summary['target_return'].iloc[k], 0.1, [], (0, 1))
+        w = weights.iloc[k].to_numpy()
+        assert w @ c @ w <= reference @ c @ reference + 1e-8 * np.mean(np.diag(c))
+
+    # Nearly singular: two factors and a tiny idiosyncratic variance
+    loadings = rng.normal(size=(20, 2))
+    assets = [f"B{i:02d}" for i in range(20)]
+    covariance = pd.DataFrame(loadings @ loadings.T + 1e-9 * np.eye(20), index=assets, columns=assets)
+    mean = pd.Series(rng.normal(0.01, 0.01, 20), index=assets)
+    summary, weights = FrontierOptimizer(mean, covariance, upper=0.2).frontier(n_points=20)
+    np.testing.assert_allclose(weights.sum(axis=1), 1.0, atol=1e-12)
+    np.testing.assert_allclose(summary['expected_return'], summary['target_return'], atol=1e-12)
+
+
+def test_efficient_frontier_of_stored_series(app, factor_returns):
+    """
+    Test the frontier of stored series with bounds on a nested SeriesGroup.
+    """
+    returns = factor_returns.iloc[:, :6]
+    universe = SeriesGroup(name="Universe", series_group_code="UNIVERSE")
+    defensive = SeriesGroup(name="Defensive", series_group_code="DEFENSIVE")
+    utilities = SeriesGroup(name="Utilities", series_group_code="UTILITIES")
+    db.session.add_all([universe, defensive, utilities])
+    defensive.children.append(utilities)
+    for i, code in enumerate(returns.columns):
+        ts = TimeSeries(name=code, code=code, time_frequency="M")
+        db.session.add(ts)
+        universe.series.append(ts)
+        if i == 0:
+            defensive.series.append(ts)
+        elif i == 1:
+            utilities.series.append(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts) for date, value in returns[code].items()
+        ])
+    db.session.commit()
+
+    summary, weights = efficient_frontier(
+        series_group="UNIVERSE", group_bounds={"DEFENSIVE": (0.5, None)}, n_points=5
+    )
+    assert list(weights.columns) == list(returns.columns)
+    assert (weights[["R00", "R01"]].sum(axis=1) >= 0.5 - 1e-12).all()
+    optimizer = FrontierOptimizer(
+        returns.mean(), returns.cov(), groups={"D": (["R00", "R01"], 0.5, None)}
+    )
+    np.testing.assert_allclose(weights.to_numpy(), optimizer.frontier(n_points=5)[1].to_numpy(), atol=1e-10)
+
+    with pytest.raises(ValueError):
+        efficient_frontier(series_group="UNIVERSE", group_bounds={"NOPE": (0, 1)})
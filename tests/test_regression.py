@@ -0,0 +1,115 @@
+# tests/test_regression.py
+
+import pytest
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app.regression import factor_regression, rolling_factor_regression, run_factor_regression
+from app import db
+
+
+@pytest.fixture
+def funds_and_factors():
+    """
+    Fixture returning monthly returns of 3 factors and 30 funds with staggered starts and gaps.
+    """
+    rng = np.random.default_rng(21)
+    index = pd.date_range("2005-01-31", periods=180, freq="ME")
+    factors = pd.DataFrame(rng.normal(0.005, 0.04, (180, 3)), index=index, columns=["MKT", "SMB", "HML"])
+    exposures = rng.normal(0.5, 0.5, (3, 30))
+    funds = pd.DataFrame(
+        0.001 + factors.to_numpy() @ exposures + rng.normal(0, 0.02, (180, 30)),
+        index=index, columns=[f"FUND{i:02d}" for i in range(30)],
+    )
+    for i in range(30):
+        funds.iloc[:5 * (i % 6), i] = np.nan
+    funds.iloc[rng.integers(0, 180, 25), 7] = np.nan
+    funds.iloc[:, 29] = np.nan
+    funds.iloc[-3:, 29] = [0.01, 0.02, 0.03]
+    factors.iloc[50, 1] = np.nan
+    return funds, factors
+
+
+def _statsmodels_fit(y, x, add_constant=True):
+    data = pd.concat([y, x], axis=1).dropna()
+    regressors = sm.add_constant(data.iloc[:, 1:]) if add_constant else data.iloc[:, 1:]
+    return sm.OLS(data.iloc[:, 0], regressors).fit()
+
+
+def test_factor_regression_matches_statsmodels(funds_and_factors):
+    """
+    Test the batched regressions against one statsmodels fit per fund.
+    """
+    funds, factors = funds_and_factors
+    for add_constant in [True, False]:
+        result = factor_regression(funds, factors, add_constant=add_constant)
+        for code in ["FUND00", "FUND05", "FUND07", "FUND13"]:
+            fit = _statsmodels_fit(funds[code], factors, add_constant)
+            np.testing.assert_allclose(result.betas.loc[code], fit.params, rtol=1e-9)
+            np.testing.assert_allclose(result.t_stats.loc[code], fit.tvalues, rtol=1e-9)
+            assert result.r_squared[code] == pytest.approx(fit.rsquared)
+            assert result.residual_volatility[code] == pytest.approx(np.sqrt(fit.scale))
+            assert result.observations[code] == fit.nobs
+    assert list(result.betas.columns) == ["MKT", "SMB", "HML"]
+    assert list(factor_regression(funds, factors).betas.columns) == ["const", "MKT", "SMB", "HML"]
+
+    # Too few observations: no fit
+    assert factor_regression(funds, factors).betas.loc["FUND29"].isna().all()
+
+
+def test_rolling_factor_regression_matches_statsmodels(funds_and_factors):
+    """
+    Test rolling regressions against statsmodels fits of single windows.
+    """
+    funds, factors = funds_and_factors
+    result = rolling_factor_regression(funds, factors, window=36, min_periods=24, block_size=7)
+    for code, end in [("FUND00", 35), ("FUND07", 100), ("FUND03", 40), ("FUND13", 179), ("FUND01", 60)]:
+        window = slice(end - 35, end + 1)
+        fit = _statsmodels_fit(funds[code].iloc[window], factors.iloc[window])
+        betas = [result.betas[name][code].iloc[end] for name in ["const", "MKT", "SMB", "HML"]]
+        t_stats = [result.t_stats[name][code].iloc[end] for name in ["const", "MKT", "SMB", "HML"]]
+        np.testing.assert_allclose(betas, fit.params, rtol=1e-8)
+        np.testing.assert_allclose(t_stats, fit.tvalues, rtol=1e-8)
+        assert result.r_squared[code].iloc[end] == pytest.approx(fit.rsquared)
+        assert result.residual_volatility[code].iloc[end] == pytest.approx(np.sqrt(fit.scale))
+        assert result.observations[code].iloc[end] == fit.nobs
+
+    # Windows with fewer than min_periods observations are NaN
+    assert result.betas["MKT"]["FUND00"].iloc[:23].isna().all()
+    assert result.betas["MKT"]["FUND05"].iloc[:48].isna().all()
+    assert result.r_squared["FUND29"].isna().all()
+
+    no_constant = rolling_factor_regression(funds, factors, window=60, add_constant=False)
+    fit = _statsmodels_fit(funds["FUND02"].iloc[100:160], factors.iloc[100:160], add_constant=False)
+    assert no_constant.betas["MKT"]["FUND02"].iloc[159] == pytest.approx(fit.params["MKT"])
+    assert no_constant.r_squared["FUND02"].iloc[159] == pytest.approx(fit.rsquared)
+    with pytest.raises(ValueError):
+        rolling_factor_regression(funds, factors, window=0)
+
+
+def test_run_factor_regression_on_stored_series(app, funds_and_factors):
+    """
+    Test regressions of a stored group of funds on stored factors.
+    """
+    funds, factors = funds_and_factors
+    funds = funds.iloc[:, :4]
+    group = SeriesGroup(name="Funds", series_group_code="FUNDS")
+    db.session.add(group)
+    for frame, in_group in [(funds, True), (factors, False)]:
+        for code in frame.columns:
+            ts = TimeSeries(name=code, code=code, time_frequency="M")
+            db.session.add(ts)
+            if in_group:
+                group.series.append(ts)
+            db.session.add_all([
+                DataPoint(date=date.date(), value=value, time_series=ts) for date, value in frame[code].dropna().items()
+            ])
+    db.session.commit()
+
+    result = run_factor_regression(["MKT", "SMB", "HML"], series_group="FUNDS")
+    expected = factor_regression(funds, factors)
+    np.testing.assert_allclose(result.betas.to_numpy(), expected.betas.to_numpy(), rtol=1e-10)
+    rolling = run_factor_regression(["MKT", "SMB", "HML"], codes=["FUND01"], window=48)
+    # Full windows after the start of the fund, except those containing the missing factor value
+    assert rolling.betas["MKT"]["FUND01"].notna().sum() == 180 - (50 + 48)
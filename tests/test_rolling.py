@@ -0,0 +1,91 @@
+# tests/test_rolling.py
+
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app.rolling import RollingStatistics
+from app import db
+
+
+@pytest.fixture
+def panel_with_gaps():
+    """
+    Fixture returning a daily panel with a late start, a gap and scattered missing values.
+    """
+    rng = np.random.default_rng(1)
+    panel = pd.DataFrame(
+        rng.normal(0.01, 0.02, (300, 4)) + 5,
+        columns=["bench", "late", "gap", "sparse"],
+        index=pd.bdate_range("2020-01-01", periods=300),
+    )
+    panel.iloc[:50, 1] = np.nan
+    panel.iloc[100:130, 2] = np.nan
+    panel.iloc[rng.integers(0, 300, 30), 3] = np.nan
+    return panel
+
+
+def test_rolling_statistics_match_pandas(panel_with_gaps):
+    """
+    Test the one-pass statistics against pandas rolling windows.
+    """
+    panel = panel_with_gaps
+    statistics = RollingStatistics(20, benchmark="bench", min_periods=10).compute(panel, block_size=3)
+    rolling = panel.rolling(20, min_periods=10)
+    pd.testing.assert_frame_equal(statistics["mean"], rolling.mean())
+    pd.testing.assert_frame_equal(statistics["volatility"], rolling.std())
+    pd.testing.assert_frame_equal(statistics["correlation"], rolling.corr(panel["bench"]))
+    # Beta divides by the benchmark variance over the dates shared with each asset
+    shared_benchmark = pd.DataFrame({column: panel["bench"].where(panel[column].notna()) for column in panel})
+    beta = rolling.cov(panel["bench"]) / shared_benchmark.rolling(20, min_periods=10).var()
+    pd.testing.assert_frame_equal(statistics["beta"], beta)
+
+    without_benchmark = RollingStatistics(20).compute(panel)
+    assert set(without_benchmark) == {"mean", "volatility"}
+    assert without_benchmark["mean"].iloc[:19].isna().all().all()
+
+
+def test_streamed_appends_match_full_pass(panel_with_gaps):
+    """
+    Test that appending rows one batch at a time gives the statistics of the full pass.
+    """
+    panel = panel_with_gaps
+    full = RollingStatistics(20, benchmark="bench", min_periods=10).compute(panel)
+
+    streamed = RollingStatistics(20, benchmark="bench", min_periods=10)
+    streamed.compute(panel.iloc[:120])
+    parts = [streamed.append(panel.iloc[120:121]), streamed.append(panel.iloc[121:300])]
+    for name in full:
+        pd.testing.assert_frame_equal(pd.concat([part[name] for part in parts]), full[name].iloc[120:])
+
+    with pytest.raises(ValueError):
+        streamed.append(panel.iloc[-1:])
+
+    # Starting from an empty state works too
+    from_scratch = RollingStatistics(20, benchmark="bench", min_periods=10).append(panel)
+    for name in full:
+        pd.testing.assert_frame_equal(from_scratch[name], full[name])
+
+
+def test_rolling_statistics_on_series_group_panel(app):
+    """
+    Test that the output of SeriesGroup.to_dataframe can be used directly.
+    """
+    group = SeriesGroup(name="Group", series_group_code="GRP")
+    ts_a = TimeSeries(name="A", code="A")
+    ts_b = TimeSeries(name="B", code="B")
+    db.session.add_all([group, ts_a, ts_b])
+    group.series.append(ts_a)
+    group.series.append(ts_b)
+    start = datetime.date(2024, 1, 1)
+    db.session.add_all(
+        [DataPoint(date=start + datetime.timedelta(days=i), value=float(i), time_series=ts_a) for i in range(5)]
+        + [DataPoint(date=start + datetime.timedelta(days=i), value=float(i * i), time_series=ts_b) for i in range(2, 5)]
+    )
+    db.session.commit()
+
+    statistics = RollingStatistics(3, benchmark="A").compute(group.to_dataframe())
+    assert list(statistics["mean"]["A"].iloc[2:]) == [1.0, 2.0, 3.0]
+    assert statistics["mean"]["B"].iloc[-1] == pytest.approx((4 + 9 + 16) / 3)
+    assert statistics["correlation"]["A"].iloc[-1] == pytest.approx(1.0)
@@ -0,0 +1,114 @@
+# tests/test_search_cache.py
+
+from sqlalchemy import event
+from app.models import TimeSeries, Keyword
+import app.models as models
+from app.series import SeriesSearcher
+from app.search_cache import SearchCache, search_cache, catalog_version
+from app import db
+
+
+def test_cached_search_hits_without_sql(app, populate_series_for_search):
+    """
+    Test that repeated searches with equivalent arguments are answered from the cache.
+    """
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    df = SeriesSearcher.search("Finance", use_cache=True)
+    event.listen(db.engine, 'before_cursor_execute', count_statements)
+    try:
+        df_again = SeriesSearcher.search("  Finance ", use_cache=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statements)
+    assert statements == []
+    assert df_again.to_dict('records') == df.to_dict('records')
+
+    # Callers cannot alter the cached result
+    df_again['name'] = "changed"
+    assert "changed" not in set(SeriesSearcher.search("Finance", use_cache=True)['name'])
+
+    # Other flags are other entries
+    assert len(SeriesSearcher.search("Finance", search_series_group=False, use_cache=True)) == 1
+
+    stats = search_cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == 0.5
+    assert stats['entries'] == 2
+    assert stats['mean_miss_ms'] > 0
+
+
+def test_cache_invalidated_by_catalog_changes(app, populate_series_for_search):
+    """
+    Test that saving series or changing keywords bumps the catalog version and invalidates results.
+    """
+    assert SeriesSearcher.search("Rates", use_cache=True) is None
+    version = catalog_version.value
+
+    ts = TimeSeries(name="Swap Rates", code="SWR1")
+    ts.save()
+    assert catalog_version.value > version
+    assert list(SeriesSearcher.search("Rates", use_cache=True)['name']) == ["Swap Rates"]
+
+    keyword = Keyword.query.filter_by(word="Economics").one()
+    keyword.word = "Rates of return"
+    db.session.commit()
+    assert set(SeriesSearcher.search("Rates", use_cache=True)['name']) == {"Swap Rates", "TS_Second"}
+    assert search_cache.stats()['hits'] == 0
+
+
+def test_catalog_changes_computed_once_per_flush(app, populate_series_for_search, monkeypatch):
+    """
+    Test that the flush listeners of the search index and of the cache share one computation
+    of the catalog changes.
+    """
+    calls = []
+    catalog_changes = models._catalog_changes
+    monkeypatch.setattr(models, "_catalog_changes", lambda session: calls.append(1) or catalog_changes(session))
+
+    keyword = Keyword.query.filter_by(word="Economics").one()
+    keyword.word = "Macro"
+    version = catalog_version.value
+    db.session.commit()
+    assert len(calls) == 1
+    assert catalog_version.value > version
+    assert list(SeriesSearcher.search("Macro", full_text=True)['name']) == ["TS_Second"]
+    assert "catalog_changes" not in db.session.info
+
+
+def test_cache_bounds():
+    """
+    Test the LRU bound on entries and the TTL.
+    """
+    cache = SearchCache(max_entries=2, ttl=60)
+    calls = []
+    def compute(value):
+        calls.append(value)
+        return None
+
+    for key in ["a", "b", "a", "c", "a", "b"]:
+        cache.get_or_compute(key, lambda: compute(key))
+    # "b" was the least recently used entry when "c" came in
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats()['evictions'] == 2
+
+    cache.ttl = 0
+    cache.get_or_compute("b", lambda: compute("b"))
+    assert calls[-1] == "b" and len(calls) == 5
+
+
+def test_cache_version_source():
+    """
+    Test that catalog changes invalidate entries, except in caches without a version.
+    """
+    catalog_cache = SearchCache()
+    unversioned = SearchCache(version=None)
+    for cache in [catalog_cache, unversioned]:
+        cache.get_or_compute("key", lambda: None)
+    catalog_version.bump()
+    for cache in [catalog_cache, unversioned]:
+        cache.get_or_compute("key", lambda: None)
+    assert catalog_cache.stats()['misses'] == 2
+    assert unversioned.stats()['hits'] == 1
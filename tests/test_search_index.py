@@ -0,0 +1,141 @@
+# tests/test_search_index.py
+
+import pytest
+from sqlalchemy import event, create_engine
+from sqlalchemy.orm import Session
+from app.models import TimeSeries, SeriesGroup, Keyword
+from app.series import SeriesSearcher
+from app.search_index import get_catalog_index
+from app import db
+
+
+def test_index_search_matches_sql_search(app, populate_series_for_search):
+    """
+    Test that the in-memory index gives the same answers as the SQL search
+    for prefix and exact searches, and that it answers without any SQL statement.
+    """
+    catalog_index = get_catalog_index()
+    catalog_index.build()
+    assert len(catalog_index) == 6
+
+    statements = []
+    def count_statements(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count_statements)
+    try:
+        for search_text, kwargs in [
+            ("Finance", {}),
+            ("alpha fin", {}),
+            ("SG", {"search_by_name": False, "search_by_keyword": False}),
+            ("Investment", {"search_series_group": False}),
+            ("Alpha Finance", {"token_operator": "and"}),
+            ("TS_First", {"partial": False}),
+        ]:
+            df_index = SeriesSearcher.search(search_text, use_index=True, **kwargs)
+            event.remove(db.engine, 'before_cursor_execute', count_statements)
+            df_sql = SeriesSearcher.search(search_text, **kwargs)
+            event.listen(db.engine, 'before_cursor_execute', count_statements)
+            assert df_index.to_dict('records') == df_sql.to_dict('records'), search_text
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statements)
+    assert statements == []
+
+    assert SeriesSearcher.search("nothing", use_index=True) is None
+    assert len(SeriesSearcher.search("Finance", use_index=True, limit_rows=1)) == 1
+    with pytest.raises(ValueError):
+        SeriesSearcher.search("Finance", use_index=True, full_text=True)
+
+
+def test_index_follows_committed_changes(app, populate_series_for_search):
+    """
+    Test that inserts, renames, keyword changes and deletes reach the index on commit,
+    and that rolled back changes do not.
+    """
+    assert SeriesSearcher.search("Finance", use_index=True) is not None
+    assert get_catalog_index().is_built
+
+    ts = TimeSeries(name="Credit Spread", code="CRSP1")
+    ts.add_keyword("Rates")
+    ts.save()
+    assert list(SeriesSearcher.search("cred", use_index=True)['code']) == ["CRSP1"]
+    assert list(SeriesSearcher.search("rat", use_index=True)['name']) == ["Credit Spread"]
+
+    ts.name = "Swap Spread"
+    db.session.commit()
+    assert SeriesSearcher.search("cred", use_index=True) is None
+    assert list(SeriesSearcher.search("swap", use_index=True)['name']) == ["Swap Spread"]
+
+    keyword = Keyword.query.filter_by(word="Economics").one()
+    keyword.word = "Macro"
+    db.session.commit()
+    assert list(SeriesSearcher.search("macro", use_index=True)['name']) == ["TS_Second"]
+    assert SeriesSearcher.search("econ", use_index=True) is None
+
+    sg = SeriesGroup.query.filter_by(name="SG_Beta").one()
+    sg.name = "Discarded"
+    db.session.flush()
+    db.session.rollback()
+    assert SeriesSearcher.search("discarded", use_index=True) is None
+
+    db.session.delete(TimeSeries.query.filter_by(name="Swap Spread").one())
+    db.session.commit()
+    assert SeriesSearcher.search("swap", use_index=True) is None
+    assert len(get_catalog_index()) == 6
+
+
+def test_fuzzy_search(app, populate_series_for_search):
+    """
+    Test typo-tolerant lookup on codes and names, ranked by edit distance,
+    and that newly saved series are found.
+    """
+    df = SeriesSearcher.search("ABC12E", fuzzy=True, search_by_name=False)
+    assert list(df['code']) == ["ABC123"]
+    assert list(df['score']) == [-1]
+
+    df = SeriesSearcher.search("sg00", fuzzy=True, max_distance=1)
+    assert list(df['code']) == ["SG001", "SG002", "SG003"]
+    assert SeriesSearcher.search("sg00", fuzzy=True, max_distance=0) is None
+
+    # Names too, closest first
+    df = SeriesSearcher.search("TS_Frist", fuzzy=True, search_by_code=False)
+    assert list(df['name']) == ["TS_First"]
+    df = SeriesSearcher.search("SG_Alph", fuzzy=True)
+    assert list(df['name']) == ["SG_Alpha"]
+    assert list(df['score']) == [-1]
+
+    ts = TimeSeries(name="Gold", code="XAUUSD")
+    ts.save()
+    assert list(SeriesSearcher.search("XAUSD", fuzzy=True)['code']) == ["XAUUSD"]
+    db.session.delete(ts)
+    db.session.commit()
+    assert SeriesSearcher.search("XAUSD", fuzzy=True) is None
+
+    with pytest.raises(ValueError):
+        SeriesSearcher.search("ABC", fuzzy=True, full_text=True)
+    with pytest.raises(ValueError):
+        SeriesSearcher.search("ABC", fuzzy=True, max_distance=3)
+
+
+def test_one_index_per_database(app, populate_series_for_search, tmp_path):
+    """
+    Test that searches against another database use the index of that database.
+    """
+    assert list(SeriesSearcher.search("TS_First", use_index=True)['name']) == ["TS_First"]
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    db.metadata.create_all(engine)
+    other = Session(engine)
+    try:
+        other.add(TimeSeries(name="Other Catalog", code="OTH1"))
+        other.commit()
+        assert SeriesSearcher.search("TS_First", use_index=True, session=other) is None
+        assert list(SeriesSearcher.search("other", use_index=True, session=other)['code']) == ["OTH1"]
+        assert get_catalog_index(other) is not get_catalog_index()
+
+        other.add(TimeSeries(name="Other Rates", code="OTH2"))
+        other.commit()
+        assert list(SeriesSearcher.search("rates", use_index=True, session=other)['code']) == ["OTH2"]
+        assert SeriesSearcher.search("other", use_index=True) is None
+    finally:
+        other.close()
+        engine.dispose()
@@ -0,0 +1,114 @@
+# tests/test_series_group_panel.py
+
+import pytest
+import datetime
+import numpy as np
+import pandas as pd
+from app.models import SeriesGroup, TimeSeries, DataPoint
+from app import db
+
+
+@pytest.fixture
+def nested_groups_with_data(app):
+    """
+    Fixture to create a parent SeriesGroup with two TimeSeries and a child SeriesGroup
+    with one more TimeSeries. Data points have staggered dates and a revised value.
+    """
+    parent = SeriesGroup(name="Parent", series_group_code="PAR")
+    child = SeriesGroup(name="Child", series_group_code="CHI", parent=parent)
+
+    ts_a = TimeSeries(name="TS_A", code="A")
+    ts_b = TimeSeries(name="TS_B", code="B")
+    ts_c = TimeSeries(name="TS_C", code="C")
+    db.session.add_all([parent, child, ts_a, ts_b, ts_c])
+    db.session.commit()
+
+    parent.series.append(ts_a)
+    parent.series.append(ts_b)
+    child.series.append(ts_c)
+
+    db.session.add_all([
+        DataPoint(date=datetime.date(2024, 1, 1), value=1.0, time_series=ts_a),
+        DataPoint(date=datetime.date(2024, 1, 2), value=2.0, time_series=ts_a),
+        DataPoint(date=datetime.date(2024, 1, 3), value=3.0, time_series=ts_a),
+        DataPoint(date=datetime.date(2024, 1, 2), value=20.0, time_series=ts_b),
+        # Revised value for 2024-01-03, released later
+        DataPoint(date=datetime.date(2024, 1, 3), value=30.0,
+                  date_release=datetime.date(2024, 1, 4), time_series=ts_b),
+        DataPoint(date=datetime.date(2024, 1, 3), value=31.0,
+                  date_release=datetime.date(2024, 1, 10), time_series=ts_b),
+        DataPoint(date=datetime.date(2024, 1, 1), value=100.0, time_series=ts_c),
+    ])
+    db.session.commit()
+    return parent, child
+
+
+def test_group_to_dataframe_direct_members(app, nested_groups_with_data):
+    """
+    Test that only direct members are loaded, as columns named after the members.
+    """
+    parent, _ = nested_groups_with_data
+    df = parent.to_dataframe()
+
+    assert list(df.columns) == ["TS_A", "TS_B"]
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert list(df.index) == list(pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"]))
+    assert np.isnan(df.loc["2024-01-01", "TS_B"]), "TS_B has no value on its missing start date."
+    assert df.loc["2024-01-03", "TS_B"] == 30.0, "The earliest release should be kept, as in TimeSeries.to_dataframe."
+
+
+def test_group_to_dataframe_recursive(app, nested_groups_with_data):
+    """
+    Test that recursive=True also loads members of nested SeriesGroups.
+    """
+    parent, child = nested_groups_with_data
+    df = parent.to_dataframe(recursive=True)
+    assert list(df.columns) == ["TS_A", "TS_B", "TS_C"]
+    assert df.loc["2024-01-01", "TS_C"] == 100.0
+
+    # Nesting through membership (group as member of a group) is also followed
+    outer = SeriesGroup(name="Outer", series_group_code="OUT")
+    db.session.add(outer)
+    db.session.commit()
+    outer.series.append(child)
+    db.session.commit()
+    assert list(outer.to_dataframe(recursive=True).columns) == ["TS_C"]
+    assert outer.to_dataframe().empty
+
+
+def test_group_to_dataframe_filters(app, nested_groups_with_data):
+    """
+    Test the start, end and as_of filters.
+    """
+    parent, _ = nested_groups_with_data
+
+    df = parent.to_dataframe(start="2024-01-02", end=datetime.date(2024, 1, 2))
+    assert list(df.index) == [pd.Timestamp("2024-01-02")]
+    assert list(df.iloc[0]) == [2.0, 20.0]
+
+    df_as_of = parent.to_dataframe(as_of="2024-01-05")
+    assert df_as_of.loc["2024-01-03", "TS_B"] == 30.0, "Releases after as_of must be ignored."
+
+    with pytest.raises(ValueError):
+        parent.to_dataframe(start=123)
+
+
+def test_revisions_match_time_series_dataframe(app):
+    """
+    Test that a group panel and TimeSeries.to_dataframe keep the same revision of a date.
+    """
+    group = SeriesGroup(name="Revised", series_group_code="REV")
+    ts = TimeSeries(name="TS_R", code="R")
+    group.series.append(ts)
+    db.session.add_all([
+        group,
+        DataPoint(date=datetime.date(2024, 1, 2), value=1.0, date_release=datetime.date(2024, 1, 5), time_series=ts),
+        DataPoint(date=datetime.date(2024, 1, 2), value=2.0, time_series=ts),
+        DataPoint(date=datetime.date(2024, 1, 3), value=3.0, date_release=datetime.date(2024, 1, 4), time_series=ts),
+        DataPoint(date=datetime.date(2024, 1, 3), value=4.0, date_release=datetime.date(2024, 1, 6), time_series=ts),
+    ])
+    db.session.commit()
+    # Earliest release first, points without date_release after released ones
+    panel = group.to_dataframe()
+    assert panel["TS_R"].tolist() == [1.0, 3.0]
+    assert ts.to_dataframe()["TS_R"].tolist() == [1.0, 3.0]
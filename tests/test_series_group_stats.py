@@ -0,0 +1,139 @@
+# tests/test_series_group_stats.py
+
+import pytest
+import datetime
+from app.models import SeriesGroup, SeriesGroupStats, TimeSeries, DataPoint
+from app import db
+
+
+@pytest.fixture
+def parent_and_child_groups(app):
+    """
+    Fixture to create a parent SeriesGroup with a nested child SeriesGroup.
+    """
+    parent = SeriesGroup(name="Parent", series_group_code="PAR")
+    child = SeriesGroup(name="Child", series_group_code="CHI", parent=parent)
+    db.session.add_all([parent, child])
+    db.session.commit()
+    return parent, child
+
+
+def test_stats_created_for_new_group(app, parent_and_child_groups):
+    """
+    Test that every new SeriesGroup gets an empty statistics row.
+    """
+    parent, child = parent_and_child_groups
+    assert SeriesGroupStats.query.count() == 2
+    assert parent.stats.member_count == 0
+    assert parent.stats.recursive_member_count == 0
+    assert parent.stats.min_date is None
+    assert "n_children=0" in repr(parent)
+
+
+def test_stats_follow_membership_and_data_points(app, parent_and_child_groups):
+    """
+    Test that membership changes and new data points refresh the group and its ancestors.
+    """
+    parent, child = parent_and_child_groups
+    ts_a = TimeSeries(name="TS_A", code="A")
+    ts_b = TimeSeries(name="TS_B", code="B")
+    db.session.add_all([ts_a, ts_b])
+    parent.series.append(ts_a)
+    child.series.append(ts_b)
+    db.session.add_all([
+        DataPoint(date=datetime.date(2024, 1, 5), value=1.0, time_series=ts_a),
+        DataPoint(date=datetime.date(2023, 12, 1), value=2.0, time_series=ts_b),
+    ])
+    db.session.commit()
+
+    assert parent.stats.member_count == 1
+    assert parent.stats.recursive_member_count == 2
+    assert parent.stats.min_date == datetime.date(2023, 12, 1)
+    assert parent.stats.max_date == datetime.date(2024, 1, 5)
+    assert parent.stats.last_date_update is not None
+    assert child.stats.recursive_member_count == 1
+    assert child.stats.min_date == datetime.date(2023, 12, 1)
+
+    # Upserting data points extends the coverage of every containing group
+    ts_b.upsert_data_points([DataPoint(date=datetime.date(2024, 3, 1), value=3.0)], commit=True)
+    assert child.stats.max_date == datetime.date(2024, 3, 1)
+    assert parent.stats.max_date == datetime.date(2024, 3, 1)
+
+    # Deleting a member refreshes the counts
+    db.session.delete(ts_a)
+    db.session.commit()
+    assert parent.stats.member_count == 0
+    assert parent.stats.recursive_member_count == 1
+    assert parent.stats.min_date == datetime.date(2023, 12, 1)
+
+
+def test_stats_dataframe_and_rebuild(app, parent_and_child_groups):
+    """
+    Test the one-scan listing of groups and the rebuild of all statistics.
+    """
+    parent, child = parent_and_child_groups
+    db.session.execute(SeriesGroupStats.__table__.delete())
+    db.session.commit()
+
+    df = SeriesGroupStats.to_dataframe()
+    assert list(df['code']) == ["PAR", "CHI"]
+    assert df['member_count'].isna().all(), "Statistics are missing before a rebuild."
+
+    SeriesGroupStats.rebuild()
+    df = SeriesGroupStats.to_dataframe()
+    assert list(df['member_count']) == [0, 0]
+    assert df.loc[df['code'] == "CHI", 'parent_id'].iloc[0] == parent.id
+
+
+def test_stats_extended_without_recompute(app, parent_and_child_groups, monkeypatch):
+    """
+    Test that new data points extend the statistics in place, while moved data points,
+    upserts of stored rows and deleted groups are handled exactly.
+    """
+    parent, child = parent_and_child_groups
+    ts = TimeSeries(name="TS_A", code="A")
+    db.session.add(ts)
+    child.series.append(ts)
+    db.session.add(DataPoint(date=datetime.date(2024, 1, 5), value=1.0, time_series=ts))
+    db.session.commit()
+
+    refreshed = []
+    refresh = SeriesGroupStats.refresh.__func__
+    monkeypatch.setattr(SeriesGroupStats, 'refresh', classmethod(
+        lambda cls, series_ids, session=None: refreshed.append(set(series_ids)) or refresh(cls, series_ids, session)
+    ))
+    point = DataPoint(date=datetime.date(2024, 2, 1), value=2.0, time_series=ts)
+    db.session.add(point)
+    db.session.commit()
+    assert refreshed == []
+    assert (parent.stats.min_date, parent.stats.max_date) == (datetime.date(2024, 1, 5), datetime.date(2024, 2, 1))
+
+    # Every row already stored: nothing changes
+    last_update = child.stats.last_date_update
+    ts.upsert_data_points([DataPoint(date=datetime.date(2024, 2, 1), value=2.0)], commit=True)
+    db.session.refresh(child.stats)
+    assert child.stats.last_date_update == last_update
+
+    # Moving a data point can shrink the coverage
+    point.date = datetime.date(2024, 1, 10)
+    db.session.commit()
+    assert refreshed == [{ts.id}]
+    db.session.refresh(parent.stats)
+    assert parent.stats.max_date == datetime.date(2024, 1, 10)
+
+    # Moving it to a series outside the child group
+    other = TimeSeries(name="TS_B", code="B")
+    db.session.add(other)
+    parent.series.append(other)
+    db.session.commit()
+    db.session.expire_all()
+    point = db.session.get(DataPoint, point.id)
+    point.time_series = other
+    db.session.commit()
+    db.session.refresh(child.stats)
+    assert child.stats.max_date == datetime.date(2024, 1, 5)
+
+    child_id = child.id
+    db.session.delete(child)
+    db.session.commit()
+    assert db.session.get(SeriesGroupStats, child_id) is None
@@ -9,46 +9,6 @@ from app.series import SeriesSearcher
 from app import db
 
 
-@pytest.fixture
-def populate_series_for_search(app, basic_tstype):
-    """
-    Fixture to populate the database with TimeSeries and SeriesGroup objects
-    for testing the SeriesSearcher.
-    
-    Returns:
-        tuple: (list_of_timeseries, list_of_seriesgroups)
-    """
-    with app.app_context():
-        # Create TimeSeries instances
-        ts1 = TimeSeries(name="TS_First", code="ABC123")
-        ts1.add_keyword("Finance")
-        ts1.add_keyword("Investment")
-        
-        ts2 = TimeSeries(name="TS_Second", code="DEF456")
-        ts2.add_keyword("Economics")
-        
-        ts3 = TimeSeries(name="My Timeseries", code="MYCODE")
-        ts3.add_keyword("Investment")
-        ts3.add_keyword("Strategy")
-        
-        # Create SeriesGroup instances
-        sg1 = SeriesGroup(name="SG_Beta", series_group_code="SG001")
-        sg1.add_keyword("Finance")
-        
-        sg2 = SeriesGroup(name="SG_Alpha", series_group_code="SG002")
-        sg2.add_keyword("Investment")
-        
-        sg3 = SeriesGroup(name="Alpha Finance Group", series_group_code="SG003")
-        sg3.add_keyword("Finance")
-        sg3.add_keyword("Alpha")
-        
-        # Add all to the session
-        db.session.add_all([ts1, ts2, ts3, sg1, sg2, sg3])
-        db.session.commit()
-        
-        return [ts1, ts2, ts3], [sg1, sg2, sg3]
-
-
 def test_search_by_name_exact(app, populate_series_for_search):
     """
     Test searching by exact name match for TimeSeries and SeriesGroup.
@@ -380,4 +340,136 @@ def test_search_multiple_keywords(app, populate_series_for_search):
         assert df is not None, "Search should return a DataFrame, not None."
         assert len(df) == 3, "Should return three records associated with 'Investment' keyword."
         expected_names = {"TS_First", "My Timeseries", "SG_Alpha"}
-        assert set(df['name']) == expected_names
\ No newline at end of file
+        assert set(df['name']) == expected_names
+
+def test_search_multiple_tokens_or_and(app, populate_series_for_search):
+    """
+    Test that multi-token searches support OR and AND semantics across fields.
+    """
+    with app.app_context():
+        # OR: "Alpha" (sg2 name, sg3 name/keyword) or "Strategy" (ts3 keyword)
+        df_or = SeriesSearcher.search(search_text="Alpha Strategy", partial=False)
+        assert set(df_or['name']) == {"Alpha Finance Group", "My Timeseries"}
+
+        # AND: every token must match at least one field of the record
+        df_and = SeriesSearcher.search(search_text="Alpha Finance", partial=False, token_operator='and')
+        assert list(df_and['name']) == ["Alpha Finance Group"]
+
+        df_and_partial = SeriesSearcher.search(search_text="TS_ Invest", token_operator='and')
+        assert list(df_and_partial['name']) == ["TS_First"]
+
+        with pytest.raises(ValueError):
+            SeriesSearcher.search(search_text="Alpha", token_operator='xor')
+
+
+def test_search_multiple_tokens_single_ranked_query(app, populate_series_for_search):
+    """
+    Test that a multi-token search runs a single statement and ranks by number of matches.
+    """
+    from sqlalchemy import event
+
+    with app.app_context():
+        statements = []
+
+        def count_statements(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_statements)
+        try:
+            df = SeriesSearcher.search(search_text="Finance Alpha Investment SG00", limit_rows=3)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statements)
+
+        assert len(statements) == 1, "All tokens should be matched by a single statement."
+        assert len(df) == 3, "The limit should be applied in SQL."
+        assert df['score'].is_monotonic_decreasing
+        # "Alpha Finance Group" matches Finance (name, keyword), Alpha (name, keyword) and SG00 (code)
+        assert df.iloc[0]['name'] == "Alpha Finance Group"
+        assert df.iloc[0]['score'] == 5
+
+
+@pytest.mark.parametrize("mode", [{}, {"full_text": True}, {"use_index": True}])
+def test_search_keyset_pagination(app, populate_series_for_search, mode):
+    """
+    Test that paging with `after=(score, id)` walks the full ranking without gaps or repeats.
+    """
+    with app.app_context():
+        full = SeriesSearcher.search("Finance Investment", limit_rows=None, **mode)
+        assert len(full) == 5
+
+        pages = []
+        after = None
+        for _ in range(10):
+            page = SeriesSearcher.search("Finance Investment", limit_rows=2, after=after, **mode)
+            if page is None:
+                break
+            assert len(page) <= 2
+            pages.append(page)
+            last = page.iloc[-1]
+            after = (last['score'], last['id'])
+
+        assert len(pages) == 3
+        assert list(pd.concat(pages)['id']) == list(full['id'])
+
+        with pytest.raises(ValueError):
+            SeriesSearcher.search("Finance", after=(1,), **mode)
+
+
+def test_search_returns_projection_without_entities(app, populate_series_for_search):
+    """
+    Test that search selects only the output columns and aggregates keywords in SQL,
+    without loading any entity into the session.
+    """
+    with app.app_context():
+        db.session.expunge_all()
+        df = SeriesSearcher.search("Investment", search_by_name=False, search_by_code=False)
+        assert len(db.session.identity_map) == 0
+        assert set(df['name']) == {"TS_First", "My Timeseries", "SG_Alpha"}
+        keywords = dict(zip(df['name'], df['keywords']))
+        assert set(keywords["TS_First"].split(", ")) == {"Finance", "Investment"}
+        assert keywords["SG_Alpha"] == "Investment"
+        assert dict(zip(df['name'], df['code']))["SG_Alpha"] == "SG002"
+
+
+def test_facets_single_query(app, populate_series_for_search):
+    """
+    Test facet counts for a search, computed with a single statement.
+    """
+    from sqlalchemy import event
+
+    with app.app_context():
+        ts1 = TimeSeries.query.filter_by(name="TS_First").one()
+        ts1.time_frequency = "D"
+        ts1.time_series_type = TimeSeriesType.query.filter_by(name="BasicType").one()
+        db.session.commit()
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count_statements)
+        try:
+            df = SeriesSearcher.facets("Investment")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statements)
+        assert len(statements) == 1
+
+        counts = {(row.facet, row.value): row.count for row in df.itertuples()}
+        # TS_First, My Timeseries and SG_Alpha match "Investment"
+        assert counts[("type", "TimeSeries")] == 2
+        assert counts[("type", "SeriesGroup")] == 1
+        assert counts[("time_frequency", "D")] == 1
+        assert counts[("time_frequency", "M")] == 1
+        assert counts[("delta_type", "pct")] == 2
+        assert counts[("time_series_type", "BasicType")] == 1
+        assert counts[("keyword", "Investment")] == 3
+        assert counts[("keyword", "Strategy")] == 1
+        assert list(df["facet"].unique()) == ["type", "time_frequency", "delta_type", "time_series_type", "keyword"]
+
+        # Without text: the whole catalog; top_keywords limits the keyword facet
+        df = SeriesSearcher.facets(top_keywords=2)
+        keywords = df[df["facet"] == "keyword"]
+        assert list(keywords["value"]) == ["Finance", "Investment"]
+        assert list(keywords["count"]) == [3, 3]
+        assert df.loc[df["facet"] == "type", "count"].sum() == 6
@@ -0,0 +1,103 @@
+# tests/test_simulation.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from app.models import TimeSeries, DataPoint
+from app.simulation import simulate_paths, run_simulation
+from app.utils import create_returns_df
+from app import db
+
+
+@pytest.fixture
+def moments():
+    """
+    Fixture returning the mean and covariance of the monthly returns of 4 assets.
+    """
+    rng = np.random.default_rng(8)
+    loadings = rng.normal(0, 0.04, (4, 4))
+    covariance = pd.DataFrame(loadings @ loadings.T + np.eye(4) * 1e-3, index=list("ABCD"), columns=list("ABCD"))
+    mean = pd.Series([0.004, 0.006, 0.008, 0.002], index=list("ABCD"))
+    return mean, covariance
+
+
+def test_simulation_matches_direct_draws(moments):
+    """
+    Test the streamed statistics against paths drawn directly from the same stream.
+    """
+    mean, covariance = moments
+    weights = np.array([0.4, 0.3, 0.2, 0.0])
+    result = simulate_paths(mean, covariance, weights, horizon=24, n_paths=5000, seed=3, chunk_size=5000)
+
+    rng = np.random.default_rng(np.random.SeedSequence(3).spawn(1)[0])
+    factor = np.linalg.cholesky(covariance.to_numpy())
+    wealth = np.ones((1, 5000))
+    for _ in range(24):
+        returns = mean.to_numpy() + rng.standard_normal((5000, 4)) @ factor.T
+        wealth = np.vstack([wealth, wealth[-1] * (1 + returns @ weights)])
+    terminal = wealth[-1]
+    drawdown = (1 - wealth / np.maximum.accumulate(wealth, axis=0)).max(axis=0)
+
+    summary = result.summary
+    assert summary['mean_terminal_wealth'] == pytest.approx(terminal.mean())
+    assert summary['std_terminal_wealth'] == pytest.approx(terminal.std())
+    assert summary['probability_of_loss'] == (terminal < 1).mean()
+    assert summary['mean_max_drawdown'] == pytest.approx(drawdown.mean())
+    assert summary['worst_max_drawdown'] == pytest.approx(drawdown.max())
+    assert result.terminal_wealth.sum() == 5000 and result.max_drawdown.sum() == 5000
+    levels = result.quantiles.index.to_numpy()
+    np.testing.assert_allclose(result.quantiles['terminal_wealth'], np.quantile(terminal, levels), rtol=2e-3)
+    np.testing.assert_allclose(result.quantiles['max_drawdown'], np.quantile(drawdown, levels), atol=1e-3)
+
+
+def test_simulation_is_reproducible_across_workers(moments):
+    """
+    Test that the results only depend on the seed, not on the number of workers.
+    """
+    mean, covariance = moments
+    kwargs = dict(horizon=12, n_paths=2500, seed=42, chunk_size=1000, rebalance=False)
+    serial = simulate_paths(mean, covariance, **kwargs)
+    parallel = simulate_paths(mean, covariance, n_workers=2, **kwargs)
+    pd.testing.assert_series_equal(serial.summary, parallel.summary, check_exact=True)
+    pd.testing.assert_frame_equal(serial.quantiles, parallel.quantiles, check_exact=True)
+    pd.testing.assert_series_equal(serial.terminal_wealth, parallel.terminal_wealth)
+    other = simulate_paths(mean, covariance, **{**kwargs, 'seed': 43})
+    assert other.summary['mean_terminal_wealth'] != serial.summary['mean_terminal_wealth']
+
+    # With a single asset, buying and holding is rebalancing
+    one = (mean.iloc[:1], covariance.iloc[:1, :1])
+    held = simulate_paths(*one, horizon=6, n_paths=100, seed=1, rebalance=False)
+    rebalanced = simulate_paths(*one, horizon=6, n_paths=100, seed=1)
+    assert held.summary['mean_terminal_wealth'] == pytest.approx(rebalanced.summary['mean_terminal_wealth'])
+
+    with pytest.raises(ValueError):
+        simulate_paths(mean, covariance, weights=[1.0])
+    with pytest.raises(ValueError):
+        simulate_paths(mean, covariance.iloc[:2, :2])
+
+    # The seed of create_returns_df controls the draws
+    pd.testing.assert_frame_equal(create_returns_df(seed=5), create_returns_df(seed=5))
+
+
+def test_run_simulation_on_stored_series(app):
+    """
+    Test a simulation from the moments of stored series.
+    """
+    returns = create_returns_df(n_samples=120, n_assets=3, seed=2)
+    returns.columns = ["X", "Y", "Z"]
+    for code in returns.columns:
+        ts = TimeSeries(name=code, code=code, time_frequency="M")
+        db.session.add(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts) for date, value in returns[code].items()
+        ])
+    db.session.commit()
+
+    weights = pd.Series({"X": 0.5, "Z": 0.5})
+    result = run_simulation(weights, horizon=12, n_paths=1000, seed=0)
+    expected = simulate_paths(
+        returns[["X", "Z"]].mean(), returns[["X", "Z"]].cov(), [0.5, 0.5], horizon=12, n_paths=1000, seed=0
+    )
+    pd.testing.assert_series_equal(result.summary, expected.summary)
+    with pytest.raises(ValueError):
+        run_simulation(pd.Series({"NOPE": 1.0}), codes=["X"])
@@ -0,0 +1,125 @@
+# tests/test_volatility.py
+
+import pytest
+import numpy as np
+import pandas as pd
+from arch import arch_model
+from app.models import SeriesGroup, TimeSeries, DataPoint, VolatilityFit
+from app.volatility import VolatilitySpec, forecast_volatility, run_volatility_forecast, spec_key
+from app import db
+
+
+@pytest.fixture
+def garch_returns():
+    """
+    Fixture returning daily returns of 4 GARCH(1,1) series (one starting later) and a short one.
+    """
+    index = pd.bdate_range("2022-01-03", periods=700)
+    returns = pd.DataFrame(index=index)
+    for i, persistence in enumerate([0.90, 0.95, 0.97, 0.85]):
+        rng = np.random.default_rng(i)
+        omega, alpha, beta = 0.02, 0.08, persistence - 0.08
+        variance, values = omega / (1 - persistence), np.empty(700)
+        for t in range(700):
+            values[t] = 0.05 + np.sqrt(variance) * rng.standard_normal()
+            variance = omega + alpha * (values[t] - 0.05) ** 2 + beta * variance
+        returns[f"VOL{i}"] = values / 100
+    returns.iloc[:150, 3] = np.nan
+    returns["SHORT"] = np.nan
+    returns.iloc[-50:, 4] = 0.01
+    return returns
+
+
+def test_forecast_volatility_methods(garch_returns):
+    """
+    Test cold fits against arch, and filter and warm updates from earlier estimates.
+    """
+    result = forecast_volatility(garch_returns, horizon=3)
+    assert result.fits["method"].tolist() == ["cold"] * 4
+    assert result.forecasts.loc["SHORT"].isna().all()
+    fit = arch_model(garch_returns["VOL3"].dropna() * 100, rescale=False).fit(disp="off")
+    expected = np.sqrt(fit.forecast(horizon=3, reindex=False).variance.iloc[-1]) / 100
+    np.testing.assert_allclose(result.forecasts.loc["VOL3"], expected, rtol=1e-6)
+    assert result.fits.at["VOL3", "parameters"] == pytest.approx(fit.params.to_dict())
+    assert result.fits.at["VOL3", "observations"] == 550
+    assert result.fits.at["VOL3", "last_date"] == garch_returns.index[-1].date()
+
+    # Estimates on data up to 3 days earlier: filtered, or refitted from them
+    earlier = forecast_volatility(garch_returns.iloc[:-3]).fits
+    filtered = forecast_volatility(garch_returns, horizon=3, fits=earlier, refit_every=5)
+    assert filtered.fits["method"].tolist() == ["filter"] * 4
+    assert filtered.fits.at["VOL3", "last_date"] == garch_returns.index[-4].date()
+    assert filtered.fits.at["VOL3", "parameters"] == earlier.at["VOL3", "parameters"]
+    fixed = arch_model(garch_returns["VOL3"].dropna() * 100, rescale=False).fix(
+        list(earlier.at["VOL3", "parameters"].values())
+    )
+    expected = np.sqrt(fixed.forecast(horizon=3, reindex=False).variance.iloc[-1]) / 100
+    np.testing.assert_allclose(filtered.forecasts.loc["VOL3"], expected, rtol=1e-10)
+
+    warm = forecast_volatility(garch_returns, horizon=3, fits=earlier, refit_every=3)
+    assert warm.fits["method"].tolist() == ["warm"] * 4
+    np.testing.assert_allclose(warm.forecasts, result.forecasts, rtol=1e-3)
+    # Estimates after the data are not used
+    assert forecast_volatility(garch_returns.iloc[:-10], fits=earlier).fits["method"].eq("cold").all()
+
+    parallel = forecast_volatility(garch_returns, horizon=3, fits=earlier, refit_every=3, n_workers=2)
+    pd.testing.assert_frame_equal(parallel.forecasts, warm.forecasts)
+
+    egarch = forecast_volatility(garch_returns.iloc[:, :2], spec=VolatilitySpec(vol="EGARCH", dist="t"), horizon=2)
+    assert egarch.forecasts.notna().all().all()
+    assert spec_key(VolatilitySpec(o=1)) == "Constant-GARCH(1,1,1)-normal"
+    with pytest.raises(ValueError):
+        spec_key(VolatilitySpec(vol="FIGARCH"))
+    with pytest.raises(ValueError):
+        forecast_volatility(garch_returns, horizon=0)
+
+
+def test_run_volatility_forecast_reuses_stored_fits(app, garch_returns):
+    """
+    Test that stored estimates are saved and reused by the next runs on new data.
+    """
+    group = SeriesGroup(name="Stocks", series_group_code="STOCKS")
+    db.session.add(group)
+    for code in garch_returns.columns:
+        ts = TimeSeries(name=code, code=code, time_frequency="D")
+        db.session.add(ts)
+        group.series.append(ts)
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts)
+            for date, value in garch_returns[code].iloc[:-2].dropna().items()
+        ])
+    db.session.commit()
+
+    first = run_volatility_forecast(series_group="STOCKS")
+    assert first.fits["method"].tolist() == ["cold"] * 4
+    assert VolatilityFit.query.count() == 4
+    stored = VolatilityFit.query.filter_by(time_series_id=TimeSeries.query.filter_by(time_series_code="VOL3").one().id).one()
+    assert stored.model_spec == spec_key() and stored.observations == 548
+    assert stored.parameters == pytest.approx(first.fits.at["VOL3", "parameters"])
+
+    # Two new observations: only filtered, nothing new to save
+    for code in garch_returns.columns[:4]:
+        ts = TimeSeries.query.filter_by(time_series_code=code).one()
+        db.session.add_all([
+            DataPoint(date=date.date(), value=value, time_series=ts)
+            for date, value in garch_returns[code].iloc[-2:].items()
+        ])
+    db.session.commit()
+    second = run_volatility_forecast(series_group="STOCKS", horizon=2)
+    assert second.fits["method"].tolist() == ["filter"] * 4
+    assert VolatilityFit.query.count() == 4
+    assert second.forecasts.loc["VOL0"].notna().all() and second.forecasts.loc["SHORT"].isna().all()
+
+    # Refits start from the stored estimates and are saved at the new last date
+    third = run_volatility_forecast(series_group="STOCKS", refit_every=2)
+    assert third.fits["method"].tolist() == ["warm"] * 4
+    assert VolatilityFit.query.count() == 8
+    again = run_volatility_forecast(series_group="STOCKS", refit_every=0)
+    assert again.fits["method"].tolist() == ["warm"] * 4
+    assert VolatilityFit.query.count() == 8
+
+    # Back in time: the later estimates are ignored
+    past = run_volatility_forecast(series_group="STOCKS", end=garch_returns.index[-3], persist=False)
+    assert past.fits["method"].tolist() == ["filter"] * 4
+    cold = run_volatility_forecast(codes=["VOL0"], use_cache=False, persist=False)
+    assert cold.fits["method"].tolist() == ["cold"]